@@ -1,9 +1,21 @@
-from typing import List, Dict
+from typing import Iterator, List, Dict, Optional
+
+from app.cancel import CancelToken
 
 class AudioAgent:
-    def __init__(self):
-        pass
+    def __init__(self, lookup: Optional[memoryview] = None):
+        # Read-only lookup tables; see app.shared.SharedArrayStore for sharing across workers.
+        self.lookup = lookup
 
-    def analyze_audio_blob(self, vod_bytes: bytes) -> List[Dict]:
+    def analyze_audio_blob(self, vod_bytes: bytes, token: Optional[CancelToken] = None) -> List[Dict]:
         """Stub: return fake audio events (footsteps, callouts). Replace with VAD/ASR."""
-        return [{'time': 1.2, 'type': 'footstep', 'player': 'player2'}, {'time': 3.4, 'type': 'callout', 'text': 'rotating'}]
+        return list(self.iter_audio_events(vod_bytes, token))
+
+    def iter_audio_events(self, vod_bytes: bytes, token: Optional[CancelToken] = None) -> Iterator[Dict]:
+        """Audio events in time order, yielded as the scan reaches them."""
+        detected = [{'time': 1.2, 'type': 'footstep', 'player': 'player2'}, {'time': 3.4, 'type': 'callout', 'text': 'rotating'}]
+        # Checkpoint per chunk; a real implementation scans audio windows here.
+        for event in detected:
+            if token is not None and token.stop('audio'):
+                break
+            yield event
@@ -1,9 +1,11 @@
 from typing import Dict, List
 
+from app.templates import TemplateEngine, default_engine
+
 class BackendAgent:
     """Provides API design, data model suggestions, and example endpoints."""
-    def __init__(self):
-        pass
+    def __init__(self, engine: TemplateEngine = default_engine):
+        self.engine = engine
 
     def suggest_endpoints(self) -> List[Dict]:
         return [
@@ -22,4 +24,8 @@ class BackendAgent:
         }
 
     def generate_express_route_stub(self, path: str) -> str:
-        return f"app.post('{path}', async (req, res) => {{ res.json({{status: 'ok'}}) }})"
+        return self.engine.render('express_route', path=path)
+
+    def generate_express_route_stubs(self, paths: List[str]) -> List[str]:
+        """Batch version of generate_express_route_stub (template compiled once)."""
+        return self.engine.render_many('express_route', ({'path': p} for p in paths))
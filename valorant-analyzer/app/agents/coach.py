@@ -1,17 +1,357 @@
-from typing import List, Dict
+import hashlib
+import heapq
+import json
+import multiprocessing
+import os
+import threading
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Deque, Iterable, Iterator, List, Dict, Optional, Sequence, Tuple
+
+from app.cancel import CancelToken
+from app.positions import TrackStore
+from app.timeline import MediaClock, DriftCorrector, iter_merged
+
+# Bump whenever a rule or its thresholds change; stored advice with an older
+# version is recomputed by `python -m app.cli recoach`.
+RULES_VERSION = 3
+
+# Below this many shards, shipping them to processes costs more than the rules themselves.
+MIN_PARALLEL_SHARDS = 64
+
+# Rule-evaluation processes, kept for the life of this process (see shard_pool).
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def new_shard_stats() -> Dict:
+    return {'abilities': 0, 'smokes': 0, 'footsteps': 0, 'ability_times': [], 'footstep_times': []}
+
+
+def add_to_shard_stats(stats: Dict, event: Dict) -> None:
+    if event.get('type') == 'ability_cast':
+        stats['abilities'] += 1
+        stats['ability_times'].append(event['time'])
+        if event.get('ability') == 'smoke':
+            stats['smokes'] += 1
+    elif event.get('type') == 'footstep':
+        stats['footsteps'] += 1
+        stats['footstep_times'].append(event['time'])
+
+
+def shard_tips(rnd: int, stats: Dict, proximity_window: float) -> List[str]:
+    """The per-player rules of one (round, player) shard."""
+    tips = []
+    if stats['smokes'] > 2:
+        tips.append(f'Round {rnd + 1}: {stats["smokes"]} smokes; consider swapping some for aggressive plays')
+    if times_within(stats['ability_times'], stats['footstep_times'], proximity_window):
+        tips.append(f'Round {rnd + 1}: your footsteps gave away your ability timing; walk before using utility')
+    return tips
+
+
+def evaluate_shards(batch: List[Tuple[int, Dict]], proximity_window: float) -> List[List[str]]:
+    """shard_tips over a batch of (round, stats); the unit of work sent to a rule process."""
+    return [shard_tips(rnd, stats, proximity_window) for rnd, stats in batch]
+
+
+def shard_pool() -> ProcessPoolExecutor:
+    """This process's rule-evaluation pool, one process per CPU, started on first use.
+
+    Processes come from a fork server (spawned where there is none), never
+    forked from a server process that is running request threads, and the
+    pool is shared by every caller for the life of the process; callers cap
+    their own share of it (see CoachAgent._parallel_tips). A forked child
+    gets a pool of its own.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool_pid != os.getpid():
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            _pool, _pool_pid = ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=context), os.getpid()
+        return _pool
+
+
+def times_within(a: Sequence[float], b: Sequence[float], window: float) -> bool:
+    """True if any time in sorted `a` is within `window` of one in sorted `b` (linear merge)."""
+    i = j = 0
+    while i < len(a) and j < len(b):
+        if abs(a[i] - b[j]) <= window:
+            return True
+        if a[i] < b[j]:
+            i += 1
+        else:
+            j += 1
+    return False
+
+def digesting(timeline: Iterable[Dict], digest) -> Iterator[Dict]:
+    """Pass events through unchanged while feeding them to a hashlib digest (see timeline_digest)."""
+    for event in timeline:
+        digest.update(json.dumps(event, sort_keys=True, separators=(',', ':')).encode())
+        digest.update(b'\n')
+        yield event
+
 
 class CoachAgent:
-    def __init__(self):
-        pass
+    rules_version = RULES_VERSION
+
+    def __init__(self, proximity_window: float = 2.0):
+        # Seconds between a footstep and an ability cast for them to count as one engagement.
+        self.proximity_window = proximity_window
+
+    def generate_advice(self, vision_events: List[Dict], audio_events: List[Dict], tracks: Optional[TrackStore] = None,
+                        clock: Optional[MediaClock] = None, drift: Optional[DriftCorrector] = None) -> Dict:
+        """Simple fusion logic: produce generic advice based on detected events.
 
-    def generate_advice(self, vision_events: List[Dict], audio_events: List[Dict]) -> Dict:
-        """Simple fusion logic: produce generic advice based on detected events."""
+        Vision frames and audio times are put on one media clock (`clock`
+        maps frames to seconds, `drift` maps audio time onto it) before fusion.
+        """
         advice = {'summary': 'No critical issues detected', 'tips': []}
         # If many ability casts of type 'smoke' by same player, suggest economy changes
         smoke_count = sum(1 for v in vision_events for e in v.get('events', []) if e.get('ability') == 'smoke')
         if smoke_count > 2:
             advice['tips'].append('Consider swapping some smoke usage for aggressive plays')
         # If audio shows footsteps near time of ability, suggest better spacing
-        if any(a.get('type') == 'footstep' for a in audio_events):
+        if self._footsteps_near_abilities(iter_merged(vision_events, audio_events, clock, drift)):
             advice['tips'].append('Work on clearing angles and spacing when approaching sites')
+        # If a player spends most of their tracked time in open areas, suggest using cover
+        if tracks is not None:
+            for player in tracks.players:
+                tracked = tracks.time_tracked(player)
+                if tracked > 0 and tracks.time_in_open(player) / tracked > 0.6:
+                    advice['tips'].append(f'{player} spends most of the round in open areas; hold closer to cover')
+        return advice
+
+    @staticmethod
+    def inputs_digest(vision_events: List[Dict], audio_events: List[Dict]) -> str:
+        """Fingerprint of the events advice is computed from, to detect changed inputs."""
+        payload = json.dumps([vision_events, audio_events], sort_keys=True, separators=(',', ':'))
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def advice_meta(self, vision_events: List[Dict], audio_events: List[Dict]) -> Dict:
+        return {'rules_version': self.rules_version, 'inputs_digest': self.inputs_digest(vision_events, audio_events)}
+
+    def _footsteps_near_abilities(self, timeline) -> bool:
+        # One pass over the merged stream, remembering the latest time of each kind.
+        last = {'footstep': None, 'ability_cast': None}
+        for event in timeline:
+            kind = event.get('type')
+            if kind not in last:
+                continue
+            other = last['ability_cast' if kind == 'footstep' else 'footstep']
+            if other is not None and event['time'] - other <= self.proximity_window:
+                return True
+            last[kind] = event['time']
+        return False
+
+    def generate_sharded_advice(self, vision_events: List[Dict], audio_events: List[Dict],
+                                clock: Optional[MediaClock] = None, drift: Optional[DriftCorrector] = None,
+                                round_starts: Optional[Sequence[float]] = None, teams: Optional[Dict[str, str]] = None,
+                                workers: Optional[int] = None, token: Optional[CancelToken] = None,
+                                tracks: Optional[TrackStore] = None) -> Dict:
+        """Coach per (round, player) shard, then reduce to team and match advice.
+
+        Events are placed on the media clock, assigned to a round (their own
+        `round` field, else by `round_starts` times) and to their `player`
+        (events without one, like callouts, form a per-round team shard).
+        The result keeps `summary`/`tips` as in generate_advice and adds
+        `players` and `teams` sections. `tracks` (this match's minimap
+        samples) adds the open-area rule of generate_advice. See
+        generate_timeline_advice for `workers` and `token`.
+        """
+        return self.generate_timeline_advice(iter_merged(vision_events, audio_events, clock, drift), round_starts,
+                                             teams, token, tracks, workers)
+
+    def generate_timeline_advice(self, timeline: Iterable[Dict], round_starts: Optional[Sequence[float]] = None,
+                                 teams: Optional[Dict[str, str]] = None, token: Optional[CancelToken] = None,
+                                 tracks: Optional[TrackStore] = None, workers: Optional[int] = 1) -> Dict:
+        """generate_sharded_advice over an already merged, time-ordered event stream.
+
+        Shard stats are accumulated as events stream past, so the events
+        themselves are never held (e.g. a merge of spilled runs from
+        app.spill); only the per-shard counts and ability/footstep times are.
+        Once there are MIN_PARALLEL_SHARDS shards, the per-player shard rules
+        run on the shared `shard_pool()`, which receives only those compact
+        stats, in at most `workers` concurrent batches (None: one per CPU).
+        Smaller matches, or `workers` of 1, stay in this process.
+        A `token` is checked as events stream in; coaching is cheap, so it
+        still runs on truncated inputs.
+        """
+        starts = list(round_starts or [0.0])
+        stats: Dict[Tuple[int, Optional[str]], Dict] = {}
+        for n, event in enumerate(timeline):
+            if token is not None and n % 4096 == 0:
+                token.check()
+            rnd = event.get('round')
+            if rnd is None:
+                rnd = max(0, bisect_right(starts, event['time']) - 1)
+            key = (rnd, event.get('player'))
+            shard = stats.get(key)
+            if shard is None:
+                shard = stats[key] = new_shard_stats()
+            add_to_shard_stats(shard, event)
+        keys = sorted(stats, key=lambda k: (k[0], k[1] or ''))
+        ordered = {k: stats[k] for k in keys}
+        if len(keys) < MIN_PARALLEL_SHARDS:
+            workers = 1
+        elif workers is None:
+            workers = os.cpu_count() or 1
+        tips = self._parallel_tips(ordered, workers) if workers > 1 else None
+        return self._reduce_shards(ordered, teams or {}, tracks, tips)
+
+    def _parallel_tips(self, stats: Dict[Tuple[int, Optional[str]], Dict], workers: int) -> Dict[Tuple, List[str]]:
+        keys = [k for k in stats if k[1] is not None]
+        # One batch per allowed process: one pickle round trip each, and never
+        # more than `workers` of the shared pool's processes busy for this call.
+        size = max(1, -(-len(keys) // workers))
+        batches = [keys[i:i + size] for i in range(0, len(keys), size)]
+        results = shard_pool().map(evaluate_shards, ([(k[0], stats[k]) for k in batch] for batch in batches),
+                                          repeat(self.proximity_window))
+        tips: Dict[Tuple, List[str]] = {}
+        for batch, batch_tips in zip(batches, results):
+            tips.update(zip(batch, batch_tips))
+        return tips
+
+    @staticmethod
+    def timeline_digest(timeline: Iterable[Dict]) -> str:
+        """inputs_digest for a merged event stream, computed incrementally."""
+        digest = hashlib.sha1()
+        for _ in digesting(timeline, digest):
+            pass
+        return digest.hexdigest()
+
+    def _reduce_shards(self, stats: Dict[Tuple[int, Optional[str]], Dict], teams: Dict[str, str],
+                       tracks: Optional[TrackStore] = None, tips: Optional[Dict[Tuple, List[str]]] = None) -> Dict:
+        advice = {'summary': 'No critical issues detected', 'tips': [], 'players': {}, 'teams': {}}
+        rounds: Dict[int, List[Dict]] = {}
+        for (rnd, player), s in stats.items():
+            rounds.setdefault(rnd, []).append(s)
+            if player is None:
+                continue
+            entry = advice['players'].setdefault(player, {'tips': [], 'rounds': []})
+            entry['rounds'].append({'round': rnd, 'abilities': s['abilities'], 'smokes': s['smokes'], 'footsteps': s['footsteps']})
+            entry['tips'].extend(tips[(rnd, player)] if tips is not None else shard_tips(rnd, s, self.proximity_window))
+            team = advice['teams'].setdefault(teams.get(player, 'team'), {'tips': [], 'abilities': 0, 'players': {}})
+            team['abilities'] += s['abilities']
+            team['players'][player] = team['players'].get(player, 0) + s['abilities']
+
+        for name, team in advice['teams'].items():
+            if team['abilities'] >= 5 and len(team['players']) > 1:
+                top, count = max(team['players'].items(), key=lambda kv: kv[1])
+                if count / team['abilities'] > 0.6:
+                    team['tips'].append(f'Utility is concentrated on {top}; spread ability usage across the team')
+
+        # Match level: the same rules as generate_advice, from the reduced shard stats.
+        if sum(s['smokes'] for s in stats.values()) > 2:
+            advice['tips'].append('Consider swapping some smoke usage for aggressive plays')
+        for shard_list in rounds.values():
+            abilities = list(heapq.merge(*(s['ability_times'] for s in shard_list)))
+            footsteps = list(heapq.merge(*(s['footstep_times'] for s in shard_list)))
+            if times_within(abilities, footsteps, self.proximity_window):
+                advice['tips'].append('Work on clearing angles and spacing when approaching sites')
+                break
+        if tracks is not None:
+            for player in tracks.players:
+                tracked = tracks.time_tracked(player)
+                if tracked > 0 and tracks.time_in_open(player) / tracked > 0.6:
+                    advice['tips'].append(f'{player} spends most of the round in open areas; hold closer to cover')
+                    entry = advice['players'].setdefault(player, {'tips': [], 'rounds': []})
+                    entry['tips'].append('You spend most of your time in open areas; hold closer to cover')
         return advice
+
+    def players_in_region(self, tracks: TrackStore, region: str, t0: float, t1: float) -> List[str]:
+        """Who was in a callout during [t0, t1], e.g. B-main while a smoke was up."""
+        return tracks.players_in(region, t0, t1)
+
+    def open_area_time(self, tracks: TrackStore) -> Dict[str, float]:
+        """Seconds each player spent in open callouts over the whole match."""
+        return {player: tracks.time_in_open(player) for player in tracks.players}
+
+
+class LiveCoach:
+    """Incremental coaching for one live session over a sliding time window.
+
+    Each event updates per-player window counters and the footstep/ability
+    proximity state in amortized O(1): entries leave the window from the
+    front of a single time-ordered deque, so nothing is ever rescanned.
+    `update()` returns only the tips that appeared or went away.
+    """
+    def __init__(self, window: float = 30.0, proximity_window: float = 2.0, smoke_limit: int = 2):
+        self.window = window
+        self.proximity_window = proximity_window
+        self.smoke_limit = smoke_limit
+        self.clock = 0.0
+        self.events = 0
+        # (time, player, counter) for everything currently inside the window, oldest first.
+        self._recent: Deque[Tuple[float, str, str]] = deque()
+        self.counts: Dict[str, Dict[str, int]] = {}
+        self._last: Dict[Tuple[str, str], float] = {}
+        self.tips: Dict[Tuple[str, str], str] = {}
+
+    def update(self, event: Dict) -> Dict[str, List[str]]:
+        """Feed one event (`time` in seconds, `type`, `player`); returns {'added': [...], 'removed': [...]}.
+
+        Events are expected in time order; a late event is counted at the
+        current session time.
+        """
+        self.events += 1
+        self.clock = max(self.clock, event['time'])
+        touched = set(self._expire())
+        player = event.get('player')
+        kind = event.get('type')
+        if player is not None and kind in ('ability_cast', 'footstep'):
+            touched.add(player)
+            other = self._last.get((player, 'footstep' if kind == 'ability_cast' else 'ability_cast'))
+            if other is not None and self.clock - other <= self.proximity_window:
+                self._count(player, 'spacing')
+            self._last[(player, kind)] = self.clock
+            if kind == 'ability_cast':
+                self._count(player, 'abilities')
+                if event.get('ability') == 'smoke':
+                    self._count(player, 'smokes')
+        changes: Dict[str, List[str]] = {'added': [], 'removed': []}
+        for name in sorted(touched):
+            self._apply_rules(name, changes)
+        return changes
+
+    def advice(self) -> Dict:
+        """Current advice in the shape of `generate_advice`, plus per-player window counts."""
+        return {
+            'summary': 'No critical issues detected' if not self.tips else f'{len(self.tips)} active tips',
+            'tips': list(self.tips.values()),
+            'players': {p: dict(c) for p, c in self.counts.items() if any(c.values())},
+            'window': self.window,
+        }
+
+    def _count(self, player: str, counter: str) -> None:
+        counts = self.counts.setdefault(player, {'abilities': 0, 'smokes': 0, 'spacing': 0})
+        counts[counter] += 1
+        self._recent.append((self.clock, player, counter))
+
+    def _expire(self) -> List[str]:
+        expired = []
+        horizon = self.clock - self.window
+        while self._recent and self._recent[0][0] < horizon:
+            _, player, counter = self._recent.popleft()
+            self.counts[player][counter] -= 1
+            expired.append(player)
+        return expired
+
+    def _apply_rules(self, player: str, changes: Dict[str, List[str]]) -> None:
+        counts = self.counts.get(player, {})
+        rules = {
+            'smokes': (counts.get('smokes', 0) > self.smoke_limit,
+                       f'{player} is leaning on smokes; consider swapping some for aggressive plays'),
+            'spacing': (counts.get('spacing', 0) > 0,
+                        f'{player}: footsteps are giving away ability timing; walk before using utility'),
+        }
+        for rule, (active, tip) in rules.items():
+            key = (player, rule)
+            if active and key not in self.tips:
+                self.tips[key] = tip
+                changes['added'].append(tip)
+            elif not active and key in self.tips:
+                changes['removed'].append(self.tips.pop(key))
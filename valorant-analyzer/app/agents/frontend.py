@@ -1,9 +1,11 @@
 from typing import Dict, List
 
+from app.templates import TemplateEngine, default_engine, component_context
+
 class FrontendAgent:
     """Provides UI/UX suggestions, component scaffolds and CSS snippets."""
-    def __init__(self):
-        pass
+    def __init__(self, engine: TemplateEngine = default_engine):
+        self.engine = engine
 
     def suggest_components(self, screen_purpose: str) -> List[Dict]:
         """Return a small list of suggested components for a given screen purpose."""
@@ -18,9 +20,13 @@ class FrontendAgent:
     def generate_css_snippet(self, component_name: str) -> str:
         """Return a small CSS/Tailwind snippet for the named component."""
         if component_name == 'MetricsCard':
-            return ".metrics-card { padding: 12px; border-radius: 8px; background: var(--card-bg); }"
-        return f"/* styles for {component_name} */"
+            return self.engine.render('css_metrics_card')
+        return self.engine.render('css_component', name=component_name)
 
     def create_react_component_stub(self, component_name: str) -> str:
         """Return a tiny React functional component scaffold as string."""
-        return f"function {component_name}() {{\n  return (<div className=\"{component_name.lower()}\">{component_name}</div>)\n}}\nexport default {component_name}\n"
+        return self.engine.render('react_component', **component_context(component_name))
+
+    def create_react_component_stubs(self, component_names: List[str]) -> List[str]:
+        """Batch version of create_react_component_stub (template compiled once)."""
+        return self.engine.render_many('react_component', (component_context(n) for n in component_names))
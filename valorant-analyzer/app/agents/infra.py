@@ -1,9 +1,11 @@
 from typing import Dict
 
+from app.templates import TemplateEngine, default_engine
+
 class InfraAgent:
     """Suggests infrastructure, deployment templates and CI snippets."""
-    def __init__(self):
-        pass
+    def __init__(self, engine: TemplateEngine = default_engine):
+        self.engine = engine
 
     def recommend_deployment(self) -> Dict:
         return {
@@ -11,7 +13,5 @@ class InfraAgent:
             'db': 'Postgres for match metadata, Redis for caching',
         }
 
-    def ci_yaml_snippet(self) -> str:
-        return (
-            "name: CI\n\non: [push]\n\njobs:\n  test:\n    runs-on: ubuntu-latest\n    steps:\n      - uses: actions/checkout@v3\n      - name: Set up Python\n        uses: actions/setup-python@v4\n        with:\n          python-version: '3.10'\n      - name: Install deps\n        run: pip install -r requirements.txt\n      - name: Run tests\n        run: pytest --maxfail=1 -q\n"
-        )
+    def ci_yaml_snippet(self, python_version: str = '3.10') -> str:
+        return self.engine.render('ci_yaml', python_version=python_version)
@@ -1,17 +1,109 @@
-from typing import List, Dict
+from collections import deque
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Tuple
+
+from app.cancel import CancelToken
+from app.decode import FfmpegDecoder
+from app.inference import InferenceBackend, FakeBackend, MicroBatcher
+from app.ocr import OcrStage
+from app.positions import MinimapTracker
+from app.timeline import MediaClock
 
 class VisionAgent:
-    def __init__(self):
-        pass
+    def __init__(self, weights: Optional[memoryview] = None, backend: Optional[InferenceBackend] = None,
+                 batcher: Optional[MicroBatcher] = None, ocr: Optional[OcrStage] = None,
+                 tracker_factory: Optional[Callable[[], MinimapTracker]] = None, decode_size: Optional[Tuple[int, int]] = None,
+                 ring_slots: int = 32):
+        # Read-only model weights; see app.shared.SharedArrayStore for sharing across workers.
+        self.weights = weights
+        # Detector behind analyze_frames; FakeBackend reproduces the scaffold output.
+        self.backend = backend if backend is not None else FakeBackend()
+        # Optional shared batcher that merges frames from concurrent callers.
+        self.batcher = batcher
+        # Optional HUD text reader; when set each frame result gets a 'hud' dict.
+        self.ocr = ocr
+        # Optional minimap tracking; builds one tracker (and TrackStore) per analysis,
+        # since the agent itself is shared by every request of the worker.
+        self.tracker_factory = tracker_factory
+        # (width, height) to decode VODs at; None keeps the scaffold's placeholder frames.
+        self.decode_size = decode_size
+        self.ring_slots = ring_slots
+
+    def new_tracker(self) -> Optional[MinimapTracker]:
+        """A fresh minimap tracker for one VOD, or None if tracking is off."""
+        return self.tracker_factory() if self.tracker_factory is not None else None
+
+    @property
+    def frames_in_flight(self) -> int:
+        """Most frames analyze_frames holds at once (what a FrameRing consumer must keep)."""
+        return self.batcher.max_batch_size if self.batcher is not None else self.backend.max_batch_size
 
     def extract_frames_from_vod(self, vod_bytes: bytes) -> List[bytes]:
         """Stub: returns list of frame placeholders. Replace with ffmpeg extraction in production."""
         # For scaffold: return 5 fake frames (b'' placeholders)
         return [b'frame1', b'frame2', b'frame3', b'frame4', b'frame5']
 
-    def analyze_frames(self, frames: List[bytes]) -> List[Dict]:
-        """Stub: analyze frames and return detected events"""
-        events = []
-        for i, f in enumerate(frames):
-            events.append({'frame': i, 'events': [{'type': 'ability_cast', 'ability': 'smoke', 'player': 'player1'}]})
-        return events
+    def iter_frames(self, vod) -> Iterable[bytes]:
+        """Frames for analyze_frames: decoded through a bounded ring when decode_size is set.
+
+        `vod` is a path or bytes-like content. Memory stays at `ring_slots`
+        frames regardless of VOD length, and decoding overlaps with analysis.
+        """
+        if self.decode_size is None:
+            return self.extract_frames_from_vod(vod)
+        width, height = self.decode_size
+        decoder = FfmpegDecoder(vod, width, height, ring_slots=max(self.ring_slots, self.frames_in_flight + 1))
+        return decoder.frames(hold=self.frames_in_flight)
+
+    def analyze_frames(self, frames: Iterable[bytes], token: Optional[CancelToken] = None,
+                       tracker: Optional[MinimapTracker] = None, clock: Optional[MediaClock] = None) -> List[Dict]:
+        """Run the inference backend (plus OCR and minimap tracking, if configured) over frames.
+
+        Frames are processed in place; at most `frames_in_flight` are referenced
+        at any time, so ring-buffer views can be recycled behind this loop.
+        With a `token`, the loop stops early on cancellation or an exhausted
+        time budget, returning the frames analyzed so far. Minimap positions
+        are recorded into `tracker`, which must belong to this VOD alone, at
+        each frame's time on the VOD's media `clock` (default: the tracker's
+        nominal fps).
+        """
+        return list(self.iter_analyze_frames(frames, token, tracker, clock))
+
+    def iter_analyze_frames(self, frames: Iterable[bytes], token: Optional[CancelToken] = None,
+                            tracker: Optional[MinimapTracker] = None, clock: Optional[MediaClock] = None) -> Iterator[Dict]:
+        """Like analyze_frames, but yields each frame result as soon as it is ready."""
+        index = 0
+        if self.batcher is not None:
+            pending = deque()
+            for frame in frames:
+                if token is not None and token.stop('vision'):
+                    break
+                pending.append((self.batcher.submit(frame), self._frame_stages(index + len(pending), frame, tracker, clock)))
+                # Resolve before pulling the next frame, which may recycle the oldest buffer.
+                if len(pending) >= self.frames_in_flight:
+                    future, extra = pending.popleft()
+                    yield {'frame': index, 'events': future.result(), **extra}
+                    index += 1
+            for future, extra in pending:
+                yield {'frame': index, 'events': future.result(), **extra}
+                index += 1
+        else:
+            it = iter(frames)
+            while token is None or not token.stop('vision'):
+                chunk = list(islice(it, self.backend.max_batch_size))
+                if not chunk:
+                    break
+                results = self.backend.infer_batch(chunk)
+                extras = [self._frame_stages(index + j, f, tracker, clock) for j, f in enumerate(chunk)]
+                for events, extra in zip(results, extras):
+                    yield {'frame': index, 'events': events, **extra}
+                    index += 1
+
+    def _frame_stages(self, index: int, frame: bytes, tracker: Optional[MinimapTracker],
+                      clock: Optional[MediaClock] = None) -> Dict:
+        extra = {}
+        if self.ocr is not None:
+            extra['hud'] = self.ocr.read(frame)
+        if tracker is not None:
+            extra['positions'] = tracker.track(index, frame, t=clock.frame_time(index) if clock is not None else None)
+        return extra
@@ -0,0 +1,46 @@
+import threading
+import time
+from typing import List, Optional
+
+
+class Cancelled(Exception):
+    """Raised at a checkpoint once the analysis was cancelled (e.g. the client disconnected)."""
+
+
+class CancelToken:
+    """Cooperative cancellation and time budget for one analysis request.
+
+    Agents call `stop(stage)` inside their frame/audio loops: it raises
+    `Cancelled` if the request was abandoned, and returns True once the time
+    budget is spent so the loop can stop and hand back what it has. Stages
+    cut short this way are listed in `truncated_stages`.
+    """
+    def __init__(self, budget: Optional[float] = None):
+        self._cancelled = threading.Event()
+        self.deadline = time.monotonic() + budget if budget else None
+        self.reason: Optional[str] = None
+        self.truncated_stages: List[str] = []
+
+    def cancel(self, reason: str = 'cancelled') -> None:
+        self.reason = reason
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def check(self) -> None:
+        if self._cancelled.is_set():
+            raise Cancelled(self.reason)
+
+    def stop(self, stage: str) -> bool:
+        self.check()
+        if self.expired:
+            if stage not in self.truncated_stages:
+                self.truncated_stages.append(stage)
+            return True
+        return False
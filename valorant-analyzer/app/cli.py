@@ -0,0 +1,210 @@
+"""Offline bulk analysis of local VODs.
+
+    python -m app.cli analyze /archive/vct-2026 --jobs 8 --store data/matches
+    python -m app.cli analyze manifest.txt --out results.jsonl
+    python -m app.cli analyze /archive/6h-streams --store data/matches --spill 200000
+    python -m app.cli recoach --store data/matches --report recoach.json
+
+Inputs are directories (scanned recursively for video files) or manifests
+(one path per line). Files are memory-mapped instead of read, analyzed in a
+process pool bounded by --jobs, and each finished match is written
+immediately; re-running the same command skips matches already written.
+`recoach` recomputes advice for stored matches from their saved events.
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import sys
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from app.agents.coach import CoachAgent
+from app.factories import build_audio_agent, build_vision_agent
+from app.pipeline import analyze_vod, analyze_vod_spilled
+from app.clips import index_clips
+from app.recoach import recoach_store
+from app.store import MatchStore
+
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.mov', '.avi', '.webm', '.ts')
+
+_agents = None
+
+
+def iter_inputs(paths: Iterable[str]) -> Iterator[str]:
+    """Expand directories and manifests into VOD paths, in a stable order."""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(VIDEO_EXTENSIONS):
+                        yield os.path.join(root, name)
+        elif path.lower().endswith(VIDEO_EXTENSIONS):
+            yield path
+        else:
+            base = os.path.dirname(os.path.abspath(path))
+            with open(path) as fh:
+                for line in fh:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        yield line if os.path.isabs(line) else os.path.join(base, line)
+
+
+def match_id_for(path: str) -> str:
+    """Stable id from path, size and mtime, so a changed file is re-analyzed."""
+    st = os.stat(path)
+    key = f'{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}'
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def _init_worker():
+    # The same VALORANT_* configured agents as the API server.
+    global _agents
+    _agents = (build_vision_agent(), build_audio_agent(), CoachAgent())
+
+
+def analyze_file(path: str, clips: bool = False, spill: Optional[Tuple[str, int]] = None) -> Dict:
+    """Analyze one VOD straight from the page cache via mmap; `clips` also indexes its highlight clips.
+
+    Frame decoding is given the path, so ffmpeg reads and seeks the file
+    itself; the mapping feeds the audio stage.
+
+    With `spill` (store root, run size) events go through disk runs and the
+    worker writes the match to the store itself; the returned record then
+    carries `stored: True` and no event lists.
+    """
+    if _agents is None:
+        _init_worker()
+    vision, audio, coach = _agents
+    if spill is not None:
+        root, run_size = spill
+        with open(path, 'rb') as fh:
+            size = os.fstat(fh.fileno()).st_size
+            with (mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) if size else nullcontext(b'')) as contents:
+                record = analyze_vod_spilled(vision, audio, coach, contents, MatchStore(root), match_id_for(path),
+                                             run_size=run_size, extra={'source': os.path.abspath(path)}, source=path)
+        return {**record, 'stored': True}
+    with open(path, 'rb') as fh:
+        size = os.fstat(fh.fileno()).st_size
+        if size == 0:
+            result = analyze_vod(vision, audio, coach, b'', source=path)
+        else:
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as contents:
+                result = analyze_vod(vision, audio, coach, contents, source=path)
+    record = {'id': match_id_for(path), 'source': os.path.abspath(path), **result}
+    if clips:
+        record['clips'] = index_clips(result, path) or []
+    return record
+
+
+def _completed_ids(out: Optional[str], store: Optional[MatchStore]) -> Set[str]:
+    done: Set[str] = set(store.ids()) if store is not None else set()
+    if out and os.path.exists(out):
+        with open(out) as fh:
+            for line in fh:
+                try:
+                    done.add(json.loads(line)['id'])
+                except (ValueError, KeyError):
+                    # A line cut short by an interruption; that match is redone.
+                    continue
+    return done
+
+
+def run_batch(paths: List[str], jobs: int, out: Optional[str] = None, store: Optional[MatchStore] = None,
+              resume: bool = True, clips: bool = False, run_size: Optional[int] = None,
+              log=sys.stderr) -> Dict[str, int]:
+    done = _completed_ids(out, store) if resume else set()
+    pending = []
+    skipped = 0
+    for path in iter_inputs(paths):
+        if match_id_for(path) in done:
+            skipped += 1
+        else:
+            pending.append(path)
+    counts = {'analyzed': 0, 'skipped': skipped, 'failed': 0}
+    spill = (store.root, run_size) if run_size and store is not None else None
+    out_fh = open(out, 'a+') if out else None
+    if out_fh is not None and out_fh.tell() > 0:
+        # Terminate a line left half-written by an interrupted run.
+        out_fh.seek(out_fh.tell() - 1)
+        if out_fh.read(1) != '\n':
+            out_fh.write('\n')
+    try:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker) as pool:
+            queue = iter(pending)
+            in_flight = {}
+            # Keep at most 2 * jobs files submitted so huge archives don't queue every path up front.
+            for path in queue:
+                in_flight[pool.submit(analyze_file, path, clips, spill)] = path
+                if len(in_flight) >= 2 * jobs:
+                    break
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    path = in_flight.pop(future)
+                    try:
+                        record = future.result()
+                    except Exception as exc:
+                        counts['failed'] += 1
+                        print(f'failed {path}: {exc!r}', file=log)
+                    else:
+                        if store is not None and not record.get('stored'):
+                            store.save(record['id'], record)
+                        if out_fh is not None:
+                            out_fh.write(json.dumps(record) + '\n')
+                            out_fh.flush()
+                        counts['analyzed'] += 1
+                        print(f'analyzed {path} -> {record["id"]}', file=log)
+                    for path in queue:
+                        in_flight[pool.submit(analyze_file, path, clips, spill)] = path
+                        break
+    finally:
+        if out_fh is not None:
+            out_fh.close()
+    return counts
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m app.cli', description='Valorant Analyzer offline tools')
+    sub = parser.add_subparsers(dest='command', required=True)
+    analyze = sub.add_parser('analyze', help='analyze a directory or manifest of local VODs')
+    analyze.add_argument('inputs', nargs='+', help='VOD files, directories or manifest files')
+    analyze.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='worker processes (core budget)')
+    analyze.add_argument('--out', help='append per-match results to this JSONL file')
+    analyze.add_argument('--store', help='write per-match results into this match store directory')
+    analyze.add_argument('--clips', action='store_true', help='index highlight clips (keyframes probed with ffprobe)')
+    analyze.add_argument('--spill', type=int, metavar='RUN_SIZE',
+                         help='sort events through disk runs of RUN_SIZE events (bounded memory; needs --store)')
+    analyze.add_argument('--no-resume', action='store_true', help='re-analyze matches already written')
+    recoach = sub.add_parser('recoach', help='recompute advice for stored matches after rule changes')
+    recoach.add_argument('--store', required=True, help='match store directory')
+    recoach.add_argument('--report', help='write the advice diff report to this JSON file')
+    recoach.add_argument('--force', action='store_true', help='recoach every match, not only stale ones')
+    args = parser.parse_args(argv)
+
+    if args.command == 'recoach':
+        report = recoach_store(MatchStore(args.store), force=args.force)
+        if args.report:
+            with open(args.report, 'w') as fh:
+                json.dump(report, fh, indent=2)
+        print(json.dumps({k: v for k, v in report.items() if k != 'changes'}))
+        return 0
+
+    if not args.out and not args.store:
+        parser.error('at least one of --out or --store is required')
+    if args.spill and not args.store:
+        parser.error('--spill writes matches straight to the store; --store is required')
+    if args.spill and args.clips:
+        parser.error('--clips needs the event lists and cannot be combined with --spill')
+    store = MatchStore(args.store) if args.store else None
+    counts = run_batch(args.inputs, max(1, args.jobs), out=args.out, store=store, resume=not args.no_resume, clips=args.clips,
+                       run_size=args.spill)
+    print(json.dumps(counts))
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
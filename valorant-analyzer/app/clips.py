@@ -0,0 +1,225 @@
+import os
+import subprocess
+import threading
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.timeline import result_timeline
+
+# Seconds of context kept before and after a highlighted event.
+CLIP_PRE = 3.0
+CLIP_POST = 5.0
+
+
+class KeyframeIndex:
+    """Keyframe times (seconds) and their packet byte offsets in the source file, in time order."""
+    def __init__(self, times: Sequence[float], offsets: Sequence[int]):
+        self.times = array('d', times)
+        self.offsets = array('q', offsets)
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def at_or_before(self, t: float) -> Tuple[float, int]:
+        """The last keyframe at or before t (the first one if t precedes them all)."""
+        i = max(0, bisect_right(self.times, t) - 1)
+        return self.times[i], self.offsets[i]
+
+
+def probe_keyframes(path: str, ffprobe: str = 'ffprobe') -> KeyframeIndex:
+    """Keyframe positions of the first video stream, from packet flags (nothing is decoded).
+
+    Times are relative to the stream's start_time, like event times and
+    ffmpeg's input `-ss`, so containers that do not start at zero (MPEG-TS)
+    stay aligned.
+    """
+    start = subprocess.run(
+        [ffprobe, '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'stream=start_time', '-of', 'csv=p=0', path],
+        check=True, capture_output=True, text=True,
+    ).stdout.strip().strip(',')
+    start_time = float(start) if start not in ('', 'N/A') else 0.0
+    out = subprocess.run(
+        [ffprobe, '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,pos,flags',
+         '-of', 'csv=p=0', path],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    keyframes = []
+    for line in out.splitlines():
+        pts, pos, flags = (line.strip().split(',') + ['', ''])[:3]
+        if 'K' not in flags or pts in ('', 'N/A'):
+            continue
+        keyframes.append((float(pts) - start_time, int(pos) if pos.isdigit() else -1))
+    # Packets are listed in decode order.
+    keyframes.sort()
+    return KeyframeIndex([t for t, _ in keyframes], [pos for _, pos in keyframes])
+
+
+def highlight_events(timeline: Iterable[Dict], window: float = 2.0, merge_gap: float = 1.0) -> List[Dict]:
+    """Events behind the coaching rules: ability casts, and footsteps within `window` of a cast.
+
+    A cast is detected on every frame it is visible, so detections of the
+    same player and ability less than `merge_gap` seconds apart are one
+    highlight: the first detection, with `last_time` set to the latest one.
+    """
+    highlights = []
+    casts: Dict[Tuple[Optional[str], Optional[str]], Dict] = {}
+    last_cast: Optional[float] = None
+    last_step: Optional[Dict] = None
+    for event in timeline:
+        kind = event.get('type')
+        if kind == 'ability_cast':
+            key = (event.get('player'), event.get('ability'))
+            cast = casts.get(key)
+            if cast is not None and event['time'] - cast['last_time'] <= merge_gap:
+                cast['last_time'] = event['time']
+            else:
+                # A footstep just before the cast gave it away; it is only known to matter now.
+                if last_step is not None and event['time'] - last_step['time'] <= window:
+                    highlights.append(last_step)
+                    last_step = None
+                cast = casts[key] = {**event, 'last_time': event['time']}
+                highlights.append(cast)
+            last_cast = event['time']
+        elif kind == 'footstep':
+            if last_cast is not None and event['time'] - last_cast <= window:
+                highlights.append(event)
+            else:
+                last_step = event
+    return sorted(highlights, key=lambda e: e['time'])
+
+
+def build_clip_index(events: Iterable[Dict], keyframes: KeyframeIndex, pre: float = CLIP_PRE,
+                     post: float = CLIP_POST) -> List[Dict]:
+    """One clip per highlighted event, starting at the keyframe at or before `pre` seconds earlier.
+
+    Keyframe-aligned starts let clips be cut with stream copy, and the
+    recorded byte offset is where reading the source has to begin. A merged
+    cast's clip runs until `post` seconds after its last detection.
+    """
+    clips = []
+    for event in events:
+        start, offset = keyframes.at_or_before(max(0.0, event['time'] - pre))
+        clip = {'id': len(clips), 'time': event['time'], 'type': event['type'], 'start': start,
+                'end': event.get('last_time', event['time']) + post, 'byte_offset': offset}
+        for key in ('player', 'ability', 'round'):
+            if key in event:
+                clip[key] = event[key]
+        clips.append(clip)
+    return clips
+
+
+def link_clips(advice: Dict, clips: List[Dict]) -> None:
+    """Cross-link clips and per-player advice, in place.
+
+    Each player's round entry in `advice['players']` gets the ids of that
+    player's clips in the round (`clips`), and each clip gets the player's
+    tips for its round (`tips`). Clips without a `round` are in round 0, as
+    events are when the coach has no round starts.
+    """
+    players = advice.get('players') or {}
+    for entry in players.values():
+        for rnd in entry.get('rounds', []):
+            rnd['clips'] = []
+    for clip in clips:
+        entry = players.get(clip.get('player'))
+        if entry is None:
+            clip['tips'] = []
+            continue
+        rnd = clip.get('round', 0)
+        prefix = f'Round {rnd + 1}:'
+        clip['tips'] = [tip for tip in entry.get('tips', []) if tip.startswith(prefix)]
+        for entry_round in entry.get('rounds', []):
+            if entry_round['round'] == rnd:
+                entry_round['clips'].append(clip['id'])
+
+
+def index_clips(result: Dict, path: str, ffprobe: str = 'ffprobe', window: float = 2.0) -> Optional[List[Dict]]:
+    """Clip index of an analyzed VOD, linked into its advice (see link_clips); None if its keyframes cannot be probed."""
+    try:
+        keyframes = probe_keyframes(path, ffprobe)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    if not len(keyframes):
+        return None
+    clips = build_clip_index(highlight_events(result_timeline(result), window), keyframes)
+    if result.get('advice'):
+        link_clips(result['advice'], clips)
+    return clips
+
+
+class ClipCache:
+    """Cuts clips out of source VODs on first request and keeps them on disk for range reads.
+
+    ffmpeg seeks on the input (`-ss` before `-i`) to the clip's keyframe
+    through the container index and copies streams without re-encoding, so
+    a clip costs a few seconds of reads however large the source is.
+    """
+    def __init__(self, root: str, ffmpeg: str = 'ffmpeg', command: Optional[List[str]] = None):
+        self.root = root
+        self.ffmpeg = ffmpeg
+        # Test hook: a command that receives the source/start/duration/output arguments appended.
+        self.command = command
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def path(self, match_id: str, clip: Dict, source: str) -> str:
+        ext = os.path.splitext(source)[1] or '.mp4'
+        return os.path.join(self.root, match_id, f'{clip["id"]}{ext}')
+
+    def _command(self, source: str, clip: Dict, out: str) -> List[str]:
+        start, duration = f'{clip["start"]:.3f}', f'{clip["end"] - clip["start"]:.3f}'
+        if self.command is not None:
+            return self.command + [source, start, duration, out]
+        return [self.ffmpeg, '-v', 'error', '-ss', start, '-i', source, '-t', duration,
+                '-map', '0', '-c', 'copy', '-avoid_negative_ts', 'make_zero', '-y', out]
+
+    def get(self, match_id: str, clip: Dict, source: str) -> str:
+        """Path of the clip file, extracting it if this is the first request for it."""
+        path = self.path(match_id, clip, source)
+        with self._guard:
+            lock = self._locks.setdefault(path, threading.Lock())
+        with lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                root, ext = os.path.splitext(path)
+                tmp = f'{root}.tmp{ext}'
+                subprocess.run(self._command(source, clip, tmp), check=True, capture_output=True)
+                os.replace(tmp, path)
+        return path
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (first, last) byte positions of a single `bytes=` Range header, or None for the whole file.
+
+    Raises ValueError when the range cannot be satisfied.
+    """
+    if not header or not header.strip().startswith('bytes='):
+        return None
+    spec = header.strip()[6:]
+    if ',' in spec:
+        # Multipart ranges are not served; the whole file is an allowed answer.
+        return None
+    first, _, last = spec.partition('-')
+    if not first:
+        length = int(last)
+        if length <= 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    first_byte = int(first)
+    last_byte = min(int(last), size - 1) if last else size - 1
+    if first_byte >= size or last_byte < first_byte:
+        raise ValueError(header)
+    return first_byte, last_byte
+
+
+def iter_file(path: str, first: int, last: int, chunk_size: int = 256 * 1024) -> Iterator[bytes]:
+    with open(path, 'rb') as fh:
+        fh.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            chunk = fh.read(min(chunk_size, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
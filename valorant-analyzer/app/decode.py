@@ -0,0 +1,202 @@
+import queue
+import subprocess
+import threading
+from collections import deque
+from typing import Iterator, List, Optional, Union
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; frames are still served as memoryviews
+    np = None
+
+
+class DecodeError(RuntimeError):
+    """ffmpeg failed on the input (corrupt or unsupported VOD); the message ends with its stderr."""
+
+
+class FrameRing:
+    """Fixed pool of preallocated frame buffers between one producer and one consumer.
+
+    All slots live in one contiguous allocation made up front, so memory is
+    capped at `slots * frame_size` bytes however long the video is. The
+    producer blocks in `acquire()` until the consumer has released a slot.
+    """
+    def __init__(self, slots: int, frame_size: int):
+        self.slots = slots
+        self.frame_size = frame_size
+        self.storage = np.empty(slots * frame_size, dtype=np.uint8) if np is not None else bytearray(slots * frame_size)
+        view = memoryview(self.storage).cast('B')
+        self.buffers: List[memoryview] = [view[i * frame_size:(i + 1) * frame_size] for i in range(slots)]
+        self._free: queue.Queue = queue.Queue()
+        self._filled: queue.Queue = queue.Queue()
+        for i in range(slots):
+            self._free.put(i)
+
+    # Producer side
+
+    def acquire(self) -> int:
+        return self._free.get()
+
+    def publish(self, slot: int) -> None:
+        self._filled.put(slot)
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self._filled.put(error)
+
+    # Consumer side
+
+    def release(self, slot: int) -> None:
+        self._free.put(slot)
+
+    def drain(self) -> None:
+        """Return every filled but unconsumed slot to the free list (used on shutdown)."""
+        while True:
+            try:
+                item = self._filled.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(item, int):
+                self.release(item)
+
+    def frames(self, hold: int = 1) -> Iterator[memoryview]:
+        """Yield filled buffers in order, keeping at most `hold` of them checked out.
+
+        A yielded view is only valid until `hold` more frames have been taken;
+        consumers that batch frames must pass their batch size.
+        """
+        if hold >= self.slots:
+            raise ValueError(f'ring of {self.slots} slots cannot hold {hold} frames and still decode ahead')
+        held: deque = deque()
+        try:
+            while True:
+                item = self._filled.get()
+                if item is None:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                if len(held) >= hold:
+                    self.release(held.popleft())
+                held.append(item)
+                yield self.buffers[item]
+        finally:
+            while held:
+                self.release(held.popleft())
+
+
+def as_array(frame: memoryview, width: int, height: int):
+    """Zero-copy (height, width, 3) uint8 view of a ring frame; requires numpy."""
+    return np.frombuffer(frame, dtype=np.uint8).reshape(height, width, 3)
+
+
+class FfmpegDecoder:
+    """Decodes a VOD to raw RGB24 frames through an ffmpeg pipe into a FrameRing.
+
+    `source` is a file path, or bytes-like content that is streamed to
+    ffmpeg's stdin. Decoding runs in a producer thread, so it overlaps with
+    whatever the consumer of `frames()` does (inference, OCR, tracking).
+    If ffmpeg exits with an error, `frames()` raises DecodeError with the
+    tail of its stderr once the frames decoded before the error are consumed.
+
+    By default every decoded frame is emitted once, untouched by ffmpeg's
+    constant-frame-rate logic, so frame i is packet i of the probed PTS
+    table (app.timeline.MediaClock) even on variable-frame-rate captures.
+    `fps` resamples to a constant rate instead (frames are duplicated or
+    dropped), so frame times are then index / fps. `fps_mode_option` is
+    '-vsync' for ffmpeg older than 5.1.
+    """
+    def __init__(self, source: Union[str, bytes, memoryview], width: int, height: int, fps: Optional[float] = None,
+                 ring_slots: int = 32, ffmpeg: str = 'ffmpeg', command: Optional[List[str]] = None,
+                 fps_mode_option: str = '-fps_mode'):
+        self.source = source
+        self.width = width
+        self.height = height
+        self.frame_size = width * height * 3
+        self.ring = FrameRing(ring_slots, self.frame_size)
+        self.command = command or self._command(ffmpeg, fps, fps_mode_option)
+        self.frames_decoded = 0
+        self.stderr_tail: deque = deque(maxlen=20)
+        self._stopping = False
+        self._stderr_reader: Optional[threading.Thread] = None
+
+    def _command(self, ffmpeg: str, fps: Optional[float], fps_mode_option: str = '-fps_mode') -> List[str]:
+        src = self.source if isinstance(self.source, str) else 'pipe:0'
+        cmd = [ffmpeg, '-v', 'error', '-i', src]
+        if fps:
+            cmd += ['-r', str(fps)]
+        else:
+            # rawvideo output defaults to constant frame rate; keep the source's frames as decoded.
+            cmd += [fps_mode_option, 'passthrough']
+        return cmd + ['-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{self.width}x{self.height}', 'pipe:1']
+
+    def frames(self, hold: int = 1) -> Iterator[memoryview]:
+        feed = not isinstance(self.source, str)
+        proc = subprocess.Popen(self.command, stdin=subprocess.PIPE if feed else subprocess.DEVNULL,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._stopping = False
+        # Drained continuously so a chatty ffmpeg never blocks on a full stderr pipe.
+        self._stderr_reader = threading.Thread(target=self._read_stderr, args=(proc,), name='ffmpeg-stderr', daemon=True)
+        threads = [threading.Thread(target=self._produce, args=(proc,), name='ffmpeg-reader', daemon=True),
+                   self._stderr_reader]
+        if feed:
+            threads.append(threading.Thread(target=self._feed, args=(proc,), name='ffmpeg-feeder', daemon=True))
+        for t in threads:
+            t.start()
+        try:
+            yield from self.ring.frames(hold)
+        finally:
+            self._stopping = True
+            proc.kill()
+            # If the consumer stopped early the reader may be waiting for a free slot.
+            while threads[0].is_alive():
+                self.ring.drain()
+                threads[0].join(timeout=0.05)
+            proc.wait()
+            for t in threads[1:]:
+                t.join()
+
+    def _feed(self, proc: subprocess.Popen) -> None:
+        try:
+            view = memoryview(self.source)
+            for offset in range(0, len(view), 1 << 20):
+                proc.stdin.write(view[offset:offset + (1 << 20)])
+        except (BrokenPipeError, ValueError, OSError):
+            pass
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+
+    def _read_stderr(self, proc: subprocess.Popen) -> None:
+        for line in proc.stderr:
+            self.stderr_tail.append(line.decode(errors='replace').rstrip())
+
+    def _produce(self, proc: subprocess.Popen) -> None:
+        try:
+            while True:
+                slot = self.ring.acquire()
+                buf = self.ring.buffers[slot]
+                filled = 0
+                while filled < self.frame_size:
+                    n = proc.stdout.readinto(buf[filled:])
+                    if not n:
+                        break
+                    filled += n
+                if filled < self.frame_size:
+                    # EOF (a trailing partial frame is dropped).
+                    self.ring.release(slot)
+                    break
+                self.frames_decoded += 1
+                self.ring.publish(slot)
+        except (OSError, ValueError) as exc:
+            self.ring.finish(exc)
+            return
+        returncode = proc.wait()
+        if returncode != 0 and not self._stopping:
+            # stderr is at EOF once ffmpeg has exited.
+            self._stderr_reader.join(timeout=1.0)
+            tail = '\n'.join(self.stderr_tail)
+            self.ring.finish(DecodeError(f'ffmpeg exited with status {returncode} after {self.frames_decoded} frames: {tail}'))
+            return
+        self.ring.finish()
+
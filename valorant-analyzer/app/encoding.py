@@ -0,0 +1,165 @@
+import gzip
+import json
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # optional: only needed for application/msgpack responses
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # optional: zstd falls back to gzip
+    zstandard = None
+
+JSON = 'application/json'
+COLUMNAR_JSON = 'application/vnd.valorant.columnar+json'
+MSGPACK = 'application/msgpack'
+
+# Responses smaller than this are not worth compressing.
+MIN_COMPRESS_BYTES = 1024
+
+
+def _columns(rows: List[Dict], strings: Dict[str, int]) -> Tuple[Dict[str, List], List[str]]:
+    """Turn dict rows into per-key columns.
+
+    In columns holding only strings, values become indexes into `strings`;
+    returns the columns and the names of those string columns.
+    """
+    keys: List[str] = []
+    for row in rows:
+        for key in row:
+            if key not in keys:
+                keys.append(key)
+    string_keys = [k for k in keys if all(isinstance(r[k], str) for r in rows if r.get(k) is not None)]
+    columns: Dict[str, List] = {key: [] for key in keys}
+    for row in rows:
+        for key in keys:
+            value = row.get(key)
+            if value is not None and key in string_keys:
+                value = strings.setdefault(value, len(strings))
+            columns[key].append(value)
+    return columns, string_keys
+
+
+def columnar(result: Dict) -> Dict:
+    """Columnar form of an analysis result.
+
+    Vision results become two tables: `frames`, one row per analyzed frame
+    with its per-frame fields (`frame`, `time`, `hud`, `positions`...), and
+    `vision`, one row per detected event keyed by its `frame`. Audio events
+    stay one row each, and every repeated string ('ability_cast', 'smoke',
+    player names...) is stored once in `strings` and referenced by index.
+    Columns whose string values are indexes are listed in `string_columns`;
+    missing values are null.
+    """
+    strings: Dict[str, int] = {}
+    entries = result.get('vision', [])
+    frame_rows = [{k: v for k, v in entry.items() if k != 'events'} for entry in entries]
+    vision_rows = [{'frame': entry['frame'], **event} for entry in entries for event in entry.get('events', [])]
+    frames, frame_strings = _columns(frame_rows, strings)
+    vision, vision_strings = _columns(vision_rows, strings)
+    audio, audio_strings = _columns(result.get('audio', []), strings)
+    encoded = {k: v for k, v in result.items() if k not in ('vision', 'audio')}
+    encoded.update({
+        'encoding': 'columnar-v2',
+        'strings': list(strings),
+        'string_columns': {'frames': frame_strings, 'vision': vision_strings, 'audio': audio_strings},
+        'frames': frames,
+        'vision': vision,
+        'audio': audio,
+    })
+    return encoded
+
+
+def _qvalues(header: Optional[str]) -> Dict[str, float]:
+    """{token: q} from an Accept or Accept-Encoding header; q defaults to 1 and is 0 if unparsable."""
+    offered = {}
+    for part in (header or '').lower().split(','):
+        token, *params = [p.strip() for p in part.split(';')]
+        q = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if token:
+            offered[token] = q
+    return offered
+
+
+def choose_format(accept: Optional[str]) -> str:
+    """Pick the response media type from an Accept header (q=0 means refused).
+
+    The highest-q supported type wins; ties prefer MessagePack, then
+    columnar JSON, then JSON, which is also the fallback.
+    """
+    offered = _qvalues(accept)
+    candidates = [(max(offered.get(MSGPACK, 0), offered.get('application/x-msgpack', 0)), MSGPACK)] if msgpack is not None else []
+    candidates += [(offered.get(COLUMNAR_JSON, 0), COLUMNAR_JSON), (offered.get(JSON, 0), JSON)]
+    q, media_type = max(candidates, key=lambda c: c[0])
+    return media_type if q > 0 else JSON
+
+
+def choose_compression(accept_encoding: Optional[str]) -> str:
+    """Pick 'zstd', 'gzip' or 'identity' from an Accept-Encoding header (q=0 means refused)."""
+    offered = _qvalues(accept_encoding)
+    if zstandard is not None and offered.get('zstd', 0) > 0:
+        return 'zstd'
+    if offered.get('gzip', 0) > 0:
+        return 'gzip'
+    return 'identity'
+
+
+def encode(result: Dict, accept: Optional[str] = None, accept_encoding: Optional[str] = None) -> Tuple[bytes, Dict[str, str]]:
+    """Serialize an analysis result as negotiated; returns (body, headers).
+
+    JSON rows remain the default. Columnar JSON and MessagePack (always
+    columnar) are served when asked for in Accept, and bodies are compressed
+    with zstd or gzip per Accept-Encoding.
+    """
+    media_type = choose_format(accept)
+    if media_type == MSGPACK:
+        body = msgpack.packb(columnar(result), use_bin_type=True)
+    elif media_type == COLUMNAR_JSON:
+        body = json.dumps(columnar(result), separators=(',', ':')).encode()
+    else:
+        body = json.dumps(result, separators=(',', ':')).encode()
+    headers = {'Content-Type': media_type, 'Vary': 'Accept, Accept-Encoding'}
+    compression = choose_compression(accept_encoding) if len(body) >= MIN_COMPRESS_BYTES else 'identity'
+    if compression == 'zstd':
+        body = zstandard.ZstdCompressor(level=3).compress(body)
+        headers['Content-Encoding'] = 'zstd'
+    elif compression == 'gzip':
+        body = gzip.compress(body, compresslevel=5)
+        headers['Content-Encoding'] = 'gzip'
+    return body, headers
+
+
+def decode_columnar(encoded: Dict) -> Dict:
+    """Inverse of `columnar` (for consumers and tests): back to row-form events."""
+    strings = encoded['strings']
+
+    def rows(section: str) -> List[Dict]:
+        columns = encoded[section]
+        text = set(encoded['string_columns'][section])
+        n = len(next(iter(columns.values()), []))
+        out = []
+        for i in range(n):
+            row = {}
+            for key, col in columns.items():
+                value = col[i]
+                if value is None:
+                    continue
+                row[key] = strings[value] if key in text else value
+            out.append(row)
+        return out
+
+    vision = [{**row, 'events': []} for row in rows('frames')]
+    by_frame = {entry['frame']: entry for entry in vision}
+    for row in rows('vision'):
+        by_frame[row.pop('frame')]['events'].append(row)
+    result = {k: v for k, v in encoded.items() if k not in ('encoding', 'strings', 'string_columns', 'frames', 'vision', 'audio')}
+    result.update({'vision': vision, 'audio': rows('audio')})
+    return result
@@ -0,0 +1,59 @@
+"""Agent factories shared by the API server and the offline CLI.
+
+Both build their agents from the same VALORANT_* settings. The server
+registers these factories with its AgentRegistry, so agents are built on
+first use (or by the startup warm-up) and worker start and --reload do not
+pay model-load cost. CLI workers call them once per process.
+"""
+import os
+
+from app.shared import SharedArrayStore
+from app.inference import FakeBackend, OnnxCpuBackend, MicroBatcher
+from app.ocr import OcrStage
+from app.positions import CalloutGrid, MinimapTracker, TrackStore
+from app.agents.vision import VisionAgent
+from app.agents.audio import AudioAgent
+
+# Large read-only arrays are memory-mapped from VALORANT_MODEL_DIR so every
+# worker shares one copy of the pages.
+model_store = SharedArrayStore(os.environ.get('VALORANT_MODEL_DIR', 'models'))
+
+
+def build_vision_agent() -> VisionAgent:
+    # VALORANT_DECODE_SIZE (e.g. 1280x720) enables ffmpeg decoding into a bounded frame ring.
+    decode_size = os.environ.get('VALORANT_DECODE_SIZE')
+    size = tuple(int(v) for v in decode_size.split('x')) if decode_size else None
+    # VALORANT_ONNX_MODEL selects the ONNX Runtime CPU detector; otherwise the fake backend.
+    model_path = os.environ.get('VALORANT_ONNX_MODEL')
+    if model_path:
+        if size is None:
+            # Without decoding the frames are scaffold placeholders, not RGB24 images.
+            raise RuntimeError('VALORANT_ONNX_MODEL requires VALORANT_DECODE_SIZE (the RGB24 frame size fed to the model)')
+        backend = OnnxCpuBackend(model_path, labels=[{'type': 'ability_cast', 'ability': 'smoke'}],
+                                 width=size[0], height=size[1])
+    else:
+        backend = FakeBackend()
+    # One batcher per worker gathers frames from all in-flight requests.
+    batcher = MicroBatcher(
+        backend,
+        max_batch_size=int(os.environ.get('VALORANT_BATCH_SIZE', backend.max_batch_size)),
+        max_wait=float(os.environ.get('VALORANT_BATCH_WAIT_MS', '5')) / 1000.0,
+    )
+    # HUD OCR needs decoded RGB24 frames; VALORANT_OCR=0 turns it off.
+    ocr = OcrStage(*size) if size and os.environ.get('VALORANT_OCR', '1') != '0' else None
+    # VALORANT_MAP picks the minimap callouts; an empty value turns tracking off.
+    # Every analysis gets its own TrackStore; the grid is read-only and shared.
+    map_name = os.environ.get('VALORANT_MAP', 'ascent')
+    tracker_factory = None
+    if map_name:
+        grid = CalloutGrid.for_map(map_name)
+        tracker_factory = lambda: MinimapTracker(TrackStore(grid))
+    return VisionAgent(
+        weights=model_store.load('vision'), backend=backend, batcher=batcher, ocr=ocr,
+        tracker_factory=tracker_factory, decode_size=size,
+        ring_slots=int(os.environ.get('VALORANT_RING_SLOTS', '32')),
+    )
+
+
+def build_audio_agent() -> AudioAgent:
+    return AudioAgent(lookup=model_store.load('audio'))
@@ -0,0 +1,183 @@
+import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Optional, Sequence
+
+
+class InferenceBackend:
+    """Interface for per-frame detectors used by VisionAgent.
+
+    `infer_batch` receives a batch of frames and returns one list of event
+    dicts per frame, in order.
+    """
+    max_batch_size = 16
+
+    def infer_batch(self, frames: Sequence[bytes]) -> List[List[Dict]]:
+        raise NotImplementedError
+
+
+class FakeBackend(InferenceBackend):
+    """Deterministic backend for tests and the scaffold: the same events for every frame."""
+    def __init__(self, events: Optional[List[Dict]] = None):
+        self.events = events if events is not None else [{'type': 'ability_cast', 'ability': 'smoke', 'player': 'player1'}]
+        self.batch_sizes: List[int] = []
+
+    def infer_batch(self, frames: Sequence[bytes]) -> List[List[Dict]]:
+        self.batch_sizes.append(len(frames))
+        return [[dict(e) for e in self.events] for _ in frames]
+
+
+class OnnxCpuBackend(InferenceBackend):
+    """ONNX Runtime detector on the CPU execution provider.
+
+    Frames must be raw RGB24 at `width` x `height` (what the ffmpeg decoder
+    emits). The model is expected to take an NCHW float32 batch and return,
+    per frame, rows of `[x1, y1, x2, y2, score, class_id]`; `labels` maps
+    class ids to the event fields (e.g. `{'type': 'ability_cast', 'ability': 'smoke'}`).
+    """
+    def __init__(self, model_path: str, labels: List[Dict], width: int = 640, height: int = 640,
+                 score_threshold: float = 0.5, threads: int = 0, max_batch_size: int = 16):
+        try:
+            import numpy as np
+            import onnxruntime as ort
+        except ImportError as exc:
+            raise RuntimeError('OnnxCpuBackend requires numpy and onnxruntime (pip install numpy onnxruntime)') from exc
+        self._np = np
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = threads
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=opts, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.labels = labels
+        self.width = width
+        self.height = height
+        self.score_threshold = score_threshold
+        self.max_batch_size = max_batch_size
+
+    def _preprocess(self, frame):
+        np = self._np
+        pixels = np.frombuffer(frame, dtype=np.uint8).reshape(self.height, self.width, 3)
+        return pixels.transpose(2, 0, 1).astype(np.float32) / 255.0
+
+    def infer_batch(self, frames: Sequence[bytes]) -> List[List[Dict]]:
+        batch = self._np.stack([self._preprocess(f) for f in frames])
+        detections = self.session.run(None, {self.input_name: batch})[0]
+        results = []
+        for rows in detections:
+            events = []
+            for x1, y1, x2, y2, score, class_id in rows:
+                if score < self.score_threshold or not 0 <= int(class_id) < len(self.labels):
+                    continue
+                event = dict(self.labels[int(class_id)])
+                event['score'] = float(score)
+                event['box'] = [float(x1), float(y1), float(x2), float(y2)]
+                events.append(event)
+            results.append(events)
+        return results
+
+
+class MicroBatcher:
+    """Groups frames submitted from many threads into backend batches.
+
+    A batch is dispatched when it reaches `max_batch_size` frames or when
+    `max_wait` seconds have passed since its first frame arrived, so frames
+    from concurrent requests and live sessions share one `infer_batch` call.
+    """
+    def __init__(self, backend: InferenceBackend, max_batch_size: Optional[int] = None, max_wait: float = 0.005):
+        self.backend = backend
+        self.max_batch_size = max_batch_size or backend.max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.frames = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._closed = False
+        # The worker thread starts on first submit(), in the process that uses it: a
+        # batcher built before a fork (gunicorn --preload) gets a fresh thread per worker.
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=lambda ref=weakref.ref(self): _reset_after_fork(ref))
+
+    def _after_fork(self) -> None:
+        # Only the forking thread survives; the parent's worker thread, queue and lock are unusable.
+        self._queue = queue.Queue()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, args=(self._queue,), name='vision-microbatcher', daemon=True)
+                thread.start()
+                self._thread = thread
+
+    def submit(self, frame: bytes) -> Future:
+        if self._closed:
+            raise RuntimeError('MicroBatcher is closed')
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((frame, future))
+        return future
+
+    def submit_many(self, frames: Iterable[bytes]) -> List[Future]:
+        return [self.submit(f) for f in frames]
+
+    def stats(self) -> Dict:
+        return {
+            'batches': self.batches,
+            'frames': self.frames,
+            'mean_batch_size': self.frames / self.batches if self.batches else 0.0,
+        }
+
+    def close(self) -> None:
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self, requests: queue.Queue):
+        while True:
+            item = requests.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._dispatch(batch)
+            if stop:
+                return
+
+    def _dispatch(self, batch):
+        self.batches += 1
+        self.frames += len(batch)
+        try:
+            results = self.backend.infer_batch([frame for frame, _ in batch])
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+        for (_, future), events in zip(batch, results):
+            future.set_result(events)
+
+
+def _reset_after_fork(ref) -> None:
+    batcher = ref()
+    if batcher is not None:
+        batcher._after_fork()
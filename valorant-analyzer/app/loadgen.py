@@ -0,0 +1,259 @@
+"""Record live analysis sessions and replay them against the live endpoint at scale.
+
+    python -m app.loadgen synthesize session.jsonl --duration 60 --fps 30
+    python -m app.loadgen replay session.jsonl --url http://localhost:8002 --sessions 50 --speed 4
+
+A recording is JSONL, one chunk per line: `{"t": seconds since session
+start, "kind": "frame" | "audio", "size": bytes}`. Replay sends every chunk
+of every simulated session at its recorded time (divided by --speed) and
+reports per-session latency percentiles, dropped frames and the server's
+CPU/memory use over the run.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import math
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, TextIO
+
+
+class SessionRecorder:
+    """Appends chunk timing of live sessions to one JSONL recording per session.
+
+    record() only timestamps the chunk and queues it, so it is safe to call
+    from the event loop; a writer thread appends to one open file per
+    session. At most `max_sessions` sessions are kept open: finish() closes
+    one, and the least recently recorded is closed when that is exceeded.
+    """
+    def __init__(self, root: str, max_sessions: int = 1024):
+        self.root = root
+        self.max_sessions = max_sessions
+        # Only the writer thread touches these.
+        self._starts: Dict[str, float] = {}
+        self._files: 'OrderedDict[str, TextIO]' = OrderedDict()
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name='session-recorder', daemon=True)
+                thread.start()
+                self._thread = thread
+
+    def record(self, session_id: str, kind: str, size: int) -> None:
+        self._ensure_started()
+        self._queue.put((session_id, kind, size, time.monotonic()))
+
+    def finish(self, session_id: str) -> None:
+        """Close the session's recording; a later chunk with the same id starts a new one at t=0."""
+        self._ensure_started()
+        self._queue.put((session_id, None, 0, 0.0))
+
+    def flush(self) -> None:
+        """Block until every queued chunk is written and flushed."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    for session_id in list(self._files):
+                        self._close(session_id)
+                    return
+                session_id, kind, size, now = item
+                if kind is None:
+                    self._close(session_id)
+                else:
+                    self._write(session_id, kind, size, now)
+                if self._queue.empty():
+                    for fh in self._files.values():
+                        fh.flush()
+            finally:
+                self._queue.task_done()
+
+    def _write(self, session_id: str, kind: str, size: int, now: float) -> None:
+        fh = self._files.get(session_id)
+        if fh is None:
+            safe_id = ''.join(c for c in session_id if c.isalnum() or c in '-_') or 'session'
+            fh = self._files[session_id] = open(os.path.join(self.root, f'{safe_id}.jsonl'), 'a')
+            while len(self._files) > self.max_sessions:
+                self._close(next(iter(self._files)))
+        else:
+            self._files.move_to_end(session_id)
+        start = self._starts.setdefault(session_id, now)
+        fh.write(json.dumps({'t': round(now - start, 6), 'kind': kind, 'size': size}) + '\n')
+
+    def _close(self, session_id: str) -> None:
+        fh = self._files.pop(session_id, None)
+        if fh is not None:
+            fh.close()
+        self._starts.pop(session_id, None)
+
+
+def load_recording(path: str) -> List[Dict]:
+    with open(path) as fh:
+        chunks = [json.loads(line) for line in fh if line.strip()]
+    return sorted(chunks, key=lambda c: c['t'])
+
+
+def synthesize(duration: float, fps: float = 30.0, audio_interval: float = 0.1,
+               frame_size: int = 60_000, audio_size: int = 3_200) -> List[Dict]:
+    """A recording of a steady stream: frames at `fps` plus fixed-size audio chunks."""
+    chunks = [{'t': round(i / fps, 6), 'kind': 'frame', 'size': frame_size} for i in range(int(duration * fps))]
+    chunks += [{'t': round(i * audio_interval, 6), 'kind': 'audio', 'size': audio_size}
+               for i in range(int(duration / audio_interval))]
+    return sorted(chunks, key=lambda c: c['t'])
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile; None for an empty list."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+async def _replay_session(client, path: str, session_id: str, chunks: List[Dict], speed: float,
+                          drop_after: float, with_payload: bool, started: float) -> Dict:
+    latencies: List[float] = []
+    dropped = 0
+    errors = 0
+
+    async def send(seq: int, chunk: Dict):
+        nonlocal dropped, errors
+        body = {'session_id': session_id, 'kind': chunk['kind'], 'seq': seq, 't': chunk['t'], 'size': chunk['size']}
+        if with_payload:
+            body['data'] = base64.b64encode(bytes(chunk['size'])).decode()
+        sent = time.monotonic()
+        try:
+            res = await client.post(path, json=body)
+            ok = res.status_code < 400
+        except Exception:
+            ok = False
+        latency = time.monotonic() - sent
+        latencies.append(latency)
+        if not ok:
+            errors += 1
+        # A frame is dropped if it failed or its result arrived too late to be useful live.
+        if chunk['kind'] == 'frame' and (not ok or latency > drop_after):
+            dropped += 1
+
+    tasks = []
+    for seq, chunk in enumerate(chunks):
+        delay = started + chunk['t'] / speed - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(send(seq, chunk)))
+    await asyncio.gather(*tasks)
+    ms = [v * 1000.0 for v in latencies]
+    return {
+        'session_id': session_id,
+        'chunks': len(chunks),
+        'frames': sum(1 for c in chunks if c['kind'] == 'frame'),
+        'dropped_frames': dropped,
+        'errors': errors,
+        'latency_ms': {'p50': percentile(ms, 50), 'p95': percentile(ms, 95), 'p99': percentile(ms, 99), 'max': max(ms, default=None)},
+    }
+
+
+async def _resources(client) -> Optional[Dict]:
+    try:
+        res = await client.get('/health/resources')
+        return res.json() if res.status_code == 200 else None
+    except Exception:
+        return None
+
+
+async def replay(chunks: List[Dict], client, sessions: int = 1, speed: float = 1.0, path: str = '/analyze/live',
+                 drop_after: Optional[float] = None, with_payload: bool = False) -> Dict:
+    """Replay `chunks` as `sessions` concurrent live sessions through an httpx.AsyncClient.
+
+    `drop_after` is the latency (seconds) past which a frame counts as
+    dropped; it defaults to one frame interval of the recording at `speed`.
+    """
+    if drop_after is None:
+        frame_times = [c['t'] for c in chunks if c['kind'] == 'frame']
+        interval = (frame_times[-1] - frame_times[0]) / (len(frame_times) - 1) if len(frame_times) > 1 else 1 / 30
+        drop_after = interval / speed
+    before = await _resources(client)
+    started = time.monotonic()
+    results = await asyncio.gather(*[
+        _replay_session(client, path, f'loadgen-{i}', chunks, speed, drop_after, with_payload, started)
+        for i in range(sessions)
+    ])
+    wall = time.monotonic() - started
+    after = await _resources(client)
+    report = {'sessions': results, 'speed': speed, 'wall_seconds': wall, 'drop_after_ms': drop_after * 1000.0}
+    if before and after:
+        cpu = (after['cpu_user'] + after['cpu_system']) - (before['cpu_user'] + before['cpu_system'])
+        report['server'] = {'cpu_seconds': cpu, 'cpu_utilization': cpu / wall if wall else None,
+                            'max_rss_kb': after['max_rss_kb'], 'threads': after['threads']}
+    all_p95 = [r['latency_ms']['p95'] for r in results if r['latency_ms']['p95'] is not None]
+    report['summary'] = {
+        'dropped_frames': sum(r['dropped_frames'] for r in results),
+        'errors': sum(r['errors'] for r in results),
+        'worst_p95_ms': max(all_p95, default=None),
+    }
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m app.loadgen', description='Live session replay and load generation')
+    sub = parser.add_subparsers(dest='command', required=True)
+    syn = sub.add_parser('synthesize', help='write a synthetic session recording')
+    syn.add_argument('out')
+    syn.add_argument('--duration', type=float, default=60.0)
+    syn.add_argument('--fps', type=float, default=30.0)
+    syn.add_argument('--audio-interval', type=float, default=0.1)
+    rep = sub.add_parser('replay', help='replay a recording against a running server')
+    rep.add_argument('recording')
+    rep.add_argument('--url', default='http://localhost:8002')
+    rep.add_argument('--path', default='/analyze/live')
+    rep.add_argument('--sessions', type=int, default=1, help='concurrent simulated sessions')
+    rep.add_argument('--speed', type=float, default=1.0, help='replay speed multiplier (1 = real time)')
+    rep.add_argument('--drop-after-ms', type=float, help='latency past which a frame counts as dropped')
+    rep.add_argument('--with-payload', action='store_true', help='send zero-filled chunk bodies of the recorded size')
+    args = parser.parse_args(argv)
+
+    if args.command == 'synthesize':
+        with open(args.out, 'w') as fh:
+            for chunk in synthesize(args.duration, args.fps, args.audio_interval):
+                fh.write(json.dumps(chunk) + '\n')
+        return 0
+
+    import httpx  # dev dependency; only needed to replay
+
+    async def _run():
+        limits = httpx.Limits(max_connections=max(10, args.sessions * 4))
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30.0) as client:
+            return await replay(load_recording(args.recording), client, sessions=args.sessions, speed=args.speed,
+                                path=args.path, with_payload=args.with_payload,
+                                drop_after=args.drop_after_ms / 1000.0 if args.drop_after_ms else None)
+
+    report = asyncio.run(_run())
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
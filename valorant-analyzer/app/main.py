@@ -1,8 +1,36 @@
-from fastapi import FastAPI, UploadFile, File
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import mimetypes
+import os
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+
+from functools import lru_cache
+from typing import List, Optional
+
+import anyio
+from fastapi import FastAPI, UploadFile, File, Request, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from app.agents.vision import VisionAgent
-from app.agents.audio import AudioAgent
-from app.agents.coach import CoachAgent
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from app.registry import AgentRegistry
+from app.shared import preload, memory_report, mapping_report
+from app.factories import model_store, build_vision_agent, build_audio_agent
+from app.pipeline import analyze_vod as run_analysis
+from app.loadgen import SessionRecorder
+from app.encoding import encode
+from app.cancel import CancelToken, Cancelled
+from app.scheduler import StageScheduler
+from app.store import MatchStore
+from app.decode import DecodeError
+from app.clips import ClipCache, index_clips, iter_file, parse_range
+from app.timeline import EventIndex, JsonlEventIndex
+from app.agents.coach import CoachAgent, LiveCoach
 
 app = FastAPI(title="Valorant Analyzer")
 
@@ -14,25 +42,285 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-vision = VisionAgent()
-audio = AudioAgent()
-coach = CoachAgent()
+
+registry = AgentRegistry()
+registry.register('vision', build_vision_agent)
+registry.register('audio', build_audio_agent)
+registry.register('coach', CoachAgent)
+
+# Preload-then-fork: build agents at import time so a preforking server
+# (gunicorn --preload) shares them copy-on-write with its workers.
+if os.environ.get('VALORANT_PRELOAD') == '1':
+    preload(registry)
+
+# VALORANT_STORE keeps analyzed matches (same layout as `app.cli --store`) so their
+# events can be paged through /matches/{match_id}/events.
+match_store = MatchStore(os.environ['VALORANT_STORE']) if os.environ.get('VALORANT_STORE') else None
+# With VALORANT_KEEP_VIDEOS=1 uploaded VODs are kept in the store too, and
+# highlight clips are indexed so they can be served from /matches/{match_id}/clips.
+keep_videos = os.environ.get('VALORANT_KEEP_VIDEOS') == '1'
+
+# Concurrent slots shared by the vision, audio and coach stages of /analyze/vod,
+# rebalanced from observed stage load (VALORANT_STAGE_SLOTS, default 2 per CPU).
+scheduler = StageScheduler(
+    ('vision', 'audio', 'coach'),
+    slots=int(os.environ['VALORANT_STAGE_SLOTS']) if os.environ.get('VALORANT_STAGE_SLOTS') else None,
+    interval=float(os.environ.get('VALORANT_REBALANCE_SECONDS', '1')),
+)
+# Admission for /analyze/vod: a pipeline waits here, on the event loop, rather than on a stage
+# inside a worker thread, so waiting analyses never take threads from the shared AnyIO pool
+# that other endpoints run in. Every admitted pipeline holds at most one stage slot.
+pipeline_limiter = anyio.CapacityLimiter(scheduler.slots)
+
+# Rolling-window coaching state per live session, least recently used first.
+live_coaches: 'OrderedDict[str, LiveCoach]' = OrderedDict()
+MAX_LIVE_SESSIONS = int(os.environ.get('VALORANT_MAX_LIVE_SESSIONS', '1024'))
+LIVE_WINDOW = float(os.environ.get('VALORANT_LIVE_WINDOW', '30'))
+
+# VALORANT_RECORD_DIR records live session chunk timing for replay with app.loadgen.
+live_recorder = (SessionRecorder(os.environ['VALORANT_RECORD_DIR'], max_sessions=MAX_LIVE_SESSIONS)
+                 if os.environ.get('VALORANT_RECORD_DIR') else None)
+
+startup_timings = {'import_seconds': time.perf_counter() - _IMPORT_STARTED, 'first_request_seconds': None}
+
+
+@app.on_event('startup')
+async def warm_up_agents():
+    # Set VALORANT_WARMUP=0 to defer all agent construction to the first request.
+    if os.environ.get('VALORANT_WARMUP', '1') != '0':
+        registry.warm_up(background=True)
+
+
+@app.on_event('shutdown')
+async def close_recorder():
+    if live_recorder is not None:
+        await run_in_threadpool(live_recorder.close)
+
+
+class FirstRequestTimer:
+    """Pure ASGI middleware recording how long the first HTTP request took.
+
+    Once that is known it only forwards, without wrapping `receive`/`send`,
+    so request bodies, streaming and disconnect detection are untouched.
+    """
+    def __init__(self, app, timings: dict):
+        self.app = app
+        self.timings = timings
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or self.timings['first_request_seconds'] is not None:
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if self.timings['first_request_seconds'] is None:
+                self.timings['first_request_seconds'] = time.perf_counter() - started
+
+
+app.add_middleware(FirstRequestTimer, timings=startup_timings)
+
+
+@app.get('/health/live')
+async def liveness():
+    return {'status': 'alive', **startup_timings}
+
+
+@app.get('/health/ready')
+async def readiness():
+    ready = registry.is_ready()
+    body = {'status': 'ready' if ready else 'warming', 'agents': registry.status(), **startup_timings}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+
+@app.get('/health/memory')
+async def memory():
+    return {
+        'pid': os.getpid(),
+        'process_kb': memory_report(),
+        'model_maps_kb': mapping_report(model_store.root),
+    }
+
+
+@app.get('/health/resources')
+async def resources():
+    try:
+        import resource
+    except ImportError:  # Windows: CPU times only, no peak RSS
+        times = os.times()
+        cpu_user, cpu_system, max_rss_kb = times.user, times.system, None
+    else:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu_user, cpu_system, max_rss_kb = usage.ru_utime, usage.ru_stime, usage.ru_maxrss
+    return {
+        'pid': os.getpid(),
+        'cpu_user': cpu_user,
+        'cpu_system': cpu_system,
+        'max_rss_kb': max_rss_kb,
+        'threads': threading.active_count(),
+    }
+
+
+@app.get('/health/scheduler')
+async def scheduler_metrics():
+    return scheduler.metrics()
+
 
 @app.post('/analyze/vod')
-async def analyze_vod(file: UploadFile = File(...)):
+async def analyze_vod(request: Request, file: UploadFile = File(...), budget: Optional[float] = None):
     # stub: read file (not saving in scaffold)
     contents = await file.read()
-    frames = vision.extract_frames_from_vod(contents)
-    vis_events = vision.analyze_frames(frames)
-    audio_events = audio.analyze_audio_blob(contents)
-    advice = coach.generate_advice(vis_events, audio_events)
-    return {
-        'vision': vis_events,
-        'audio': audio_events,
-        'advice': advice,
-    }
+    # `budget` (seconds, default VALORANT_TIME_BUDGET) caps analysis time; past it the
+    # partial results are returned with a truncation marker.
+    if budget is None and os.environ.get('VALORANT_TIME_BUDGET'):
+        budget = float(os.environ['VALORANT_TIME_BUDGET'])
+    token = CancelToken(budget)
+    watcher = asyncio.ensure_future(cancel_on_disconnect(request, token))
+    try:
+        # Run off the event loop so concurrent requests reach the vision micro-batcher together.
+        result = await anyio.to_thread.run_sync(run_pipeline, contents, token, file.filename, limiter=pipeline_limiter)
+    except Cancelled:
+        # Nobody is listening; 499 only shows up in access logs.
+        return Response(status_code=499)
+    except DecodeError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    finally:
+        watcher.cancel()
+    if match_store is not None:
+        result['match_id'] = uuid.uuid4().hex
+        await run_in_threadpool(store_match, result, contents, file.filename)
+    # JSON by default; columnar JSON/MessagePack and gzip/zstd by content negotiation.
+    # Serializing and compressing a long match takes CPU time, so it stays off the event loop.
+    body, headers = await run_in_threadpool(encode, result, request.headers.get('accept'),
+                                            request.headers.get('accept-encoding'))
+    return Response(content=body, headers=headers)
+
+
+def store_match(result: dict, contents: bytes, filename: Optional[str]) -> None:
+    record = {'id': result['match_id'], **result}
+    if keep_videos:
+        ext = os.path.splitext(filename or '')[1].lower() or '.mp4'
+        record['source'] = match_store.save_video(result['match_id'], contents, ext)
+        record['clips'] = index_clips(result, record['source']) or []
+    match_store.save(result['match_id'], record)
+
+
+def run_pipeline(contents: bytes, token: Optional[CancelToken] = None, filename: Optional[str] = None) -> dict:
+    # ffprobe (media clock) and ffmpeg need a seekable file, e.g. for MP4s with the index at the end.
+    ext = os.path.splitext(filename or '')[1].lower() or '.mp4'
+    with tempfile.NamedTemporaryFile(suffix=ext) as fh:
+        fh.write(contents)
+        fh.flush()
+        return run_analysis(registry.get('vision'), registry.get('audio'), registry.get('coach'), contents, token=token,
+                            scheduler=scheduler, source=fh.name)
+
+
+async def cancel_on_disconnect(request: Request, token: CancelToken, interval: float = 0.25):
+    """Cancel the token once the client goes away, so the agent loops stop at their next checkpoint."""
+    while not token.cancelled:
+        if await request.is_disconnected():
+            token.cancel('client disconnected')
+            return
+        await asyncio.sleep(interval)
+
+@lru_cache(maxsize=8)
+def event_index(root: str, match_id: str):
+    # Stored events never change (re-coaching rewrites only the advice), so indexes are cached per match.
+    # Spilled timelines are indexed in place on disk; only their block summaries are kept.
+    store = MatchStore(root)
+    record = store.load(match_id)
+    if 'timeline' in (record.get('streams') or {}):
+        return JsonlEventIndex(store.stream_path(match_id))
+    return EventIndex.from_result(record)
+
+
+@app.get('/matches/{match_id}/events')
+async def match_events(match_id: str, start: float = 0.0, end: Optional[float] = None,
+                       type: Optional[List[str]] = Query(None), source: Optional[str] = None,
+                       offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
+    """One page of a stored match's time-ordered events, filtered by time window, type and source."""
+    if match_store is None or not match_store.exists(match_id):
+        raise HTTPException(status_code=404, detail='unknown match')
+    index = await run_in_threadpool(event_index, match_store.root, match_id)
+    return {'match_id': match_id, 'types': index.types(), **index.query(start, end, type, source, offset, limit)}
+
+
+@lru_cache(maxsize=64)
+def clip_index(root: str, match_id: str) -> tuple:
+    record = MatchStore(root).load(match_id)
+    return record.get('source'), record.get('clips') or []
+
+
+@lru_cache(maxsize=None)
+def clip_cache(root: str) -> ClipCache:
+    return ClipCache(os.path.join(root, 'clips'))
+
+
+async def stored_clips(match_id: str) -> tuple:
+    if match_store is None or not match_store.exists(match_id):
+        raise HTTPException(status_code=404, detail='unknown match')
+    return await run_in_threadpool(clip_index, match_store.root, match_id)
+
+
+@app.get('/matches/{match_id}/clips')
+async def match_clips(match_id: str):
+    """Highlight clips of a stored match: event time, keyframe-aligned start/end and source byte offset."""
+    _, clips = await stored_clips(match_id)
+    return {'match_id': match_id, 'clips': clips}
+
+
+@app.get('/matches/{match_id}/clips/{clip_id}')
+async def match_clip(request: Request, match_id: str, clip_id: int):
+    """The clip's video, cut by stream copy on first request and served with Range support."""
+    source, clips = await stored_clips(match_id)
+    if not 0 <= clip_id < len(clips) or not source or not os.path.exists(source):
+        raise HTTPException(status_code=404, detail='unknown clip')
+    path = await run_in_threadpool(clip_cache(match_store.root).get, match_id, clips[clip_id], source)
+    return range_response(path, request.headers.get('range'))
+
+
+def range_response(path: str, range_header: Optional[str]) -> Response:
+    size = os.path.getsize(path)
+    headers = {'Accept-Ranges': 'bytes'}
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={'Content-Range': f'bytes */{size}'})
+    status = 200
+    first, last = 0, size - 1
+    if byte_range is not None:
+        status = 206
+        first, last = byte_range
+        headers['Content-Range'] = f'bytes {first}-{last}/{size}'
+    headers['Content-Length'] = str(last - first + 1)
+    media_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    return StreamingResponse(iter_file(path, first, last), status_code=status, media_type=media_type, headers=headers)
+
 
 @app.post('/analyze/live')
 async def analyze_live(payload: dict):
-    # Stub for live analysis: accepts metadata and returns a placeholder
-    return {'status': 'live analysis not yet implemented', 'payload': payload}
+    # Chunks with a `session_id` feed that session's LiveCoach; `events` are the
+    # detections for the chunk (an event without `time` takes the chunk's `t`).
+    if live_recorder is not None and 'session_id' in payload:
+        live_recorder.record(str(payload['session_id']), str(payload.get('kind', 'frame')), int(payload.get('size', 0)))
+    if 'session_id' not in payload:
+        # Stub for live analysis: accepts metadata and returns a placeholder
+        return {'status': 'live analysis not yet implemented', 'payload': payload}
+    session_id = str(payload['session_id'])
+    coach = live_coaches.pop(session_id, None) or LiveCoach(window=LIVE_WINDOW)
+    live_coaches[session_id] = coach
+    while len(live_coaches) > MAX_LIVE_SESSIONS:
+        live_coaches.popitem(last=False)
+    changes = {'added': [], 'removed': []}
+    for event in payload.get('events', []):
+        update = coach.update({'time': payload.get('t', coach.clock), **event})
+        for key in ('added', 'removed'):
+            changes[key].extend(update[key])
+    body = {'status': 'ok', 'session_id': session_id, 'seq': payload.get('seq'), 'changes': changes}
+    if payload.get('final'):
+        body['advice'] = coach.advice()
+        live_coaches.pop(session_id, None)
+        if live_recorder is not None:
+            live_recorder.finish(session_id)
+    return body
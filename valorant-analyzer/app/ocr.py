@@ -0,0 +1,158 @@
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+# HUD text regions as (x, y, w, h) fractions of the frame, for the default
+# 16:9 Valorant layout.
+HUD_REGIONS: Dict[str, Tuple[float, float, float, float]] = {
+    'round_timer': (0.4740, 0.0185, 0.0520, 0.0370),
+    'score_left': (0.4220, 0.0185, 0.0300, 0.0370),
+    'score_right': (0.5480, 0.0185, 0.0300, 0.0370),
+    'killfeed': (0.7400, 0.0900, 0.2500, 0.1900),
+}
+
+Glyph = Tuple[int, ...]
+
+
+def crop_rgb(frame: bytes, width: int, height: int, box: Tuple[int, int, int, int]) -> bytes:
+    """Return the RGB24 bytes of box=(x, y, w, h), or b'' if the frame is too short."""
+    x, y, w, h = box
+    stride = width * 3
+    if len(frame) < height * stride:
+        return b''
+    view = memoryview(frame)
+    return b''.join(view[(y + r) * stride + x * 3:(y + r) * stride + (x + w) * 3] for r in range(h))
+
+
+def pixel_hash(pixels: bytes) -> int:
+    """Cheap content hash for a HUD crop (adler32 runs at memory speed)."""
+    return zlib.adler32(pixels)
+
+
+def segment_glyphs(pixels: bytes, w: int, h: int, threshold: int = 160, space_width: int = 4) -> List[Optional[Glyph]]:
+    """Split a binarized crop into glyphs separated by blank columns.
+
+    Each glyph is the tuple of its column bitmasks (bit r set when row r is
+    lit); wide gaps become `None`, i.e. a space.
+    """
+    columns = [0] * w
+    for r in range(h):
+        row = r * w * 3
+        for c in range(w):
+            i = row + c * 3
+            # Integer luma approximation; HUD text is bright on a dark background.
+            if (pixels[i] * 2 + pixels[i + 1] * 5 + pixels[i + 2]) >> 3 >= threshold:
+                columns[c] |= 1 << r
+    glyphs: List[Optional[Glyph]] = []
+    current: List[int] = []
+    gap = 0
+    for mask in columns:
+        if mask:
+            if gap >= space_width and glyphs:
+                glyphs.append(None)
+            gap = 0
+            current.append(mask)
+        else:
+            if current:
+                glyphs.append(tuple(current))
+                current = []
+            gap += 1
+    if current:
+        glyphs.append(tuple(current))
+    return glyphs
+
+
+class GlyphTable:
+    """Lookup table from glyph bitmaps of the fixed HUD font to characters."""
+    def __init__(self, glyphs: Optional[Dict[Glyph, str]] = None):
+        self.glyphs: Dict[Glyph, str] = dict(glyphs or {})
+
+    def learn(self, glyph: Glyph, char: str) -> None:
+        self.glyphs[glyph] = char
+
+    def decode(self, glyphs: List[Optional[Glyph]]) -> Optional[str]:
+        """Decode a glyph sequence, or None if any glyph is unknown."""
+        chars = []
+        for g in glyphs:
+            if g is None:
+                chars.append(' ')
+                continue
+            ch = self.glyphs.get(g)
+            if ch is None:
+                return None
+            chars.append(ch)
+        return ''.join(chars)
+
+
+class OcrStage:
+    """Reads HUD text from RGB24 frames with two levels of memoization.
+
+    1. Per region, an LRU cache keyed by the crop's pixel hash: unchanged
+       timers, scores and killfeed lines cost one hash and one dict lookup.
+    2. On a miss, glyphs are segmented and resolved through the GlyphTable.
+       Only when a glyph is unknown is the full `recognizer` called; its
+       answer is used to teach the table the new glyphs.
+
+    One stage is shared by every request thread of the vision agent, so the
+    caches, glyph table and stats are only touched under a lock; hashing,
+    segmentation and recognition run outside it.
+    """
+    def __init__(self, width: int, height: int, regions: Optional[Dict[str, Tuple[float, float, float, float]]] = None,
+                 glyphs: Optional[GlyphTable] = None, recognizer: Optional[Callable[[bytes, int, int], str]] = None,
+                 cache_size: int = 256):
+        self.width = width
+        self.height = height
+        self.boxes = {
+            name: (int(fx * width), int(fy * height), max(1, int(fw * width)), max(1, int(fh * height)))
+            for name, (fx, fy, fw, fh) in (regions or HUD_REGIONS).items()
+        }
+        self.glyphs = glyphs if glyphs is not None else GlyphTable()
+        # Stub: a real recognizer (e.g. Tesseract) takes (rgb_bytes, w, h) and returns text.
+        self.recognizer = recognizer or (lambda pixels, w, h: '')
+        self.cache_size = cache_size
+        self._caches: Dict[str, OrderedDict] = {name: OrderedDict() for name in self.boxes}
+        self.stats = {'cache_hits': 0, 'glyph_hits': 0, 'recognitions': 0}
+        self._lock = threading.Lock()
+
+    def read(self, frame: bytes) -> Dict[str, str]:
+        return {name: self.read_region(frame, name) for name in self.boxes}
+
+    def read_region(self, frame: bytes, name: str) -> str:
+        box = self.boxes[name]
+        pixels = crop_rgb(frame, self.width, self.height, box)
+        if not pixels:
+            return ''
+        cache = self._caches[name]
+        key = pixel_hash(pixels)
+        _, _, w, h = box
+        with self._lock:
+            text = cache.get(key)
+            if text is not None:
+                cache.move_to_end(key)
+                self.stats['cache_hits'] += 1
+                return text
+        glyphs = segment_glyphs(pixels, w, h)
+        with self._lock:
+            text = self.glyphs.decode(glyphs)
+            if text is not None:
+                self.stats['glyph_hits'] += 1
+            else:
+                self.stats['recognitions'] += 1
+        if text is None:
+            text = self.recognizer(pixels, w, h)
+        with self._lock:
+            self._learn(glyphs, text)
+            cache[key] = text
+            cache.move_to_end(key)
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return text
+
+    def _learn(self, glyphs: List[Optional[Glyph]], text: str) -> None:
+        # Only trust the recognizer when its characters line up one-to-one with glyphs.
+        if len(text) != len(glyphs):
+            return
+        for g, ch in zip(glyphs, text):
+            if g is not None and ch != ' ':
+                self.glyphs.learn(g, ch)
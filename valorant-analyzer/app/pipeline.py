@@ -0,0 +1,125 @@
+import hashlib
+from contextlib import nullcontext
+from typing import Dict, Optional, Tuple
+
+from app.agents.vision import VisionAgent
+from app.agents.audio import AudioAgent
+from app.agents.coach import CoachAgent, digesting
+from app.cancel import CancelToken
+from app.scheduler import StageScheduler
+from app.spill import ExternalSorter
+from app.store import MatchStore
+from app.timeline import MediaClock, DriftCorrector, cast_anchors, probe_clock, vision_stream, audio_stream
+
+
+def analyze_vod(vision: VisionAgent, audio: AudioAgent, coach: CoachAgent, contents: bytes, coach_workers: int = 1,
+                token: Optional[CancelToken] = None, scheduler: Optional[StageScheduler] = None,
+                source: Optional[str] = None, clock: Optional[MediaClock] = None,
+                drift: Optional[DriftCorrector] = None) -> Dict:
+    """Run vision, audio and coaching over one VOD; shared by the API and the CLI.
+
+    Callers already parallel across requests or files keep `coach_workers`
+    at 1; None lets the coach pick a process pool size for large matches.
+    If the token's time budget runs out, the result holds what was analyzed
+    so far plus `truncated: True` and the `truncated_stages`.
+    With a `scheduler`, each stage waits for one of its slots (decoding runs
+    inside the vision stage), and `coach_workers` is replaced by the
+    scheduler's process budget for coaching (`processes('coach')`). When the VOD is a local file, `source` is its path and
+    ffmpeg reads the file itself instead of `contents` through a pipe.
+
+    Events are put on the VOD's media clock: `clock` and `drift` default to
+    what `source` probes to. Every frame result gets its media `time`, the
+    audio drift is refit from ability casts seen and heard, and the result
+    keeps that `drift` so stored matches merge the same way later.
+    """
+    def stage(name: str):
+        return scheduler.stage(name) if scheduler is not None else nullcontext()
+
+    clock, drift = media_clocks(source, clock, drift)
+    # Minimap samples of this VOD only; frame indices restart with every VOD.
+    tracker = vision.new_tracker()
+    with stage('vision'):
+        frames = vision.iter_frames(source if source is not None else contents)
+        try:
+            vis_events = vision.analyze_frames(frames, token=token, tracker=tracker, clock=clock)
+        finally:
+            # Stop a streaming decoder right away instead of at garbage collection.
+            if hasattr(frames, 'close'):
+                frames.close()
+    for entry in vis_events:
+        entry['time'] = clock.frame_time(entry['frame'])
+    with stage('audio'):
+        audio_events = audio.analyze_audio_blob(contents, token=token)
+    anchors = cast_anchors(vis_events, audio_events, drift)
+    if anchors:
+        drift = DriftCorrector(drift.offset, drift.scale).fit(anchors)
+    with stage('coach'):
+        if scheduler is not None:
+            # The scheduler's process budget for coaching: 1 unless coaching is the bottleneck.
+            coach_workers = scheduler.processes('coach')
+        advice = coach.generate_sharded_advice(vis_events, audio_events, clock=clock, drift=drift, workers=coach_workers,
+                                               token=token, tracks=tracker.store if tracker is not None else None)
+    result = {
+        'vision': vis_events,
+        'audio': audio_events,
+        'drift': drift.as_dict(),
+        'advice': advice,
+        'advice_meta': coach.advice_meta(vis_events, audio_events),
+    }
+    if tracker is not None:
+        # Recoaching rebuilds the tracks from the frames' positions on this map.
+        result['map'] = tracker.store.index.map_name
+    if token is not None and token.truncated_stages:
+        result['truncated'] = True
+        result['truncated_stages'] = list(token.truncated_stages)
+    return result
+
+
+def analyze_vod_spilled(vision: VisionAgent, audio: AudioAgent, coach: CoachAgent, contents: bytes, store: MatchStore,
+                        match_id: str, run_size: int = 100_000, spill_dir: Optional[str] = None,
+                        clock: Optional[MediaClock] = None, drift: Optional[DriftCorrector] = None,
+                        token: Optional[CancelToken] = None, extra: Optional[Dict] = None,
+                        source: Optional[str] = None) -> Dict:
+    """analyze_vod in bounded memory, for streams too long to keep as lists of events.
+
+    Vision and audio events are streamed into an ExternalSorter that spills
+    sorted runs to disk every `run_size` events. The k-way merge of those
+    runs is read twice: once by the coach (and input digest), then into the
+    match store as the match's `timeline` JSONL sidecar. Returns the stored
+    record, which has no events. `source`, `clock` and `drift` are as for analyze_vod, except
+    that the drift is not refit (that needs both event lists at once).
+    """
+    clock, drift = media_clocks(source, clock, drift)
+    tracker = vision.new_tracker()
+    with ExternalSorter(run_size, spill_dir) as sorter:
+        frames = vision.iter_frames(source if source is not None else contents)
+        try:
+            sorter.extend(vision_stream(vision.iter_analyze_frames(frames, token=token, tracker=tracker, clock=clock), clock))
+        finally:
+            if hasattr(frames, 'close'):
+                frames.close()
+        sorter.extend(audio_stream(audio.iter_audio_events(contents, token=token), drift))
+        digest = hashlib.sha1()
+        advice = coach.generate_timeline_advice(digesting(sorter.merged(), digest), token=token,
+                                                tracks=tracker.store if tracker is not None else None)
+        record = {'id': match_id, **(extra or {}), 'advice': advice, 'drift': drift.as_dict(),
+                  'advice_meta': {'rules_version': coach.rules_version, 'inputs_digest': digest.hexdigest()}}
+        if token is not None and token.truncated_stages:
+            record['truncated'] = True
+            record['truncated_stages'] = list(token.truncated_stages)
+        if tracker is not None:
+            # The timeline keeps no frame positions, so the samples get their own sidecar for recoaching.
+            record['map'] = tracker.store.index.map_name
+            store.write_stream(match_id, record, (list(s) for s in tracker.store.samples()), key='tracks')
+        record['events'] = store.save_stream(match_id, record, sorter.merged())
+        record['runs'] = len(sorter.runs)
+    return record
+
+
+def media_clocks(source: Optional[str], clock: Optional[MediaClock],
+                 drift: Optional[DriftCorrector]) -> Tuple[MediaClock, DriftCorrector]:
+    """The given clock and drift, with whatever is missing probed from `source` (nominal defaults without one)."""
+    if (clock is None or drift is None) and source is not None:
+        probed_clock, probed_drift = probe_clock(source)
+        return clock or probed_clock, drift or probed_drift
+    return clock or MediaClock(), drift or DriftCorrector()
@@ -0,0 +1,166 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+
+class Callout(NamedTuple):
+    """Axis-aligned callout region in minimap coordinates (0..1 on both axes)."""
+    name: str
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+    open: bool = False
+
+
+# Approximate callout boxes per map; `open` marks areas exposed to several angles.
+MAP_CALLOUTS: Dict[str, List[Callout]] = {
+    'ascent': [
+        Callout('A-site', 0.62, 0.18, 0.82, 0.38, open=True),
+        Callout('A-main', 0.82, 0.22, 0.95, 0.40),
+        Callout('mid', 0.42, 0.40, 0.60, 0.62, open=True),
+        Callout('B-main', 0.08, 0.40, 0.22, 0.58),
+        Callout('B-site', 0.18, 0.20, 0.38, 0.40, open=True),
+        Callout('attacker-spawn', 0.40, 0.85, 0.62, 1.00),
+        Callout('defender-spawn', 0.40, 0.00, 0.62, 0.12),
+    ],
+}
+
+
+class CalloutGrid:
+    """Uniform grid over the minimap; each cell lists the callouts overlapping it."""
+    def __init__(self, callouts: List[Callout], cells: int = 20, map_name: Optional[str] = None):
+        self.callouts = callouts
+        self.map_name = map_name
+        self.cells = cells
+        self.by_name = {c.name: i for i, c in enumerate(callouts)}
+        self._grid: Dict[Tuple[int, int], List[int]] = {}
+        for i, c in enumerate(callouts):
+            for gx in range(self._cell(c.x0), self._cell(c.x1) + 1):
+                for gy in range(self._cell(c.y0), self._cell(c.y1) + 1):
+                    self._grid.setdefault((gx, gy), []).append(i)
+
+    @classmethod
+    def for_map(cls, map_name: str) -> 'CalloutGrid':
+        return cls(MAP_CALLOUTS[map_name], map_name=map_name)
+
+    def _cell(self, v: float) -> int:
+        return min(self.cells - 1, max(0, int(v * self.cells)))
+
+    def region_at(self, x: float, y: float) -> int:
+        """Index of the callout containing (x, y), or -1."""
+        for i in self._grid.get((self._cell(x), self._cell(y)), ()):
+            c = self.callouts[i]
+            if c.x0 <= x <= c.x1 and c.y0 <= y <= c.y1:
+                return i
+        return -1
+
+
+class TrackStore:
+    """Compact columnar store of (player, t, x, y, region) samples for one match.
+
+    Samples must be appended in time order. The callout of every sample is
+    resolved once at append time and per-player dwell time per callout is
+    accumulated, so match-wide queries never rescan the samples.
+    """
+    def __init__(self, index: CalloutGrid, max_gap: float = 1.0):
+        self.index = index
+        # Gaps longer than this (deaths, missed detections) don't count as dwell time.
+        self.max_gap = max_gap
+        self.players: List[str] = []
+        self._player_ids: Dict[str, int] = {}
+        self.player = array('H')
+        self.t = array('d')
+        self.x = array('f')
+        self.y = array('f')
+        self.region = array('h')
+        self._last: Dict[int, Tuple[float, int]] = {}
+        self._dwell: Dict[int, Dict[int, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self.t)
+
+    @classmethod
+    def from_samples(cls, index: CalloutGrid, samples: Iterable[Tuple[str, float, float, float]]) -> 'TrackStore':
+        """A store refilled from (player, t, x, y) samples, e.g. those of samples()."""
+        store = cls(index)
+        for player, t, x, y in samples:
+            store.append(player, t, x, y)
+        return store
+
+    @classmethod
+    def from_frames(cls, index: CalloutGrid, frames: Iterable[Dict]) -> 'TrackStore':
+        """A store refilled from frame results carrying a media `time` and minimap `positions`."""
+        return cls.from_samples(index, ((p['player'], entry['time'], p['x'], p['y'])
+                                        for entry in frames if 'time' in entry
+                                        for p in entry.get('positions', ())))
+
+    def samples(self) -> Iterator[Tuple[str, float, float, float]]:
+        """Every (player, t, x, y) sample in time order."""
+        for i in range(len(self.t)):
+            yield self.players[self.player[i]], self.t[i], self.x[i], self.y[i]
+
+    def append(self, player: str, t: float, x: float, y: float) -> None:
+        pid = self._player_ids.get(player)
+        if pid is None:
+            pid = self._player_ids[player] = len(self.players)
+            self.players.append(player)
+        region = self.index.region_at(x, y)
+        last = self._last.get(pid)
+        if last is not None and 0 < t - last[0] <= self.max_gap:
+            dwell = self._dwell.setdefault(pid, {})
+            dwell[last[1]] = dwell.get(last[1], 0.0) + (t - last[0])
+        self._last[pid] = (t, region)
+        self.player.append(pid)
+        self.t.append(t)
+        self.x.append(x)
+        self.y.append(y)
+        self.region.append(region)
+
+    def track(self, player: str) -> List[Tuple[float, float, float]]:
+        """(t, x, y) samples of one player."""
+        pid = self._player_ids.get(player)
+        return [(self.t[i], self.x[i], self.y[i]) for i in range(len(self.t)) if self.player[i] == pid]
+
+    def players_in(self, region: str, t0: float, t1: float) -> List[str]:
+        """Players seen in the callout between t0 and t1; scans only that time window."""
+        rid = self.index.by_name[region]
+        lo, hi = bisect_left(self.t, t0), bisect_right(self.t, t1)
+        seen = {self.player[i] for i in range(lo, hi) if self.region[i] == rid}
+        return [self.players[pid] for pid in sorted(seen)]
+
+    def time_in(self, player: str, region: str) -> float:
+        pid = self._player_ids.get(player)
+        return self._dwell.get(pid, {}).get(self.index.by_name[region], 0.0)
+
+    def time_in_open(self, player: str) -> float:
+        dwell = self._dwell.get(self._player_ids.get(player), {})
+        return sum(s for rid, s in dwell.items() if rid >= 0 and self.index.callouts[rid].open)
+
+    def time_tracked(self, player: str) -> float:
+        return sum(self._dwell.get(self._player_ids.get(player), {}).values())
+
+
+# Minimap box as (x, y, w, h) fractions of the frame in the default HUD layout.
+MINIMAP_BOX = (0.0120, 0.0230, 0.2250, 0.4000)
+
+
+class MinimapTracker:
+    """Locates players on the minimap and records their positions into a TrackStore."""
+    def __init__(self, store: TrackStore, fps: float = 30.0,
+                 detector: Optional[Callable[[bytes], Dict[str, Tuple[float, float]]]] = None):
+        self.store = store
+        self.fps = fps
+        # Stub: replace with an icon detector over the MINIMAP_BOX crop returning
+        # {player: (x, y)} in minimap coordinates.
+        self.detector = detector or (lambda frame: {})
+
+    def track(self, frame_index: int, frame: bytes, t: Optional[float] = None) -> List[Dict]:
+        if t is None:
+            t = frame_index / self.fps
+        positions = []
+        for player, (x, y) in sorted(self.detector(frame).items()):
+            self.store.append(player, t, x, y)
+            positions.append({'player': player, 'x': x, 'y': y})
+        return positions
+
@@ -0,0 +1,111 @@
+import hashlib
+from typing import Callable, Dict, Iterable, List, Optional
+
+from app.agents.coach import CoachAgent, digesting
+from app.clips import link_clips
+from app.positions import CalloutGrid, TrackStore
+from app.store import MatchStore
+from app.timeline import DriftCorrector
+
+
+def diff_tips(old_tips: List[str], new_tips: List[str]) -> Dict:
+    return {
+        'added': [t for t in new_tips if t not in old_tips],
+        'removed': [t for t in old_tips if t not in new_tips],
+    }
+
+
+def diff_advice(old: Dict, new: Dict) -> Dict:
+    """What changed between two advice dicts: summary change plus added/removed tips.
+
+    Per-player and per-team tips are compared too; `players` and `teams`
+    list only the entries whose tips changed.
+    """
+    diff = diff_tips(old.get('tips', []), new.get('tips', []))
+    if old.get('summary') != new.get('summary'):
+        diff['summary'] = {'old': old.get('summary'), 'new': new.get('summary')}
+    for section in ('players', 'teams'):
+        old_entries, new_entries = old.get(section) or {}, new.get(section) or {}
+        changed = {}
+        for name in sorted(set(old_entries) | set(new_entries)):
+            entry = diff_tips((old_entries.get(name) or {}).get('tips', []), (new_entries.get(name) or {}).get('tips', []))
+            if entry['added'] or entry['removed']:
+                changed[name] = entry
+        if changed:
+            diff[section] = changed
+    return diff
+
+
+def advice_changed(diff: Dict) -> bool:
+    return bool(diff['added'] or diff['removed'] or set(diff) & {'summary', 'players', 'teams'})
+
+
+def needs_recoach(record: Dict, coach: CoachAgent, timeline: Optional[Callable[[], Iterable[Dict]]] = None) -> bool:
+    """`timeline` opens the match's merged event stream, for matches stored as one (see stored_timeline)."""
+    meta = record.get('advice_meta') or {}
+    if meta.get('rules_version') != coach.rules_version:
+        return True
+    if timeline is not None:
+        return meta.get('inputs_digest') != coach.timeline_digest(timeline())
+    return meta.get('inputs_digest') != coach.inputs_digest(record.get('vision', []), record.get('audio', []))
+
+
+def stored_timeline(store: MatchStore, match_id: str, record: Dict) -> Optional[Callable[[], Iterable[Dict]]]:
+    """Opener of a spilled match's timeline: its JSONL sidecar, streamed, or an older record's inline list."""
+    if 'timeline' in (record.get('streams') or {}):
+        return lambda: store.iter_stream(match_id)
+    if 'timeline' in record:
+        return lambda: record['timeline']
+    return None
+
+
+def stored_tracks(store: MatchStore, match_id: str, record: Dict) -> Optional[TrackStore]:
+    """The match's minimap tracks, rebuilt from its `tracks` sidecar or its frames' positions; None if untracked."""
+    if not record.get('map'):
+        return None
+    grid = CalloutGrid.for_map(record['map'])
+    if 'tracks' in (record.get('streams') or {}):
+        return TrackStore.from_samples(grid, store.iter_stream(match_id, 'tracks'))
+    return TrackStore.from_frames(grid, record.get('vision', []))
+
+
+def recoach_store(store: MatchStore, coach: Optional[CoachAgent] = None, force: bool = False,
+                  ids: Optional[List[str]] = None) -> Dict:
+    """Recompute advice from stored vision/audio events; no video is decoded.
+
+    Only matches whose rule version or input events changed since their
+    advice was computed are touched (all of them with `force`). Returns
+    counts plus a per-match diff for every match whose advice changed.
+    Spilled timelines are streamed from disk, never loaded whole.
+    """
+    coach = coach or CoachAgent()
+    report = {'rules_version': coach.rules_version, 'checked': 0, 'recoached': 0, 'changed': 0, 'changes': []}
+    for match_id in (ids if ids is not None else store.ids()):
+        record = store.load(match_id)
+        report['checked'] += 1
+        timeline = stored_timeline(store, match_id, record)
+        if not force and not needs_recoach(record, coach, timeline):
+            continue
+        if timeline is not None:
+            # Spilled matches (app.spill) store one merged timeline instead of vision/audio lists.
+            digest = hashlib.sha1()
+            advice = coach.generate_timeline_advice(digesting(timeline(), digest),
+                                                    tracks=stored_tracks(store, match_id, record))
+            meta = {'rules_version': coach.rules_version, 'inputs_digest': digest.hexdigest()}
+        else:
+            vision, audio = record.get('vision', []), record.get('audio', [])
+            drift = DriftCorrector(**record['drift']) if 'drift' in record else None
+            advice = coach.generate_sharded_advice(vision, audio, drift=drift, tracks=stored_tracks(store, match_id, record))
+            meta = coach.advice_meta(vision, audio)
+        if record.get('clips'):
+            link_clips(advice, record['clips'])
+        diff = diff_advice(record.get('advice') or {}, advice)
+        previous = (record.get('advice_meta') or {}).get('rules_version')
+        record['advice'] = advice
+        record['advice_meta'] = meta
+        store.save(match_id, record)
+        report['recoached'] += 1
+        if advice_changed(diff):
+            report['changed'] += 1
+            report['changes'].append({'id': match_id, 'from_rules_version': previous, **diff})
+    return report
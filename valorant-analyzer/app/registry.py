@@ -0,0 +1,80 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class AgentRegistry:
+    """Builds agents lazily on first use and tracks their readiness.
+
+    Agents are registered as factories so importing the app stays cheap; the
+    first `get()` (or a background `warm_up()`) pays the construction cost.
+    """
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._timings: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+        self._warmup_thread: Optional[threading.Thread] = None
+
+    def register(self, name: str, factory: Callable[[], Any]) -> None:
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+
+    def get(self, name: str) -> Any:
+        """Return the named agent, constructing it on first use."""
+        agent = self._instances.get(name)
+        if agent is not None:
+            return agent
+        with self._locks[name]:
+            agent = self._instances.get(name)
+            if agent is None:
+                started = time.perf_counter()
+                try:
+                    agent = self._factories[name]()
+                except Exception as exc:
+                    self._errors[name] = repr(exc)
+                    raise
+                self._timings[name] = time.perf_counter() - started
+                self._errors.pop(name, None)
+                self._instances[name] = agent
+        return agent
+
+    def warm_up(self, background: bool = True) -> Optional[threading.Thread]:
+        """Construct every registered agent, in a daemon thread by default."""
+        def _build_all():
+            for name in list(self._factories):
+                try:
+                    self.get(name)
+                except Exception:
+                    # Recorded in status(); the next get() will retry.
+                    pass
+
+        if not background:
+            _build_all()
+            return None
+        if self._warmup_thread is None or not self._warmup_thread.is_alive():
+            self._warmup_thread = threading.Thread(target=_build_all, name='agent-warmup', daemon=True)
+            self._warmup_thread.start()
+        return self._warmup_thread
+
+    def is_ready(self) -> bool:
+        return all(name in self._instances for name in self._factories)
+
+    def status(self) -> Dict[str, Dict]:
+        """Per-agent state: 'ready', 'loading', 'failed' or 'pending', plus init time."""
+        report = {}
+        for name in self._factories:
+            if name in self._instances:
+                state = 'ready'
+            elif name in self._errors:
+                state = 'failed'
+            elif self._locks[name].locked():
+                state = 'loading'
+            else:
+                state = 'pending'
+            entry = {'state': state, 'init_seconds': self._timings.get(name)}
+            if name in self._errors:
+                entry['error'] = self._errors[name]
+            report[name] = entry
+        return report
@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Optional, Sequence
+
+
+class StageStats:
+    """Counters of one stage: current occupancy plus totals and the current measurement window."""
+    def __init__(self):
+        self.active = 0
+        self.queued = 0
+        self.completed = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        # Completions per second over the last full window.
+        self.throughput = 0.0
+        # Since the last rebalance.
+        self.window_completed = 0
+        self.window_busy = 0.0
+        self.window_wait = 0.0
+
+
+def apportion(total: int, demand: Dict[str, float], minimum: int = 1) -> Dict[str, int]:
+    """Split `total` slots in proportion to demand (largest remainder), at least `minimum` each."""
+    names = list(demand)
+    spare = total - minimum * len(names)
+    weight = sum(demand.values())
+    if spare <= 0 or weight <= 0:
+        base = {name: minimum for name in names}
+        for i in range(max(0, spare)):
+            base[names[i % len(names)]] += 1
+        return base
+    shares = {name: spare * demand[name] / weight for name in names}
+    slots = {name: minimum + int(shares[name]) for name in names}
+    left = total - sum(slots.values())
+    for name in sorted(names, key=lambda n: shares[n] - int(shares[n]), reverse=True)[:left]:
+        slots[name] += 1
+    return slots
+
+
+class StageScheduler:
+    """Shares a fixed budget of concurrent slots between pipeline stages and rebalances it from observed load.
+
+    Work enters a stage through `stage(name)`, which waits while the stage
+    is at its limit. Every `interval` seconds (checked as work completes)
+    each stage's demand is measured as its average number of requests
+    running or waiting over the window (busy plus wait seconds per second,
+    by Little's law) plus what is running or queued right now. Slots are then
+    reapportioned to match, so the slowest stage stays saturated while
+    stages with idle slots give them up. Every change is kept in
+    `decisions` and reported by `metrics()`.
+    """
+    def __init__(self, stages: Sequence[str], slots: Optional[int] = None, interval: float = 1.0,
+                 min_slots: int = 1, history: int = 50):
+        self.cpus = os.cpu_count() or 1
+        self.slots = max(slots or 2 * self.cpus, min_slots * len(stages))
+        self.interval = interval
+        self.min_slots = min_slots
+        self.stats: Dict[str, StageStats] = {name: StageStats() for name in stages}
+        self.limits = apportion(self.slots, {name: 1.0 for name in stages}, min_slots)
+        self.bottleneck: Optional[str] = None
+        self.decisions: Deque[Dict] = deque(maxlen=history)
+        self._cond = threading.Condition()
+        self._window_start = time.monotonic()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        stats = self.stats[name]
+        with self._cond:
+            arrived = time.monotonic()
+            stats.queued += 1
+            while stats.active >= self.limits[name]:
+                self._cond.wait()
+            stats.queued -= 1
+            stats.active += 1
+            started = time.monotonic()
+            stats.wait_seconds += started - arrived
+            stats.window_wait += started - arrived
+        try:
+            yield
+        finally:
+            with self._cond:
+                now = time.monotonic()
+                stats.active -= 1
+                stats.completed += 1
+                stats.window_completed += 1
+                stats.busy_seconds += now - started
+                stats.window_busy += now - started
+                if now - self._window_start >= self.interval:
+                    self._rebalance(now)
+                self._cond.notify_all()
+
+    def rebalance(self) -> Dict[str, int]:
+        with self._cond:
+            self._rebalance(time.monotonic())
+            self._cond.notify_all()
+            return dict(self.limits)
+
+    def _rebalance(self, now: float) -> None:
+        elapsed = max(now - self._window_start, 1e-9)
+        demand = {name: (s.window_busy + s.window_wait) / elapsed + s.active + s.queued for name, s in self.stats.items()}
+        if any(demand.values()):
+            self.bottleneck = max(demand, key=demand.get)
+            limits = apportion(self.slots, demand, self.min_slots)
+            if limits != self.limits:
+                self.decisions.append({
+                    'at': time.time(),
+                    'limits': limits,
+                    'previous': dict(self.limits),
+                    'demand': {name: round(d, 3) for name, d in demand.items()},
+                    'bottleneck': self.bottleneck,
+                })
+                self.limits = limits
+        for s in self.stats.values():
+            s.throughput = s.window_completed / elapsed
+            s.window_completed, s.window_busy, s.window_wait = 0, 0.0, 0.0
+        self._window_start = now
+
+    def processes(self, name: str) -> int:
+        """Process budget for a stage that can fan out to processes: its slot share of the CPUs while it is the bottleneck."""
+        if name != self.bottleneck:
+            return 1
+        return max(1, self.cpus * self.limits[name] // self.slots)
+
+    def metrics(self) -> Dict:
+        with self._cond:
+            stages = {}
+            for name, s in self.stats.items():
+                stages[name] = {
+                    'limit': self.limits[name],
+                    'active': s.active,
+                    'queued': s.queued,
+                    'completed': s.completed,
+                    'throughput': round(s.throughput, 3),
+                    'avg_seconds': s.busy_seconds / s.completed if s.completed else None,
+                    'avg_wait_seconds': s.wait_seconds / s.completed if s.completed else None,
+                    'processes': self.processes(name),
+                }
+            return {
+                'slots': self.slots,
+                'interval': self.interval,
+                'bottleneck': self.bottleneck,
+                'stages': stages,
+                'decisions': list(self.decisions),
+            }
@@ -0,0 +1,101 @@
+import gc
+import mmap
+import os
+from array import array
+from typing import Dict, Iterable, Optional
+
+from app.registry import AgentRegistry
+
+
+class SharedArrayStore:
+    """Read-only numeric arrays (model weights, lookup tables) backed by memory-mapped files.
+
+    Every process that loads the same file maps the same page-cache pages, so
+    N workers hold one copy of the data whether they were forked from a
+    preloaded parent or spawned independently.
+    """
+    def __init__(self, root: str):
+        self.root = root
+        self._maps: Dict[str, mmap.mmap] = {}
+
+    def _path(self, name: str, typecode: str) -> str:
+        return os.path.join(self.root, f'{name}.{typecode}.bin')
+
+    def save(self, name: str, values: Iterable, typecode: str = 'f') -> str:
+        """Write values as a raw native-endian array file and return its path."""
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(name, typecode)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as fh:
+            array(typecode, values).tofile(fh)
+        os.replace(tmp, path)
+        return path
+
+    def load(self, name: str, typecode: str = 'f') -> Optional[memoryview]:
+        """Map a saved array read-only; returns None if it was never saved.
+
+        The result is a flat typed memoryview; wrap it with `numpy.frombuffer`
+        for array maths without copying.
+        """
+        path = self._path(name, typecode)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return None
+        mm = self._maps.get(path)
+        if mm is None:
+            with open(path, 'rb') as fh:
+                mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[path] = mm
+        return memoryview(mm).cast(typecode)
+
+
+def preload(registry: AgentRegistry) -> None:
+    """Build every agent in the current (parent) process before workers fork.
+
+    `gc.freeze()` moves the preloaded objects out of the collector's reach so
+    collections in the children don't write to their headers and break
+    copy-on-write sharing.
+    """
+    registry.warm_up(background=False)
+    gc.freeze()
+
+
+def _parse_smaps(lines: Iterable[str], fields=('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty', 'Anonymous')) -> Dict[str, int]:
+    totals = {f: 0 for f in fields}
+    for line in lines:
+        key, _, rest = line.partition(':')
+        if key in totals:
+            totals[key] += int(rest.split()[0])
+    return totals
+
+
+def memory_report(pid='self') -> Dict[str, int]:
+    """Whole-process memory split in kB (from /proc/<pid>/smaps_rollup, Linux only)."""
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as fh:
+            return _parse_smaps(fh)
+    except OSError:
+        return {}
+
+
+def mapping_report(path_prefix: str, pid='self') -> Dict[str, int]:
+    """Memory split in kB for mappings of files under `path_prefix`.
+
+    Mapped weights are shared when `Anonymous` stays at 0: a page that some
+    process copied on write shows up as anonymous memory. Once a second
+    process maps the file, its resident pages move into the `Shared_*` columns.
+    """
+    prefix = os.path.abspath(path_prefix)
+    matched = []
+    try:
+        with open(f'/proc/{pid}/smaps') as fh:
+            take = False
+            for line in fh:
+                head = line.split()
+                if head and '-' in head[0] and len(head) >= 5 and ':' not in head[0]:
+                    take = len(head) >= 6 and head[5].startswith(prefix)
+                    continue
+                if take:
+                    matched.append(line)
+    except OSError:
+        return {}
+    return _parse_smaps(matched)
@@ -0,0 +1,134 @@
+"""Disk-backed sorting of timed events for inputs too long to hold as lists of dicts.
+
+Events are buffered up to `run_size`, sorted by time and written as a run in
+a compact binary format; `ExternalSorter.merged()` k-way merges the runs
+back into one time-ordered stream, so memory stays at one buffer plus one
+record per run however long the session is.
+
+Run layout: fixed-size records (`RECORD`), each followed by its extra
+fields as JSON, then the run's string table as JSON, then `FOOTER`
+(string table offset, record count). Repeated strings (types, players,
+abilities, sources) are stored once per run and referenced by index.
+"""
+import heapq
+import json
+import os
+import shutil
+import struct
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# time, frame (-1 if none), source/type/player/ability string ids, extra JSON length
+RECORD = struct.Struct('<dqHHHHI')
+FOOTER = struct.Struct('<QQ')
+NO_STRING = 0xFFFF
+STRING_FIELDS = ('source', 'type', 'player', 'ability')
+
+
+def write_run(path: str, events: Iterable[Dict]) -> int:
+    """Write time-sorted events as one run file; returns the number of records."""
+    strings: Dict[str, int] = {}
+
+    def ref(value) -> int:
+        if value is None:
+            return NO_STRING
+        index = strings.setdefault(value, len(strings))
+        if index >= NO_STRING:
+            raise ValueError('too many distinct strings in one run')
+        return index
+
+    count = 0
+    with open(path, 'wb') as fh:
+        for event in events:
+            extra = {k: v for k, v in event.items() if k not in ('time', 'frame') and k not in STRING_FIELDS}
+            # Non-string values of the string fields are rare; keep them exact in the extras.
+            refs = []
+            for field in STRING_FIELDS:
+                value = event.get(field)
+                if value is not None and not isinstance(value, str):
+                    extra[field] = value
+                    value = None
+                refs.append(ref(value))
+            blob = json.dumps(extra, separators=(',', ':')).encode() if extra else b''
+            fh.write(RECORD.pack(event['time'], event.get('frame', -1), *refs, len(blob)))
+            fh.write(blob)
+            count += 1
+        table_offset = fh.tell()
+        fh.write(json.dumps(list(strings)).encode())
+        fh.write(FOOTER.pack(table_offset, count))
+    return count
+
+
+def read_run(path: str) -> Iterator[Dict]:
+    """Stream the events of a run file back, in the order they were written."""
+    with open(path, 'rb') as fh:
+        fh.seek(-FOOTER.size, os.SEEK_END)
+        table_offset, count = FOOTER.unpack(fh.read(FOOTER.size))
+        fh.seek(table_offset)
+        strings = json.loads(fh.read(os.path.getsize(path) - FOOTER.size - table_offset))
+        fh.seek(0)
+        for _ in range(count):
+            time, frame, *refs, extra_len = RECORD.unpack(fh.read(RECORD.size))
+            event: Dict = {'time': time}
+            if frame >= 0:
+                event['frame'] = frame
+            for field, index in zip(STRING_FIELDS, refs):
+                if index != NO_STRING:
+                    event[field] = strings[index]
+            if extra_len:
+                event.update(json.loads(fh.read(extra_len)))
+            yield event
+
+
+class ExternalSorter:
+    """Sorts events by time using at most `run_size` events of memory plus one per spilled run.
+
+    Use as a context manager (or call `close()`) to delete the run files.
+    """
+    def __init__(self, run_size: int = 100_000, directory: Optional[str] = None):
+        self.run_size = run_size
+        self.directory = directory
+        self.runs: List[str] = []
+        self.count = 0
+        self._buffer: List[Dict] = []
+        self._tmpdir: Optional[str] = None
+
+    def add(self, event: Dict) -> None:
+        self._buffer.append(event)
+        self.count += 1
+        if len(self._buffer) >= self.run_size:
+            self._spill()
+
+    def extend(self, events: Iterable[Dict]) -> None:
+        for event in events:
+            self.add(event)
+
+    def _spill(self) -> None:
+        if self._tmpdir is None:
+            self._tmpdir = tempfile.mkdtemp(prefix='valorant-runs-', dir=self.directory)
+        self._buffer.sort(key=lambda e: e['time'])
+        path = os.path.join(self._tmpdir, f'run-{len(self.runs):05d}.bin')
+        write_run(path, self._buffer)
+        self.runs.append(path)
+        self._buffer = []
+
+    def merged(self) -> Iterator[Dict]:
+        """All events added so far in time order; equal times keep insertion order.
+
+        May be called more than once (each call re-reads the runs).
+        """
+        self._buffer.sort(key=lambda e: e['time'])
+        return heapq.merge(*(read_run(path) for path in self.runs), iter(self._buffer), key=lambda e: e['time'])
+
+    def close(self) -> None:
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+        self.runs = []
+        self._buffer = []
+
+    def __enter__(self) -> 'ExternalSorter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,80 @@
+import json
+import os
+from typing import Dict, Iterable, Iterator, List
+
+
+class MatchStore:
+    """Directory of analyzed matches, one JSON document per match id."""
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, match_id: str) -> str:
+        return os.path.join(self.root, f'{match_id}.json')
+
+    def exists(self, match_id: str) -> bool:
+        return os.path.exists(self._path(match_id))
+
+    def save(self, match_id: str, record: Dict) -> None:
+        """Write atomically so an interrupted run never leaves a half-written match."""
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(match_id)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(record, fh)
+        os.replace(tmp, path)
+
+    def stream_path(self, match_id: str, key: str = 'timeline') -> str:
+        return os.path.join(self.root, f'{match_id}.{key}.jsonl')
+
+    def save_stream(self, match_id: str, record: Dict, items: Iterable, key: str = 'timeline') -> int:
+        """Like save, with `items` written one per line to a JSONL sidecar instead of `record[key]`; returns the count.
+
+        For matches whose events come from a disk merge (app.spill) and are
+        never all in memory. The record names the sidecar in `streams[key]`
+        and is written last, so it only exists once its events are complete;
+        read them back with iter_stream.
+        """
+        count = self.write_stream(match_id, record, items, key)
+        self.save(match_id, record)
+        return count
+
+    def write_stream(self, match_id: str, record: Dict, items: Iterable, key: str) -> int:
+        """The sidecar half of save_stream: names it in `record['streams']` but leaves saving the record to the caller."""
+        os.makedirs(self.root, exist_ok=True)
+        path = self.stream_path(match_id, key)
+        tmp = path + '.tmp'
+        count = 0
+        with open(tmp, 'w') as fh:
+            for item in items:
+                fh.write(json.dumps(item, separators=(',', ':')))
+                fh.write('\n')
+                count += 1
+        os.replace(tmp, path)
+        record.setdefault('streams', {})[key] = os.path.basename(path)
+        return count
+
+    def iter_stream(self, match_id: str, key: str = 'timeline') -> Iterator:
+        """The items saved by save_stream, read one line at a time."""
+        with open(self.stream_path(match_id, key)) as fh:
+            for line in fh:
+                yield json.loads(line)
+
+    def save_video(self, match_id: str, contents: bytes, ext: str = '.mp4') -> str:
+        """Keep an uploaded VOD next to its match so clips can be cut from it later; returns its path."""
+        folder = os.path.join(self.root, 'videos')
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f'{match_id}{ext}')
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as fh:
+            fh.write(contents)
+        os.replace(tmp, path)
+        return path
+
+    def load(self, match_id: str) -> Dict:
+        with open(self._path(match_id)) as fh:
+            return json.load(fh)
+
+    def ids(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name[:-5] for name in os.listdir(self.root) if name.endswith('.json'))
@@ -0,0 +1,145 @@
+import os
+from string import Template
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Built-in scaffolding templates ($name placeholders, string.Template syntax).
+TEMPLATES: Dict[str, str] = {
+    'react_component': (
+        "function ${name}() {\n  return (<div className=\"${class_name}\">${name}</div>)\n}\n"
+        "export default ${name}\n"
+    ),
+    'react_index': "${imports}\n\nexport { ${names} }\n",
+    'css_metrics_card': ".metrics-card { padding: 12px; border-radius: 8px; background: var(--card-bg); }",
+    'css_component': "/* styles for ${name} */",
+    'express_route': "app.post('${path}', async (req, res) => { res.json({status: 'ok'}) })",
+    'express_app': (
+        "const express = require('express')\nconst app = express()\napp.use(express.json())\n\n"
+        "${routes}\n\napp.listen(process.env.PORT || 3000)\n"
+    ),
+    'ci_yaml': (
+        "name: CI\n\non: [push]\n\njobs:\n  test:\n    runs-on: ubuntu-latest\n    steps:\n"
+        "      - uses: actions/checkout@v3\n      - name: Set up Python\n        uses: actions/setup-python@v4\n"
+        "        with:\n          python-version: '${python_version}'\n      - name: Install deps\n"
+        "        run: pip install -r requirements.txt\n      - name: Run tests\n        run: pytest --maxfail=1 -q\n"
+    ),
+}
+
+ScaffoldFile = Tuple[str, str, Dict]
+
+
+class CompiledTemplate:
+    """A string.Template source split once into literal segments and placeholder names.
+
+    Rendering only interleaves context values with the literals, instead of
+    re-running the placeholder regex over the source on every call as
+    `Template.substitute` does. Missing names raise KeyError, like substitute.
+    """
+    def __init__(self, source: str):
+        self.source = source
+        literals: List[str] = []
+        names: List[str] = []
+        pending: List[str] = []
+        pos = 0
+        for match in Template.pattern.finditer(source):
+            pending.append(source[pos:match.start()])
+            pos = match.end()
+            if match.group('escaped') is not None:
+                pending.append(Template.delimiter)
+                continue
+            name = match.group('named') or match.group('braced')
+            if name is None:
+                raise ValueError(f'Invalid placeholder in template at offset {match.start()}: {source!r}')
+            literals.append(''.join(pending))
+            names.append(name)
+            pending = []
+        pending.append(source[pos:])
+        literals.append(''.join(pending))
+        self.literals = tuple(literals)
+        self.names = tuple(names)
+
+    def render(self, context: Dict) -> str:
+        parts = [self.literals[0]]
+        for name, literal in zip(self.names, self.literals[1:]):
+            parts.append(str(context[name]))
+            parts.append(literal)
+        return ''.join(parts)
+
+
+class TemplateEngine:
+    """Compiles named templates once and renders them singly, in batches or straight to disk."""
+    def __init__(self, templates: Optional[Dict[str, str]] = None):
+        self.sources: Dict[str, str] = dict(TEMPLATES)
+        self.sources.update(templates or {})
+        self._compiled: Dict[str, CompiledTemplate] = {}
+
+    def register(self, name: str, source: str) -> None:
+        self.sources[name] = source
+        self._compiled.pop(name, None)
+
+    def compile(self, name: str) -> CompiledTemplate:
+        template = self._compiled.get(name)
+        if template is None:
+            template = self._compiled[name] = CompiledTemplate(self.sources[name])
+        return template
+
+    def render(self, template_name: str, /, **context) -> str:
+        return self.compile(template_name).render(context)
+
+    def render_many(self, name: str, contexts: Iterable[Dict]) -> List[str]:
+        """Render one template for many contexts, e.g. every component of a project."""
+        template = self.compile(name)
+        return [template.render(c) for c in contexts]
+
+    def write_scaffold(self, root: str, files: Iterable[ScaffoldFile]) -> List[str]:
+        """Render (relative_path, template_name, context) entries and write each as it is produced.
+
+        `files` may be a generator, so a scaffold of any size is never held
+        in memory as a whole.
+        """
+        written = []
+        made_dirs = set()
+        for rel_path, template_name, context in files:
+            path = os.path.join(root, rel_path)
+            parent = os.path.dirname(path)
+            if parent not in made_dirs:
+                os.makedirs(parent, exist_ok=True)
+                made_dirs.add(parent)
+            with open(path, 'w') as fh:
+                fh.write(self.render(template_name, **context))
+            written.append(path)
+        return written
+
+
+# Shared by the scaffolding agents so each template is compiled once per process.
+default_engine = TemplateEngine()
+
+
+def component_context(name: str) -> Dict:
+    return {'name': name, 'class_name': name.lower()}
+
+
+def project_files(components: Iterable[str], routes: Iterable[str], python_version: str = '3.10',
+                  engine: Optional[TemplateEngine] = None) -> Iterator[ScaffoldFile]:
+    """Files of a client project scaffold: React components, an Express app and CI config."""
+    engine = engine or default_engine
+    components = list(components)
+    for name in components:
+        yield f'frontend/src/components/{name}.jsx', 'react_component', component_context(name)
+        yield f'frontend/src/components/{name}.css', 'css_metrics_card' if name == 'MetricsCard' else 'css_component', {'name': name}
+    yield 'frontend/src/components/index.js', 'react_index', {
+        'imports': '\n'.join(f"import {n} from './{n}'" for n in components),
+        'names': ', '.join(components),
+    }
+    route_stubs = engine.render_many('express_route', ({'path': p} for p in routes))
+    yield 'backend/app.js', 'express_app', {'routes': '\n'.join(route_stubs)}
+    yield '.github/workflows/ci.yml', 'ci_yaml', {'python_version': python_version}
+
+
+def write_projects(projects: Dict[str, Dict], engine: Optional[TemplateEngine] = None) -> Dict[str, List[str]]:
+    """Scaffold many client projects: {root: {'components': [...], 'routes': [...]}}."""
+    engine = engine or default_engine
+    written = {}
+    for root, spec in projects.items():
+        files = project_files(spec.get('components', []), spec.get('routes', []), spec.get('python_version', '3.10'), engine)
+        written[root] = engine.write_scaffold(root, files)
+    return written
@@ -0,0 +1,331 @@
+import heapq
+import json
+import subprocess
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+def probe(path: str, ffprobe: str = 'ffprobe') -> Dict:
+    """Read frame rate, stream start times and video frame PTS from a container.
+
+    PTS come from the packet headers, so nothing is decoded. Packets are
+    listed in decode order; sorting puts them in presentation order, which
+    is the order decoded frames come out in. A packet without a PTS keeps
+    its slot (one nominal frame after the latest PTS so far), so frame
+    indices stay aligned.
+    """
+    streams = json.loads(subprocess.run(
+        [ffprobe, '-v', 'error', '-show_entries', 'stream=codec_type,avg_frame_rate,start_time', '-of', 'json', path],
+        check=True, capture_output=True, text=True,
+    ).stdout)['streams']
+    video = next((s for s in streams if s.get('codec_type') == 'video'), {})
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), {})
+    num, _, den = video.get('avg_frame_rate', '30/1').partition('/')
+    fps = float(num) / float(den or 1) if float(num) else 30.0
+    video_start = float(video.get('start_time', 0.0))
+    packets = subprocess.run(
+        [ffprobe, '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time', '-of', 'csv=p=0', path],
+        check=True, capture_output=True, text=True,
+    ).stdout.split()
+    pts: List[float] = []
+    latest = None
+    for value in packets:
+        value = value.strip(',')
+        if value in ('', 'N/A'):
+            t = latest + 1.0 / fps if latest is not None else video_start
+        else:
+            t = float(value)
+        pts.append(t)
+        latest = t if latest is None else max(latest, t)
+    pts.sort()
+    return {
+        'fps': fps,
+        'video_start': video_start,
+        'audio_start': float(audio.get('start_time', 0.0)),
+        'pts': pts,
+    }
+
+
+def probe_clock(path: str, ffprobe: str = 'ffprobe') -> Tuple['MediaClock', 'DriftCorrector']:
+    """MediaClock and DriftCorrector of a media file; the nominal defaults if it cannot be probed."""
+    try:
+        info = probe(path, ffprobe)
+    except (OSError, ValueError, KeyError, subprocess.CalledProcessError):
+        return MediaClock(), DriftCorrector()
+    return MediaClock.from_probe(info), DriftCorrector.from_probe(info)
+
+
+class MediaClock:
+    """Maps decoded frame indices to media time in seconds.
+
+    With per-frame PTS (variable-frame-rate captures) the mapping is a table
+    lookup; otherwise it falls back to the nominal frame rate. Times are
+    relative to the video stream start.
+    """
+    def __init__(self, fps: float = 30.0, pts: Optional[Sequence[float]] = None, start_time: float = 0.0):
+        self.fps = fps
+        self.start_time = start_time
+        self.pts = array('d', (p - start_time for p in pts)) if pts else None
+
+    @classmethod
+    def from_probe(cls, info: Dict) -> 'MediaClock':
+        return cls(fps=info['fps'], pts=info['pts'], start_time=info['video_start'])
+
+    def frame_time(self, index: int) -> float:
+        if not self.pts:
+            return index / self.fps
+        if index < len(self.pts):
+            return self.pts[index]
+        # Past the probed frames: extrapolate at the nominal rate.
+        return self.pts[-1] + (index - len(self.pts) + 1) / self.fps
+
+    def frame_at(self, t: float) -> int:
+        """Index of the frame showing at media time t."""
+        if not self.pts:
+            return max(0, int(t * self.fps))
+        return max(0, bisect_right(self.pts, t) - 1)
+
+
+class DriftCorrector:
+    """Linear map from the audio clock onto the video media clock: t_video = scale * t_audio + offset.
+
+    `offset` starts as the container's stream start difference; `fit()`
+    refines scale and offset from anchor pairs (the same moment seen by both
+    pipelines, e.g. an ability's cast sound and its on-screen cast), which
+    corrects capture drift over long streams.
+    """
+    def __init__(self, offset: float = 0.0, scale: float = 1.0):
+        self.offset = offset
+        self.scale = scale
+
+    @classmethod
+    def from_probe(cls, info: Dict) -> 'DriftCorrector':
+        return cls(offset=info['audio_start'] - info['video_start'])
+
+    def fit(self, anchors: Sequence[Tuple[float, float]]) -> 'DriftCorrector':
+        """Least-squares fit over (audio_time, video_time) pairs; one pair fixes only the offset."""
+        n = len(anchors)
+        if n == 0:
+            return self
+        mean_a = sum(a for a, _ in anchors) / n
+        mean_v = sum(v for _, v in anchors) / n
+        var = sum((a - mean_a) ** 2 for a, _ in anchors)
+        if n > 1 and var > 0:
+            self.scale = sum((a - mean_a) * (v - mean_v) for a, v in anchors) / var
+        else:
+            self.scale = 1.0
+        self.offset = mean_v - self.scale * mean_a
+        return self
+
+    def correct(self, audio_time: float) -> float:
+        return self.scale * audio_time + self.offset
+
+    def as_dict(self) -> Dict:
+        return {'offset': self.offset, 'scale': self.scale}
+
+
+def cast_anchors(vision_events: Iterable[Dict], audio_events: Iterable[Dict], drift: DriftCorrector,
+                 window: float = 0.5) -> List[Tuple[float, float]]:
+    """(audio_time, video_time) pairs for DriftCorrector.fit: each ability cast heard in the audio,
+    matched to the nearest on-screen cast of the same ability and player within `window`
+    seconds of where `drift` currently puts it.
+
+    Vision entries must already carry their media `time`.
+    """
+    seen: Dict[Tuple, List[float]] = {}
+    for entry in vision_events:
+        for event in entry.get('events', []):
+            if event.get('type') == 'ability_cast':
+                seen.setdefault((event.get('ability'), event.get('player')), []).append(entry['time'])
+    anchors = []
+    for event in audio_events:
+        times = seen.get((event.get('ability'), event.get('player')))
+        if event.get('type') != 'ability_cast' or not times:
+            continue
+        t = drift.correct(event['time'])
+        i = bisect_left(times, t)
+        near = min(times[max(0, i - 1):i + 1], key=lambda v: abs(v - t))
+        if abs(near - t) <= window:
+            anchors.append((event['time'], near))
+    return anchors
+
+
+def vision_stream(vision_events: Iterable[Dict], clock: MediaClock) -> Iterator[Dict]:
+    """Flatten per-frame vision results into timed events, in frame order.
+
+    Entries the pipeline already stamped with their media `time` keep it.
+    """
+    for entry in vision_events:
+        t = entry['time'] if 'time' in entry else clock.frame_time(entry['frame'])
+        for event in entry.get('events', []):
+            yield {'time': t, 'source': 'vision', 'frame': entry['frame'], **event}
+
+
+def audio_stream(audio_events: Iterable[Dict], drift: Optional[DriftCorrector] = None) -> Iterator[Dict]:
+    """Audio events with their time mapped onto the video clock, in input order."""
+    for event in audio_events:
+        t = drift.correct(event['time']) if drift is not None else event['time']
+        yield {**event, 'time': t, 'source': 'audio'}
+
+
+def iter_merged(vision_events: Iterable[Dict], audio_events: Iterable[Dict], clock: Optional[MediaClock] = None,
+                drift: Optional[DriftCorrector] = None) -> Iterator[Dict]:
+    """One time-ordered stream of vision and audio events.
+
+    Both inputs are already chronological (frames are analyzed in order and
+    audio is scanned front to back), so this is a single linear merge rather
+    than a sort.
+    """
+    return heapq.merge(vision_stream(vision_events, clock or MediaClock()), audio_stream(audio_events, drift),
+                       key=lambda e: e['time'])
+
+
+def merge_events(vision_events: Iterable[Dict], audio_events: Iterable[Dict], clock: Optional[MediaClock] = None,
+                 drift: Optional[DriftCorrector] = None) -> List[Dict]:
+    return list(iter_merged(vision_events, audio_events, clock, drift))
+
+
+def result_timeline(result: Dict, clock: Optional[MediaClock] = None,
+                    drift: Optional[DriftCorrector] = None) -> Iterable[Dict]:
+    """Time-ordered events of a stored result: its merged `timeline` if it has one, else vision and audio merged.
+
+    Audio is put on the video clock by the result's own `drift` unless one is given.
+    """
+    if 'timeline' in result:
+        return result['timeline']
+    if drift is None and 'drift' in result:
+        drift = DriftCorrector(**result['drift'])
+    return iter_merged(result.get('vision', []), result.get('audio', []), clock, drift)
+
+
+class EventIndex:
+    """Time-sorted event list of one match, queryable by time window, type and source.
+
+    Events are kept once, in merged time order; each (source, type) pair
+    also keeps the times and positions of its events, so a query bisects
+    only the requested types and reads just the page it returns.
+    """
+    def __init__(self, events: Iterable[Dict]):
+        self.events: List[Dict] = []
+        self.times = array('d')
+        self._by_kind: Dict[Tuple[str, str], Tuple[array, array]] = {}
+        for event in events:
+            position = len(self.events)
+            self.events.append(event)
+            self.times.append(event['time'])
+            times, positions = self._by_kind.setdefault((event['source'], event.get('type', '')), (array('d'), array('l')))
+            times.append(event['time'])
+            positions.append(position)
+
+    @classmethod
+    def from_result(cls, result: Dict, clock: Optional[MediaClock] = None,
+                    drift: Optional[DriftCorrector] = None) -> 'EventIndex':
+        return cls(result_timeline(result, clock, drift))
+
+    def types(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for (_, kind), (times, _) in self._by_kind.items():
+            counts[kind] = counts.get(kind, 0) + len(times)
+        return counts
+
+    def query(self, start: float = 0.0, end: Optional[float] = None, types: Optional[Iterable[str]] = None,
+              source: Optional[str] = None, offset: int = 0, limit: int = 100) -> Dict:
+        """Events with start <= time < end (all of them when end is None), in time order.
+
+        Returns `total` matches in the window and the `items` from `offset`
+        to `offset + limit`, each tagged with its `index` in the match.
+        """
+        end = float('inf') if end is None else end
+        wanted = set(types) if types else None
+        if wanted is None and source is None:
+            lo, hi = bisect_left(self.times, start), bisect_left(self.times, end)
+            total = hi - lo
+            selected: Iterable[int] = range(lo + offset, min(hi, lo + offset + limit))
+        else:
+            total = 0
+            slices = []
+            for (kind_source, kind), (times, positions) in self._by_kind.items():
+                if (source is None or kind_source == source) and (wanted is None or kind in wanted):
+                    lo, hi = bisect_left(times, start), bisect_left(times, end)
+                    total += hi - lo
+                    slices.append(map(positions.__getitem__, range(lo, hi)))
+            # Positions follow time order, so merging the per-type slices keeps the page chronological.
+            selected = islice(heapq.merge(*slices), offset, offset + limit)
+        items = [{'index': i, **self.events[i]} for i in selected]
+        return {'total': total, 'offset': offset, 'items': items}
+
+
+class JsonlEventIndex:
+    """EventIndex over a time-ordered JSONL timeline (MatchStore.save_stream) that never loads the events.
+
+    The file is scanned once into blocks of `block_size` events, keeping
+    for each block only its byte offset, first and last time, and event
+    counts per (source, type). A query adds up whole blocks inside the
+    window from those counts, and reads from disk only the blocks at the
+    window edges plus the ones holding the requested page. Memory is
+    O(events / block_size) however long the match is.
+    """
+    def __init__(self, path: str, block_size: int = 1024):
+        self.path = path
+        self.block_size = block_size
+        # (byte offset, first position, first time, last time, counts per (source, type))
+        self.blocks: List[Tuple[int, int, float, float, Dict[Tuple[str, str], int]]] = []
+        self.count = 0
+        with open(path, 'rb') as fh:
+            offset = fh.tell()
+            for line in iter(fh.readline, b''):
+                event = json.loads(line)
+                if self.count % block_size == 0:
+                    self.blocks.append((offset, self.count, event['time'], event['time'], {}))
+                start, first, first_time, _, counts = self.blocks[-1]
+                kind = (event['source'], event.get('type', ''))
+                counts[kind] = counts.get(kind, 0) + 1
+                self.blocks[-1] = (start, first, first_time, event['time'], counts)
+                self.count += 1
+                offset += len(line)
+
+    def types(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for *_, block_counts in self.blocks:
+            for (_, kind), n in block_counts.items():
+                counts[kind] = counts.get(kind, 0) + n
+        return counts
+
+    def _read_block(self, fh, block: Tuple) -> Iterator[Tuple[int, Dict]]:
+        offset, first = block[0], block[1]
+        fh.seek(offset)
+        for position in range(first, min(first + self.block_size, self.count)):
+            yield position, json.loads(fh.readline())
+
+    def query(self, start: float = 0.0, end: Optional[float] = None, types: Optional[Iterable[str]] = None,
+              source: Optional[str] = None, offset: int = 0, limit: int = 100) -> Dict:
+        """Same contract as EventIndex.query."""
+        end = float('inf') if end is None else end
+        wanted = set(types) if types else None
+
+        def matches(kind_source: str, kind: str) -> bool:
+            return (source is None or kind_source == source) and (wanted is None or kind in wanted)
+
+        total = 0
+        items: List[Dict] = []
+        with open(self.path, 'rb') as fh:
+            for block in self.blocks:
+                _, _, first_time, last_time, counts = block
+                if last_time < start:
+                    continue
+                if first_time >= end:
+                    break
+                inside = sum(n for (kind_source, kind), n in counts.items() if matches(kind_source, kind))
+                # Whole blocks inside the window are read only if they hold part of the page.
+                on_page = total < offset + limit and total + inside > offset
+                if first_time >= start and last_time < end and not on_page:
+                    total += inside
+                    continue
+                for position, event in self._read_block(fh, block):
+                    if start <= event['time'] < end and matches(event['source'], event.get('type', '')):
+                        if offset <= total < offset + limit:
+                            items.append({'index': position, **event})
+                        total += 1
+        return {'total': total, 'offset': offset, 'items': items}
@@ -128,31 +128,21 @@ function displayResults(data) {
     uploadSection.style.display = 'none';
     resultsSection.style.display = 'block';
 
-    // Populate vision events
+    // Populate vision and audio events
     const visionContainer = document.getElementById('visionEvents');
-    visionContainer.innerHTML = '';
-    
-    if (data.vision && data.vision.length > 0) {
-        data.vision.forEach(event => {
-            const eventHTML = createVisionEventHTML(event);
-            visionContainer.innerHTML += eventHTML;
-        });
-    } else {
-        visionContainer.innerHTML = '<p style="color: var(--text-muted);">No vision events detected</p>';
-    }
-
-    // Populate audio events
     const audioContainer = document.getElementById('audioEvents');
-    audioContainer.innerHTML = '';
-    
-    if (data.audio && data.audio.length > 0) {
-        data.audio.forEach(event => {
-            const eventHTML = createAudioEventHTML(event);
-            audioContainer.innerHTML += eventHTML;
-        });
-    } else {
-        audioContainer.innerHTML = '<p style="color: var(--text-muted);">No audio events detected</p>';
-    }
+    const visionEvents = (data.vision || []).flatMap(entry => (entry.events || []).map(e => ({ ...e, frame: entry.frame })));
+    const audioEvents = data.audio || [];
+
+    // Both lists are virtualized: a stored match pages its events from the
+    // server, otherwise pages are sliced from the arrays in this response.
+    const pageSource = (source, items) => data.match_id
+        ? serverPageSource(data.match_id, source)
+        : localPageSource(items);
+    renderTimeline(visionContainer, pageSource('vision', visionEvents), visionEvents.length, 'No vision events detected');
+    renderTimeline(audioContainer, pageSource('audio', audioEvents), audioEvents.length, 'No audio events detected');
+    setEventCount('visionCount', visionEvents.length);
+    setEventCount('audioCount', audioEvents.length);
 
     // Populate coaching advice
     const coachingContainer = document.getElementById('coachingAdvice');
@@ -169,36 +159,149 @@ function displayResults(data) {
     resultsSection.scrollIntoView({ behavior: 'smooth', block: 'start' });
 }
 
-function createVisionEventHTML(event) {
-    if (!event.events || event.events.length === 0) return '';
-    
-    return event.events.map(e => `
+function createTimelineEventHTML(e) {
+    const when = e.frame !== undefined ? `Frame ${e.frame}` : `${Number(e.time).toFixed(2)}s`;
+    return `
         <div class="event-item">
             <div class="event-header">
                 <span class="event-type">${formatEventType(e.type)}</span>
-                <span class="event-time">Frame ${event.frame}</span>
+                <span class="event-time">${when}</span>
             </div>
             <div class="event-details">
                 ${e.ability ? `Ability: ${formatAbilityName(e.ability)}` : ''}
-                ${e.player ? ` | Player: ${e.player}` : ''}
+                ${e.player ? `${e.ability ? ' | ' : ''}Player: ${e.player}` : ''}
+                ${e.text ? `Message: "${e.text}"` : ''}
             </div>
         </div>
-    `).join('');
+    `;
 }
 
-function createAudioEventHTML(event) {
-    return `
-        <div class="event-item">
-            <div class="event-header">
-                <span class="event-type">${formatEventType(event.type)}</span>
-                <span class="event-time">${event.time}s</span>
-            </div>
-            <div class="event-details">
-                ${event.player ? `Player: ${event.player}` : ''}
-                ${event.text ? `Message: "${event.text}"` : ''}
+function setEventCount(id, count) {
+    const badge = document.getElementById(id);
+    if (badge) {
+        badge.textContent = `${count.toLocaleString()} ${count === 1 ? 'Event' : 'Events'}`;
+    }
+}
+
+function renderTimeline(container, fetchPage, count, emptyText) {
+    if (container.timeline) {
+        container.timeline.destroy();
+        container.timeline = null;
+    }
+    if (count === 0) {
+        container.innerHTML = `<p style="color: var(--text-muted);">${emptyText}</p>`;
+        return;
+    }
+    container.timeline = new VirtualTimeline(container, { fetchPage });
+}
+
+/**
+ * Page source over GET /matches/{id}/events: fetchPage(offset, limit)
+ * resolves to { total, items } for one page of a stored match's events.
+ */
+function serverPageSource(matchId, source, types = null) {
+    return async (offset, limit) => {
+        const params = new URLSearchParams({ source, offset, limit });
+        (types || []).forEach(type => params.append('type', type));
+        const response = await fetch(`${API_BASE_URL}/matches/${encodeURIComponent(matchId)}/events?${params}`);
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        return response.json();
+    };
+}
+
+/**
+ * Page source over events already in memory, with the same contract as
+ * serverPageSource.
+ */
+function localPageSource(events) {
+    return async (offset, limit) => ({ total: events.length, items: events.slice(offset, offset + limit) });
+}
+
+/**
+ * Virtualized event list over a page source (serverPageSource or localPageSource).
+ *
+ * Rows have a fixed height, so the scroll position maps directly to event
+ * indexes: only the rows in view (plus a small overscan) exist in the DOM,
+ * and pages of events are loaded on demand and cached.
+ */
+class VirtualTimeline {
+    constructor(container, { fetchPage, rowHeight = 76, pageSize = 200, overscan = 8 }) {
+        this.container = container;
+        this.fetchPage = fetchPage;
+        this.rowHeight = rowHeight;
+        this.pageSize = pageSize;
+        this.overscan = overscan;
+        this.total = 0;
+        this.pages = new Map();
+        this.pending = new Set();
+        this.frame = null;
+
+        container.innerHTML = `
+            <div class="virtual-timeline">
+                <div class="virtual-timeline-spacer"></div>
+                <div class="virtual-timeline-rows"></div>
             </div>
-        </div>
-    `;
+        `;
+        this.viewport = container.querySelector('.virtual-timeline');
+        this.spacer = container.querySelector('.virtual-timeline-spacer');
+        this.rows = container.querySelector('.virtual-timeline-rows');
+        this.onScroll = () => this.scheduleRender();
+        this.viewport.addEventListener('scroll', this.onScroll, { passive: true });
+        this.loadPage(0);
+    }
+
+    async loadPage(page) {
+        if (this.pages.has(page) || this.pending.has(page)) return;
+        this.pending.add(page);
+        try {
+            const data = await this.fetchPage(page * this.pageSize, this.pageSize);
+            this.total = data.total;
+            this.spacer.style.height = `${this.total * this.rowHeight}px`;
+            this.pages.set(page, data.items);
+            this.scheduleRender();
+        } catch (error) {
+            console.error('Event page error:', error);
+        } finally {
+            this.pending.delete(page);
+        }
+    }
+
+    scheduleRender() {
+        if (this.frame === null) {
+            this.frame = requestAnimationFrame(() => {
+                this.frame = null;
+                this.render();
+            });
+        }
+    }
+
+    render() {
+        const first = Math.max(0, Math.floor(this.viewport.scrollTop / this.rowHeight) - this.overscan);
+        const visible = Math.ceil(this.viewport.clientHeight / this.rowHeight) + 2 * this.overscan;
+        const last = Math.min(this.total, first + visible);
+        const html = [];
+        for (let i = first; i < last; i++) {
+            const page = Math.floor(i / this.pageSize);
+            const items = this.pages.get(page);
+            if (!items) {
+                this.loadPage(page);
+                html.push('<div class="event-item event-placeholder"></div>');
+            } else {
+                html.push(createTimelineEventHTML(items[i - page * this.pageSize]));
+            }
+        }
+        this.rows.style.transform = `translateY(${first * this.rowHeight}px)`;
+        this.rows.innerHTML = html.join('');
+    }
+
+    destroy() {
+        this.viewport.removeEventListener('scroll', this.onScroll);
+        if (this.frame !== null) {
+            cancelAnimationFrame(this.frame);
+        }
+    }
 }
 
 function createCoachingAdviceHTML(advice) {
@@ -51,3 +51,343 @@ def test_infra_agent():
     assert 'db' in rec
     ci = infra.ci_yaml_snippet()
     assert 'name: CI' in ci
+
+
+def test_shared_array_store_maps_without_copying(tmp_path):
+    import os
+    from app.shared import SharedArrayStore, mapping_report
+
+    store = SharedArrayStore(str(tmp_path))
+    store.save('vision', [0.5] * 4096)
+    weights = store.load('vision')
+    assert weights.readonly
+    assert len(weights) == 4096 and weights[10] == 0.5
+    assert store.load('missing') is None
+    agent = VisionAgent(weights=weights)
+    assert sum(agent.weights) == 2048.0
+    report = mapping_report(str(tmp_path))
+    if report:
+        assert report['Anonymous'] == 0
+        if os.fork() == 0:
+            # Child reads the inherited mapping; its pages must stay shared with the parent.
+            total = sum(weights)
+            child = mapping_report(str(tmp_path))
+            ok = total == 2048.0 and child['Anonymous'] == 0 and child['Shared_Clean'] + child['Shared_Dirty'] > 0
+            os._exit(0 if ok else 1)
+        _, status = os.wait()
+        assert status == 0
+
+
+def test_vision_backend_chunks_frames():
+    from app.inference import FakeBackend
+
+    backend = FakeBackend(events=[{'type': 'ability_cast', 'ability': 'flash', 'player': 'player3'}])
+    backend.max_batch_size = 2
+    agent = VisionAgent(backend=backend)
+    events = agent.analyze_frames(agent.extract_frames_from_vod(b'dummy'))
+    assert backend.batch_sizes == [2, 2, 1]
+    assert [e['frame'] for e in events] == [0, 1, 2, 3, 4]
+    assert events[0]['events'][0]['ability'] == 'flash'
+
+
+def test_micro_batcher_merges_concurrent_requests():
+    from concurrent.futures import ThreadPoolExecutor
+    from app.inference import FakeBackend, MicroBatcher
+
+    backend = FakeBackend()
+    batcher = MicroBatcher(backend, max_batch_size=8, max_wait=0.05)
+    agent = VisionAgent(backend=backend, batcher=batcher)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda _: agent.analyze_frames([b'f'] * 4), range(4)))
+    batcher.close()
+    assert all(len(r) == 4 for r in results)
+    assert sum(backend.batch_sizes) == 16
+    assert max(backend.batch_sizes) > 4
+    assert batcher.stats()['batches'] == len(backend.batch_sizes)
+
+
+def test_micro_batcher_serves_forked_workers():
+    import os
+    from app.inference import FakeBackend, MicroBatcher
+
+    # Built and used in the parent, as with gunicorn --preload, then used after fork.
+    batcher = MicroBatcher(FakeBackend(), max_wait=0.001)
+    assert batcher.submit(b'parent').result(timeout=5)
+    pid = os.fork()
+    if pid == 0:
+        try:
+            ok = batcher.submit(b'child').result(timeout=5)[0]['type'] == 'ability_cast'
+        except BaseException:
+            ok = False
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    batcher.close()
+    assert os.WEXITSTATUS(status) == 0
+
+
+def test_onnx_model_requires_a_decode_size(monkeypatch):
+    import pytest
+    from app.factories import build_vision_agent
+
+    monkeypatch.setenv('VALORANT_ONNX_MODEL', 'detector.onnx')
+    monkeypatch.delenv('VALORANT_DECODE_SIZE', raising=False)
+    with pytest.raises(RuntimeError, match='VALORANT_DECODE_SIZE'):
+        build_vision_agent()
+
+
+def test_vision_factory_wires_hud_ocr_when_decoding(monkeypatch):
+    from app.factories import build_vision_agent
+
+    monkeypatch.delenv('VALORANT_ONNX_MODEL', raising=False)
+    monkeypatch.setenv('VALORANT_DECODE_SIZE', '64x36')
+    agent = build_vision_agent()
+    assert (agent.ocr.width, agent.ocr.height) == (64, 36)
+    agent.batcher.close()
+    monkeypatch.setenv('VALORANT_OCR', '0')
+    assert build_vision_agent().ocr is None
+
+
+def test_timeline_merges_on_one_clock():
+    from app.timeline import DriftCorrector, MediaClock, merge_events
+
+    # Variable frame rate: frame 2 arrives late.
+    clock = MediaClock(fps=30.0, pts=[10.0, 10.5, 12.0], start_time=10.0)
+    assert [clock.frame_time(i) for i in range(4)] == [0.0, 0.5, 2.0, 2.0 + 1 / 30]
+    assert clock.frame_at(1.9) == 1
+    drift = DriftCorrector().fit([(0.0, 0.1), (100.0, 100.2)])
+    assert abs(drift.correct(50.0) - 50.15) < 1e-9
+    vis = [{'frame': i, 'events': [{'type': 'ability_cast', 'ability': 'smoke'}]} for i in range(3)]
+    aud = [{'time': 0.2, 'type': 'footstep'}, {'time': 1.0, 'type': 'callout'}]
+    merged = merge_events(vis, aud, clock)
+    assert [(e['source'], e['time']) for e in merged] == [
+        ('vision', 0.0), ('audio', 0.2), ('vision', 0.5), ('audio', 1.0), ('vision', 2.0)]
+
+
+def test_probe_reads_packet_pts_in_presentation_order(tmp_path):
+    import json
+    import sys
+    from app.timeline import probe_clock
+
+    streams = {'streams': [{'codec_type': 'video', 'avg_frame_rate': '2/1', 'start_time': '10.0'},
+                           {'codec_type': 'audio', 'start_time': '10.25'}]}
+    # B-frames come out of the demuxer in decode order; one packet has no PTS.
+    fake = tmp_path / 'ffprobe'
+    fake.write_text(f'#!{sys.executable}\nimport sys\n'
+                    f'if "packet=pts_time" in sys.argv:\n    print("10.0\\n11.0\\n10.5\\nN/A\\n12.0")\n'
+                    f'else:\n    print({json.dumps(json.dumps(streams))})\n')
+    fake.chmod(0o755)
+    clock, drift = probe_clock('match.ts', ffprobe=str(fake))
+    assert [clock.frame_time(i) for i in range(5)] == [0.0, 0.5, 1.0, 1.5, 2.0]
+    assert drift.correct(0.0) == 0.25
+    assert probe_clock('match.ts', ffprobe=str(tmp_path / 'missing'))[0].fps == 30.0
+
+
+def test_pipeline_puts_events_on_the_probed_clock(monkeypatch):
+    from app import pipeline
+    from app.inference import FakeBackend
+    from app.timeline import DriftCorrector, EventIndex, MediaClock
+
+    class CastSound(AudioAgent):
+        def iter_audio_events(self, vod_bytes, token=None):
+            yield {'time': 0.3, 'type': 'ability_cast', 'ability': 'smoke', 'player': 'player1'}
+
+    probed = []
+    monkeypatch.setattr(pipeline, 'probe_clock', lambda path: probed.append(path) or (MediaClock(fps=2.0), DriftCorrector(0.3)))
+    cast_on_frame_1 = VisionAgent(backend=FakeBackend([]))
+    cast_on_frame_1.extract_frames_from_vod = lambda vod: [b'f0', b'f1', b'f2']
+    cast_on_frame_1.backend.infer_batch = lambda frames: [
+        [{'type': 'ability_cast', 'ability': 'smoke', 'player': 'player1'}] if i == 1 else [] for i in range(len(frames))]
+    result = pipeline.analyze_vod(cast_on_frame_1, CastSound(), CoachAgent(), b'vod', source='match.mkv')
+    assert probed == ['match.mkv']
+    assert [e['time'] for e in result['vision']] == [0.0, 0.5, 1.0]
+    # The heard cast (0.3 + 0.3 offset) is refit onto the seen one at 0.5 s.
+    assert result['drift'] == {'offset': 0.2, 'scale': 1.0}
+    timeline = EventIndex.from_result(result).query()['items']
+    assert [(e['source'], e['time']) for e in timeline] == [('vision', 0.5), ('audio', 0.5)]
+
+
+def test_coach_requires_footsteps_near_abilities():
+    far = coach.generate_advice([{'frame': 0, 'events': [{'type': 'ability_cast', 'ability': 'flash'}]}],
+                                [{'time': 30.0, 'type': 'footstep'}])
+    assert far['tips'] == []
+    near = coach.generate_advice([{'frame': 900, 'events': [{'type': 'ability_cast', 'ability': 'flash'}]}],
+                                 [{'time': 30.0, 'type': 'footstep'}])
+    assert len(near['tips']) == 1
+
+
+def test_template_batches_and_scaffolds(tmp_path):
+    from string import Template
+    import pytest
+    from app.templates import TemplateEngine, write_projects
+
+    stubs = frontend.create_react_component_stubs(['Header', 'Timeline'])
+    assert stubs[1] == frontend.create_react_component_stub('Timeline')
+    assert backend.generate_express_route_stubs(['/a', '/b'])[0] == backend.generate_express_route_stub('/a')
+    assert "python-version: '3.11'" in infra.ci_yaml_snippet('3.11')
+
+    engine = TemplateEngine()
+    assert engine.compile('express_route') is engine.compile('express_route')
+    assert engine.compile('react_component').names == ('name', 'class_name', 'name', 'name')
+    engine.register('escaped', 'cost: $$${price} ($unit)')
+    assert engine.render('escaped', price=5, unit='USD') == Template('cost: $$${price} ($unit)').substitute(price=5, unit='USD')
+    with pytest.raises(KeyError):
+        engine.render('escaped', price=5)
+    engine.register('broken', 'a $ b')
+    with pytest.raises(ValueError):
+        engine.compile('broken')
+    written = write_projects({
+        str(tmp_path / 'client-a'): {'components': ['Header', 'MetricsCard'], 'routes': ['/api/v1/matches']},
+        str(tmp_path / 'client-b'): {'components': ['Timeline'], 'routes': []},
+    }, engine=engine)
+    assert len(written[str(tmp_path / 'client-a')]) == 7
+    app_js = (tmp_path / 'client-a' / 'backend' / 'app.js').read_text()
+    assert "app.post('/api/v1/matches'" in app_js
+    assert 'metrics-card' in (tmp_path / 'client-a' / 'frontend/src/components/MetricsCard.css').read_text()
+    assert (tmp_path / 'client-b' / '.github/workflows/ci.yml').read_text() == infra.ci_yaml_snippet()
+
+
+def test_sharded_advice_per_player_and_round():
+    vis = []
+    for frame, player in [(30, 'player1'), (60, 'player1'), (90, 'player1'), (3000, 'player2'), (3030, 'player1')]:
+        vis.append({'frame': frame, 'events': [{'type': 'ability_cast', 'ability': 'smoke', 'player': player}]})
+    aud = [{'time': 2.5, 'type': 'footstep', 'player': 'player1'}, {'time': 50.0, 'type': 'callout', 'text': 'rotating'}]
+    advice = coach.generate_sharded_advice(vis, aud, round_starts=[0.0, 90.0], teams={'player1': 'attack', 'player2': 'attack'})
+    # Match-level tips agree with the unsharded rules.
+    assert advice['tips'] == coach.generate_advice(vis, aud)['tips']
+    p1 = advice['players']['player1']
+    assert [(r['round'], r['smokes']) for r in p1['rounds']] == [(0, 3), (1, 1)]
+    assert len(p1['tips']) == 2 and p1['tips'][0].startswith('Round 1: 3 smokes')
+    assert advice['players']['player2']['tips'] == []
+    assert advice['teams']['attack']['abilities'] == 5
+    assert advice['teams']['attack']['tips'] == ['Utility is concentrated on player1; spread ability usage across the team']
+
+
+def test_sharded_advice_process_pool_matches_sequential(monkeypatch):
+    from app.agents import coach as coach_module
+
+    vis = [{'frame': i * 30, 'events': [{'type': 'ability_cast', 'ability': 'flash', 'player': f'player{i % 10}'}]} for i in range(200)]
+    aud = [{'time': float(i), 'type': 'footstep', 'player': f'player{i % 10}'} for i in range(200)]
+    starts = [float(r * 20) for r in range(10)]
+    assert coach.generate_sharded_advice(vis, aud, round_starts=starts, workers=2) == \
+        coach.generate_sharded_advice(vis, aud, round_starts=starts, workers=1)
+    # One pool per process whatever the budget, so a changed budget never shuts it down under other callers.
+    pool = coach_module.shard_pool()
+    assert coach.generate_sharded_advice(vis, aud, round_starts=starts, workers=3) == \
+        coach.generate_sharded_advice(vis, aud, round_starts=starts, workers=1)
+    assert coach_module.shard_pool() is pool
+    assert list(pool.map(abs, [-1, -2])) == [1, 2]
+    # Small matches never pay for process round trips, even with a budget.
+    monkeypatch.setattr(coach_module, 'shard_pool', None)
+    assert coach.generate_sharded_advice(vis[:5], aud[:5], workers=4)['tips'] == coach.generate_advice(vis[:5], aud[:5])['tips']
+
+
+def test_cancel_token_truncates_and_cancels():
+    import pytest
+    from app.cancel import CancelToken, Cancelled
+    from app.pipeline import analyze_vod
+
+    class SlowFrames:
+        def __init__(self, token, after):
+            self.token, self.after, self.count = token, after, 0
+
+        def __iter__(self):
+            while True:
+                self.count += 1
+                if self.count > self.after:
+                    self.token.deadline = 0.0
+                yield b'frame'
+
+    from app.inference import FakeBackend
+
+    backend = FakeBackend()
+    backend.max_batch_size = 1
+    token = CancelToken(budget=60)
+    # The budget runs out while the 4th frame is read; the loop stops at the next checkpoint.
+    events = VisionAgent(backend=backend).analyze_frames(SlowFrames(token, after=3), token=token)
+    assert len(events) == 4
+    assert token.truncated_stages == ['vision']
+
+    result = analyze_vod(vision, audio, coach, b'dummy', token=CancelToken(budget=1e-9))
+    assert result['truncated'] is True
+    assert result['truncated_stages'] == ['vision', 'audio']
+    assert result['vision'] == [] and 'tips' in result['advice']
+
+    cancelled = CancelToken()
+    cancelled.cancel('client disconnected')
+    with pytest.raises(Cancelled):
+        analyze_vod(vision, audio, coach, b'dummy', token=cancelled)
+
+
+def test_live_coach_emits_only_changed_tips_over_a_sliding_window():
+    from app.agents.coach import LiveCoach
+
+    live = LiveCoach(window=10.0, proximity_window=2.0, smoke_limit=2)
+    smoke = {'type': 'ability_cast', 'ability': 'smoke', 'player': 'p1'}
+    assert live.update({'time': 0.0, **smoke}) == {'added': [], 'removed': []}
+    live.update({'time': 1.0, **smoke})
+    added = live.update({'time': 2.0, **smoke})['added']
+    assert len(added) == 1 and 'smokes' in added[0]
+    # Still above the limit: nothing new to report.
+    assert live.update({'time': 3.0, **smoke}) == {'added': [], 'removed': []}
+    spacing = live.update({'time': 4.0, 'type': 'footstep', 'player': 'p1'})['added']
+    assert len(spacing) == 1 and 'footsteps' in spacing[0]
+    assert live.advice()['players']['p1'] == {'abilities': 4, 'smokes': 4, 'spacing': 1}
+    # Casts at 0-1s leave the window, which drops p1 to 2 smokes; the spacing pair is gone by 14.5s.
+    assert live.update({'time': 11.5, 'type': 'callout'})['removed'] == added
+    assert live.update({'time': 14.5, 'type': 'callout'})['removed'] == spacing
+    assert live.advice()['tips'] == []
+
+    # A long session keeps only the window's events in memory.
+    for i in range(10_000):
+        live.update({'time': 20.0 + i * 0.1, **smoke})
+    assert len(live._recent) <= 2 * 101  # an ability and a smoke entry per cast
+
+
+def test_pipeline_sizes_the_coach_pool_from_the_scheduler_budget():
+    from app.pipeline import analyze_vod
+    from app.scheduler import StageScheduler
+
+    class RecordingCoach(CoachAgent):
+        def generate_sharded_advice(self, *args, workers=None, **kwargs):
+            budgets.append(workers)
+            return super().generate_sharded_advice(*args, workers=1, **kwargs)
+
+    class CoachBound(StageScheduler):
+        def processes(self, name):
+            return 3 if name == 'coach' else 1
+
+    budgets = []
+    analyze_vod(VisionAgent(), AudioAgent(), RecordingCoach(), b'dummy', scheduler=CoachBound(('vision', 'audio', 'coach')))
+    analyze_vod(VisionAgent(), AudioAgent(), RecordingCoach(), b'dummy', scheduler=StageScheduler(('vision', 'audio', 'coach')))
+    assert budgets == [3, 1]
+
+
+def test_stage_scheduler_moves_slots_to_the_bottleneck():
+    import threading
+    import time
+    from app.scheduler import StageScheduler, apportion
+
+    assert apportion(9, {'a': 1.0, 'b': 1.0, 'c': 1.0}) == {'a': 3, 'b': 3, 'c': 3}
+    assert apportion(9, {'a': 0.0, 'b': 0.0, 'c': 6.0}) == {'a': 1, 'b': 1, 'c': 7}
+
+    scheduler = StageScheduler(('vision', 'audio', 'coach'), slots=9, interval=0.05)
+    assert scheduler.limits == {'vision': 3, 'audio': 3, 'coach': 3}
+
+    def request():
+        with scheduler.stage('vision'):
+            time.sleep(0.001)
+        with scheduler.stage('coach'):
+            time.sleep(0.03)
+
+    threads = [threading.Thread(target=request) for _ in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    scheduler.rebalance()
+    metrics = scheduler.metrics()
+    assert metrics['bottleneck'] == 'coach'
+    assert metrics['stages']['coach']['limit'] > 3
+    assert metrics['stages']['coach']['completed'] == 12
+    assert metrics['decisions'] and metrics['decisions'][-1]['bottleneck'] == 'coach'
+    assert sum(metrics['stages'][s]['limit'] for s in metrics['stages']) == 9
@@ -0,0 +1,404 @@
+from fastapi.testclient import TestClient
+
+from app.main import app, registry, startup_timings
+from app.registry import AgentRegistry
+
+
+def test_registry_builds_agents_lazily():
+    built = []
+    reg = AgentRegistry()
+    reg.register('vision', lambda: built.append('vision') or object())
+    assert built == []
+    assert reg.status()['vision']['state'] == 'pending'
+    agent = reg.get('vision')
+    assert reg.get('vision') is agent
+    assert built == ['vision']
+    assert reg.is_ready()
+    assert reg.status()['vision']['init_seconds'] is not None
+
+
+def test_registry_reports_failed_agents():
+    reg = AgentRegistry()
+    reg.register('broken', lambda: 1 / 0)
+    reg.warm_up(background=False)
+    assert not reg.is_ready()
+    assert reg.status()['broken']['state'] == 'failed'
+
+
+def test_health_endpoints():
+    with TestClient(app) as client:
+        assert client.get('/health/live').json()['status'] == 'alive'
+        registry.warm_up(background=False)
+        ready = client.get('/health/ready')
+        assert ready.status_code == 200
+        assert set(ready.json()['agents']) == {'vision', 'audio', 'coach'}
+    assert startup_timings['import_seconds'] is not None
+    assert startup_timings['first_request_seconds'] is not None
+
+
+def test_analyze_vod_endpoint():
+    with TestClient(app) as client:
+        res = client.post('/analyze/vod', files={'file': ('match.mp4', b'dummy', 'video/mp4')})
+        assert res.status_code == 200
+        assert 'tips' in res.json()['advice']
+
+
+def big_result(n=500):
+    return {
+        'vision': [{'frame': i, 'events': [{'type': 'ability_cast', 'ability': 'smoke', 'player': 'player1'}]} for i in range(n)],
+        'audio': [{'time': i * 0.5, 'type': 'footstep', 'player': 'player2'} for i in range(n)] + [{'time': 999.0, 'type': 'callout', 'text': 'rotating'}],
+        'advice': {'summary': 'No critical issues detected', 'tips': []},
+    }
+
+
+def test_columnar_encoding_round_trips_and_shrinks():
+    import gzip
+    import json
+    from app.encoding import COLUMNAR_JSON, columnar, decode_columnar, encode
+
+    result = big_result()
+    assert decode_columnar(columnar(result)) == result
+    rows, _ = encode(result)
+    cols, headers = encode(result, accept=COLUMNAR_JSON)
+    assert headers['Content-Type'] == COLUMNAR_JSON
+    assert len(cols) < len(rows) / 3
+    zipped, headers = encode(result, accept_encoding='br, gzip;q=0.8')
+    assert headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(zipped)) == result
+    _, headers = encode(result, accept_encoding='gzip;q=0')
+    assert 'Content-Encoding' not in headers
+
+
+def test_columnar_encoding_keeps_frame_fields_and_honours_q_values():
+    from app.encoding import COLUMNAR_JSON, JSON, MSGPACK, choose_format, columnar, decode_columnar
+
+    result = {
+        'vision': [
+            {'frame': 0, 'time': 0.0, 'hud': {'timer': '1:40'}, 'positions': [{'player': 'p1', 'x': 0.5, 'y': 0.5}],
+             'events': [{'type': 'ability_cast', 'ability': 'smoke', 'player': 'p1'}]},
+            {'frame': 1, 'time': 0.034, 'hud': {'timer': '1:39'}, 'positions': [], 'events': []},
+            {'frame': 2, 'time': 0.067, 'events': [{'type': 'kill', 'player': 'p2'}, {'type': 'death', 'player': 'p1'}]},
+        ],
+        'audio': [],
+    }
+    encoded = columnar(result)
+    assert encoded['frames']['time'] == [0.0, 0.034, 0.067] and encoded['vision']['frame'] == [0, 2, 2]
+    assert decode_columnar(encoded) == result
+
+    assert choose_format(f'{COLUMNAR_JSON};q=0') == JSON
+    assert choose_format(f'{JSON};q=0.9, {COLUMNAR_JSON};q=0.5') == JSON
+    assert choose_format(f'{COLUMNAR_JSON};q=0.5, */*;q=0.1') == COLUMNAR_JSON
+    assert choose_format(f'{MSGPACK};q=0, {COLUMNAR_JSON}') == COLUMNAR_JSON
+
+
+def test_msgpack_encoding():
+    import pytest
+    msgpack = pytest.importorskip('msgpack')
+    from app.encoding import MSGPACK, decode_columnar, encode
+
+    body, headers = encode(big_result(), accept=MSGPACK)
+    assert headers['Content-Type'] == MSGPACK
+    assert decode_columnar(msgpack.unpackb(body, raw=False)) == big_result()
+
+
+def test_analyze_vod_negotiates_encoding():
+    from app.encoding import COLUMNAR_JSON
+
+    with TestClient(app) as client:
+        res = client.post('/analyze/vod', files={'file': ('match.mp4', b'dummy', 'video/mp4')},
+                          headers={'Accept': COLUMNAR_JSON})
+        assert res.headers['content-type'] == COLUMNAR_JSON
+        body = res.json()
+        assert body['encoding'] == 'columnar-v2'
+        assert body['vision']['frame'] == [0, 1, 2, 3, 4]
+        assert body['frames']['frame'] == [0, 1, 2, 3, 4] and len(body['frames']['time']) == 5
+
+
+def test_analyze_vod_encodes_off_the_event_loop(monkeypatch):
+    import asyncio
+    from app import main
+
+    on_loop = []
+
+    def encode(*args):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return original(*args)
+
+    original = main.encode
+    monkeypatch.setattr(main, 'encode', encode)
+    with TestClient(app) as client:
+        res = client.post('/analyze/vod', files={'file': ('match.mp4', b'dummy', 'video/mp4')},
+                          headers={'accept-encoding': 'gzip'})
+    assert res.status_code == 200 and 'tips' in res.json()['advice']
+    assert on_loop == [False]
+
+
+def test_analyze_vod_time_budget_returns_partial_results():
+    with TestClient(app) as client:
+        res = client.post('/analyze/vod?budget=0.000001', files={'file': ('match.mp4', b'dummy', 'video/mp4')})
+        assert res.status_code == 200
+        body = res.json()
+        assert body['truncated'] is True
+        assert body['vision'] == []
+
+
+def test_event_index_queries_by_window_type_and_source():
+    from app.timeline import EventIndex
+
+    index = EventIndex.from_result(big_result())
+    assert index.types() == {'ability_cast': 500, 'footstep': 500, 'callout': 1}
+    page = index.query(start=10.0, end=20.0, offset=5, limit=10)
+    assert page['total'] == 200 + 20  # frames 300-499 at 30 fps, footsteps every 0.5s
+    assert [e['time'] for e in page['items']] == sorted(e['time'] for e in page['items'])
+    assert all(10.0 <= e['time'] < 20.0 for e in page['items'])
+    steps = index.query(start=10.0, end=20.0, types=['footstep'], limit=1000)
+    assert steps['total'] == 20 and all(e['type'] == 'footstep' for e in steps['items'])
+    vision = index.query(source='vision', offset=490)
+    assert vision['total'] == 500 and [e['frame'] for e in vision['items']] == list(range(490, 500))
+    assert index.query(types=['callout'])['items'][0]['text'] == 'rotating'
+
+
+def test_match_events_endpoint_pages_stored_matches(tmp_path, monkeypatch):
+    from app import main
+    from app.store import MatchStore
+
+    monkeypatch.setattr(main, 'match_store', MatchStore(str(tmp_path)))
+    with TestClient(app) as client:
+        match_id = client.post('/analyze/vod', files={'file': ('match.mp4', b'dummy', 'video/mp4')}).json()['match_id']
+        page = client.get(f'/matches/{match_id}/events', params={'type': 'ability_cast', 'limit': 2}).json()
+        assert page['total'] == 5
+        assert [e['frame'] for e in page['items']] == [0, 1]
+        assert client.get('/matches/missing/events').status_code == 404
+
+
+def test_clip_index_starts_clips_on_keyframes():
+    from app.clips import KeyframeIndex, build_clip_index, highlight_events, parse_range
+
+    timeline = [
+        {'time': 1.0, 'type': 'footstep', 'player': 'a'},
+        {'time': 9.5, 'type': 'footstep', 'player': 'b'},
+        {'time': 10.0, 'type': 'ability_cast', 'ability': 'smoke', 'player': 'b'},
+        {'time': 11.0, 'type': 'footstep', 'player': 'b'},
+        {'time': 30.0, 'type': 'callout', 'text': 'rotating'},
+    ]
+    highlights = highlight_events(timeline, window=2.0)
+    assert [e['time'] for e in highlights] == [9.5, 10.0, 11.0]
+    keyframes = KeyframeIndex([0.0, 2.0, 4.0, 6.0, 8.0], [0, 1000, 2000, 3000, 4000])
+    clips = build_clip_index(highlights, keyframes, pre=3.0, post=5.0)
+    assert [(c['start'], c['byte_offset']) for c in clips] == [(6.0, 3000), (6.0, 3000), (8.0, 4000)]
+    assert clips[1]['ability'] == 'smoke' and clips[1]['end'] == 15.0
+
+    assert parse_range(None, 100) is None
+    assert parse_range('bytes=10-19', 100) == (10, 19)
+    assert parse_range('bytes=90-', 100) == (90, 99)
+    assert parse_range('bytes=-5', 100) == (95, 99)
+    import pytest
+    with pytest.raises(ValueError):
+        parse_range('bytes=200-300', 100)
+
+
+def test_cast_detections_merge_into_one_clip_linked_to_its_tips():
+    from app.agents.coach import CoachAgent
+    from app.clips import KeyframeIndex, build_clip_index, highlight_events, link_clips
+
+    # One smoke seen on three consecutive frames, a second smoke later, and p2's cast in between.
+    casts = [{'time': t, 'type': 'ability_cast', 'ability': 'smoke', 'player': 'p1'} for t in (10.0, 10.033, 10.067)]
+    timeline = casts + [{'time': 12.0, 'type': 'ability_cast', 'ability': 'flash', 'player': 'p2'},
+                        {'time': 20.0, 'type': 'ability_cast', 'ability': 'smoke', 'player': 'p1'},
+                        {'time': 20.033, 'type': 'ability_cast', 'ability': 'smoke', 'player': 'p1'}]
+    highlights = highlight_events(timeline, merge_gap=1.0)
+    assert [(h['time'], h['last_time']) for h in highlights] == [(10.0, 10.067), (12.0, 12.0), (20.0, 20.033)]
+    assert casts[0] == {'time': 10.0, 'type': 'ability_cast', 'ability': 'smoke', 'player': 'p1'}
+    clips = build_clip_index(highlights, KeyframeIndex([0.0], [0]), pre=3.0, post=5.0)
+    assert [c['end'] for c in clips] == [15.067, 17.0, 25.033]
+
+    advice = CoachAgent().generate_timeline_advice(timeline)
+    link_clips(advice, clips)
+    assert advice['players']['p1']['rounds'][0]['clips'] == [0, 2]
+    assert advice['players']['p2']['rounds'][0]['clips'] == [1]
+    assert clips[0]['tips'] == ['Round 1: 5 smokes; consider swapping some for aggressive plays'] and clips[1]['tips'] == []
+
+
+def test_keyframes_come_from_packet_flags_relative_to_the_stream_start(tmp_path):
+    import sys
+    from app.clips import probe_keyframes
+
+    # An MPEG-TS style stream starting at 1.4 s; packets in decode order.
+    fake = tmp_path / 'ffprobe'
+    fake.write_text(f'#!{sys.executable}\nimport sys\n'
+                    'if "stream=start_time" in sys.argv:\n    print("1.400000")\n'
+                    'else:\n    print("3.4,9400,K__\\n1.4,188,K_\\n1.5,5000,__\\nN/A,9000,K_\\n3.5,12000,__")\n')
+    fake.chmod(0o755)
+    keyframes = probe_keyframes('match.ts', ffprobe=str(fake))
+    assert [round(t, 6) for t in keyframes.times] == [0.0, 2.0]
+    assert list(keyframes.offsets) == [188, 9400]
+
+
+def test_match_clip_endpoint_serves_byte_ranges(tmp_path, monkeypatch):
+    import sys
+    from app import main
+    from app.clips import ClipCache
+    from app.store import MatchStore
+
+    store = MatchStore(str(tmp_path))
+    source = tmp_path / 'match.mp4'
+    source.write_bytes(bytes(range(256)) * 4)
+    store.save('m1', {'id': 'm1', 'source': str(source), 'vision': [], 'audio': [],
+                      'clips': [{'id': 0, 'time': 10.0, 'type': 'ability_cast', 'start': 8.0, 'end': 15.0, 'byte_offset': 0}]})
+    copy = [sys.executable, '-c', 'import shutil, sys; shutil.copyfile(sys.argv[1], sys.argv[4])']
+    cache = ClipCache(str(tmp_path / 'clips'), command=copy)
+    monkeypatch.setattr(main, 'match_store', store)
+    monkeypatch.setattr(main, 'clip_cache', lambda root: cache)
+    main.clip_index.cache_clear()
+    with TestClient(app) as client:
+        assert client.get('/matches/m1/clips').json()['clips'][0]['start'] == 8.0
+        whole = client.get('/matches/m1/clips/0')
+        assert whole.status_code == 200 and len(whole.content) == 1024
+        part = client.get('/matches/m1/clips/0', headers={'Range': 'bytes=256-259'})
+        assert part.status_code == 206
+        assert part.headers['content-range'] == 'bytes 256-259/1024'
+        assert part.content == bytes([0, 1, 2, 3])
+        assert client.get('/matches/m1/clips/0', headers={'Range': 'bytes=5000-'}).status_code == 416
+        assert client.get('/matches/m1/clips/7').status_code == 404
+    # Cut once, then served from the clip cache.
+    assert [p.name for p in (tmp_path / 'clips' / 'm1').iterdir()] == ['0.mp4']
+
+
+def test_analyze_live_streams_coaching_changes():
+    with TestClient(app) as client:
+        smoke = {'type': 'ability_cast', 'ability': 'smoke', 'player': 'p1'}
+        changes = [client.post('/analyze/live', json={'session_id': 's1', 'seq': i, 't': float(i), 'events': [smoke]}).json()['changes']
+                   for i in range(4)]
+        assert [len(c['added']) for c in changes] == [0, 0, 1, 0]
+        final = client.post('/analyze/live', json={'session_id': 's1', 't': 4.0, 'final': True}).json()
+        assert final['advice']['players']['p1']['smokes'] == 4
+        assert client.post('/analyze/live', json={'stream_url': 'x'}).json()['status'] == 'live analysis not yet implemented'
+
+
+def test_scheduler_metrics_endpoint():
+    with TestClient(app) as client:
+        client.post('/analyze/vod', files={'file': ('match.mp4', b'dummy', 'video/mp4')})
+        metrics = client.get('/health/scheduler').json()
+        assert set(metrics['stages']) == {'vision', 'audio', 'coach'}
+        assert all(s['completed'] >= 1 for s in metrics['stages'].values())
+
+
+def test_client_disconnect_stops_the_agent_loops(monkeypatch):
+    import asyncio
+    import time
+    from app import main
+    from app.agents.audio import AudioAgent
+    from app.agents.coach import CoachAgent
+    from app.agents.vision import VisionAgent
+
+    pulled = []
+
+    class SlowVision(VisionAgent):
+        def extract_frames_from_vod(self, vod_bytes):
+            for i in range(400):
+                pulled.append(i)
+                time.sleep(0.005)
+                yield b'frame'
+
+    slow = AgentRegistry()
+    slow.register('vision', SlowVision)
+    slow.register('audio', AudioAgent)
+    slow.register('coach', CoachAgent)
+    monkeypatch.setattr(main, 'registry', slow)
+
+    boundary = 'disconnect-test'
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="match.mp4"\r\n'
+            f'Content-Type: video/mp4\r\n\r\ndummy\r\n--{boundary}--\r\n').encode()
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST', 'scheme': 'http',
+        'path': '/analyze/vod', 'raw_path': b'/analyze/vod', 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'test'), (b'content-type', f'multipart/form-data; boundary={boundary}'.encode()),
+                    (b'content-length', str(len(body)).encode())],
+        'client': ('127.0.0.1', 1234), 'server': ('test', 80),
+    }
+    sent = []
+
+    async def run():
+        gone = asyncio.Event()
+        asyncio.get_running_loop().call_later(0.3, gone.set)
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            # The client closes the socket 0.3 s in, like a browser tab being closed.
+            await gone.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+
+        await main.app(scope, receive, send)
+
+    asyncio.run(run())
+    assert sent[0]['status'] == 499
+    assert 0 < len(pulled) < 400
+
+
+def test_corrupt_vod_is_rejected_instead_of_analyzed_empty(monkeypatch):
+    import sys
+    from app import main
+    from app.agents.audio import AudioAgent
+    from app.agents.coach import CoachAgent
+    from app.agents.vision import VisionAgent
+    from app.decode import FfmpegDecoder
+
+    class FailingDecode(VisionAgent):
+        def iter_frames(self, vod):
+            failing = [sys.executable, '-c', 'import sys; sys.stderr.write("Invalid data found"); sys.exit(1)']
+            return FfmpegDecoder(vod, 4, 2, ring_slots=2, command=failing).frames()
+
+    reg = AgentRegistry()
+    reg.register('vision', FailingDecode)
+    reg.register('audio', AudioAgent)
+    reg.register('coach', CoachAgent)
+    monkeypatch.setattr(main, 'registry', reg)
+    with TestClient(app) as client:
+        res = client.post('/analyze/vod', files={'file': ('match.mp4', b'not a video', 'video/mp4')})
+    assert res.status_code == 422
+    assert 'Invalid data found' in res.json()['detail']
+
+
+def test_analyses_wait_for_admission_on_the_event_loop(monkeypatch):
+    import asyncio
+    import threading
+    import time
+    import anyio
+    import httpx
+    from app import main
+
+    running, peak, default_borrowed = [0], [0], []
+    lock = threading.Lock()
+
+    def run_pipeline(contents, token=None, filename=None):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return {'vision': [], 'audio': [], 'advice': {'summary': 'ok', 'tips': []}}
+
+    monkeypatch.setattr(main, 'run_pipeline', run_pipeline)
+    monkeypatch.setattr(main, 'pipeline_limiter', anyio.CapacityLimiter(1))
+
+    async def run():
+        async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+            posts = [asyncio.ensure_future(client.post('/analyze/vod', files={'file': ('m.mp4', b'x', 'video/mp4')}))
+                     for _ in range(4)]
+            await asyncio.sleep(0.02)
+            # Three analyses are queued, but none of them holds a thread of the shared pool.
+            default_borrowed.append(anyio.to_thread.current_default_thread_limiter().borrowed_tokens)
+            return [r.status_code for r in await asyncio.gather(*posts)]
+
+    assert asyncio.run(run()) == [200] * 4
+    assert peak == [1] and default_borrowed == [0]
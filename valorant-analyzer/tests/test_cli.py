@@ -0,0 +1,198 @@
+import json
+
+from app.cli import iter_inputs, main
+from app.store import MatchStore
+
+
+def make_vods(tmp_path, n=3):
+    vods = tmp_path / 'vods'
+    (vods / 'day1').mkdir(parents=True)
+    for i in range(n):
+        (vods / 'day1' / f'map{i}.mp4').write_bytes(b'dummy' * (i + 1))
+    (vods / 'notes.txt').write_text('not a video')
+    return vods
+
+
+def test_iter_inputs_expands_directories_and_manifests(tmp_path):
+    vods = make_vods(tmp_path)
+    manifest = tmp_path / 'manifest.txt'
+    manifest.write_text('# archive\nvods/day1/map1.mp4\n')
+    assert [p.rsplit('/', 1)[1] for p in iter_inputs([str(vods)])] == ['map0.mp4', 'map1.mp4', 'map2.mp4']
+    assert list(iter_inputs([str(manifest)])) == [str(tmp_path / 'vods/day1/map1.mp4')]
+
+
+def test_analyze_writes_results_and_resumes(tmp_path, capsys):
+    vods = make_vods(tmp_path)
+    out = tmp_path / 'results.jsonl'
+    store_dir = tmp_path / 'matches'
+    assert main(['analyze', str(vods), '--jobs', '2', '--out', str(out), '--store', str(store_dir)]) == 0
+    assert json.loads(capsys.readouterr().out) == {'analyzed': 3, 'skipped': 0, 'failed': 0}
+    records = [json.loads(line) for line in out.read_text().splitlines()]
+    assert len(records) == 3 and all('tips' in r['advice'] for r in records)
+    assert sorted(MatchStore(str(store_dir)).ids()) == sorted(r['id'] for r in records)
+
+    # Simulate an interruption that left a truncated line behind.
+    with open(out, 'a') as fh:
+        fh.write('{"id": "trunc')
+    assert main(['analyze', str(vods), '--jobs', '2', '--out', str(out)]) == 0
+    assert json.loads(capsys.readouterr().out) == {'analyzed': 0, 'skipped': 3, 'failed': 0}
+    (vods / 'day1' / 'map3.mp4').write_bytes(b'new')
+    assert main(['analyze', str(vods), '--jobs', '2', '--out', str(out)]) == 0
+    assert json.loads(out.read_text().splitlines()[-1])['source'].endswith('map3.mp4')
+
+
+def test_cli_workers_use_the_server_factories_and_decode_from_the_path(tmp_path, monkeypatch):
+    from app import cli
+    from app.agents.vision import VisionAgent
+
+    seen = []
+
+    def iter_frames(self, vod):
+        seen.append((vod, self.decode_size, self.ocr is not None))
+        return self.extract_frames_from_vod(vod)
+
+    monkeypatch.setenv('VALORANT_DECODE_SIZE', '64x36')
+    monkeypatch.setattr(VisionAgent, 'iter_frames', iter_frames)
+    monkeypatch.setattr(cli, '_agents', None)
+    vod = make_vods(tmp_path) / 'day1' / 'map0.mp4'
+    record = cli.analyze_file(str(vod))
+    cli._agents[0].batcher.close()
+    assert seen == [(str(vod), (64, 36), True)]
+    assert record['source'] == str(vod)
+
+
+def test_recoach_only_touches_stale_matches(tmp_path, capsys):
+    vods = make_vods(tmp_path)
+    store_dir = tmp_path / 'matches'
+    main(['analyze', str(vods), '--jobs', '1', '--store', str(store_dir)])
+    capsys.readouterr()
+    store = MatchStore(str(store_dir))
+    stale, edited, _ = store.ids()
+    record = store.load(stale)
+    record['advice_meta']['rules_version'] = 1
+    record['advice'] = {'summary': 'No critical issues detected', 'tips': ['Old tip']}
+    store.save(stale, record)
+    record = store.load(edited)
+    record['audio'] = []
+    store.save(edited, record)
+
+    report_path = tmp_path / 'recoach.json'
+    assert main(['recoach', '--store', str(store_dir), '--report', str(report_path)]) == 0
+    report = json.loads(report_path.read_text())
+    assert (report['checked'], report['recoached'], report['changed']) == (3, 2, 2)
+    changes = {c['id']: c for c in report['changes']}
+    assert changes[stale]['removed'] == ['Old tip'] and changes[stale]['from_rules_version'] == 1
+    assert changes[edited]['removed'] == ['Work on clearing angles and spacing when approaching sites']
+    assert main(['recoach', '--store', str(store_dir)]) == 0
+    assert json.loads(capsys.readouterr().out.splitlines()[-1])['recoached'] == 0
+
+
+def test_advice_diff_covers_players_and_teams():
+    from app.recoach import advice_changed, diff_advice
+
+    old = {'summary': 's', 'tips': ['a'], 'players': {'p1': {'tips': ['x']}, 'p2': {'tips': ['y']}},
+           'teams': {'attack': {'tips': []}}}
+    new = {'summary': 's', 'tips': ['a'], 'players': {'p1': {'tips': ['x']}, 'p3': {'tips': ['z']}},
+           'teams': {'attack': {'tips': ['spread utility']}}}
+    diff = diff_advice(old, new)
+    assert diff == {'added': [], 'removed': [],
+                    'players': {'p2': {'added': [], 'removed': ['y']}, 'p3': {'added': ['z'], 'removed': []}},
+                    'teams': {'attack': {'added': ['spread utility'], 'removed': []}}}
+    assert advice_changed(diff) and not advice_changed(diff_advice(old, old))
+
+
+def test_external_sorter_merges_spilled_runs_in_time_order(tmp_path):
+    import random
+    from app.spill import ExternalSorter, read_run, write_run
+
+    events = [{'time': 1.5, 'source': 'vision', 'frame': 45, 'type': 'ability_cast', 'ability': 'smoke', 'player': 'p1',
+               'hud': {'timer': '1:30'}},
+              {'time': 2.0, 'source': 'audio', 'type': 'callout', 'text': 'rotating', 'round': 3}]
+    write_run(str(tmp_path / 'run.bin'), events)
+    assert list(read_run(str(tmp_path / 'run.bin'))) == events
+
+    rng = random.Random(7)
+    stream = [{'time': round(rng.uniform(0, 1000), 3), 'source': 'audio', 'type': 'footstep', 'player': f'p{i % 5}', 'seq': i}
+              for i in range(2500)]
+    with ExternalSorter(run_size=300, directory=str(tmp_path)) as sorter:
+        sorter.extend(stream)
+        assert len(sorter.runs) == 8
+        merged = list(sorter.merged())
+        assert merged == sorted(stream, key=lambda e: e['time'])
+        runs_dir = sorter._tmpdir
+    assert not (tmp_path / runs_dir).exists()
+
+
+def test_spilled_analysis_matches_in_memory_advice(tmp_path, capsys):
+    from app.agents.audio import AudioAgent
+    from app.agents.coach import CoachAgent
+    from app.agents.vision import VisionAgent
+    from app.pipeline import analyze_vod, analyze_vod_spilled
+    from app.recoach import needs_recoach
+    from app.timeline import JsonlEventIndex
+
+    store = MatchStore(str(tmp_path / 'matches'))
+    coach = CoachAgent()
+    record = analyze_vod_spilled(VisionAgent(), AudioAgent(), coach, b'dummy', store, 'm1', run_size=2)
+    assert record['runs'] == 3 and record['events'] == 7
+    assert record['advice'] == analyze_vod(VisionAgent(), AudioAgent(), coach, b'dummy')['advice']
+    stored = store.load('m1')
+    assert 'timeline' not in stored and stored['streams'] == {'timeline': 'm1.timeline.jsonl'}
+    timeline = list(store.iter_stream('m1'))
+    assert [e['time'] for e in timeline] == sorted(e['time'] for e in timeline)
+    assert not needs_recoach(stored, coach, lambda: store.iter_stream('m1'))
+    assert JsonlEventIndex(store.stream_path('m1')).query(types=['footstep'])['total'] == 1
+
+    vods = make_vods(tmp_path)
+    assert main(['analyze', str(vods), '--jobs', '1', '--store', str(tmp_path / 'spilled'), '--spill', '2']) == 0
+    assert json.loads(capsys.readouterr().out)['analyzed'] == 3
+    spilled = MatchStore(str(tmp_path / 'spilled'))
+    # The CLI's vision agent tracks the minimap (VALORANT_MAP defaults to ascent), so the samples are kept too.
+    assert all(spilled.load(i)['streams'] == {'timeline': f'{i}.timeline.jsonl', 'tracks': f'{i}.tracks.jsonl'}
+               for i in spilled.ids())
+    assert main(['recoach', '--store', str(tmp_path / 'spilled'), '--force']) == 0
+    assert json.loads(capsys.readouterr().out)['recoached'] == 3
+
+
+def test_recoach_keeps_open_area_tips_from_stored_tracks(tmp_path):
+    from app.agents.audio import AudioAgent
+    from app.agents.coach import CoachAgent
+    from app.agents.vision import VisionAgent
+    from app.pipeline import analyze_vod, analyze_vod_spilled
+    from app.positions import CalloutGrid, MinimapTracker, TrackStore
+    from app.recoach import recoach_store
+
+    def vision():
+        grid = CalloutGrid.for_map('ascent')
+        return VisionAgent(tracker_factory=lambda: MinimapTracker(TrackStore(grid), detector=lambda frame: {'p1': (0.5, 0.5)}))
+
+    store = MatchStore(str(tmp_path / 'matches'))
+    coach = CoachAgent()
+    result = analyze_vod(vision(), AudioAgent(), coach, b'dummy')
+    assert result['map'] == 'ascent' and any('open areas' in tip for tip in result['advice']['tips'])
+    store.save('m1', {'id': 'm1', **result})
+    record = analyze_vod_spilled(vision(), AudioAgent(), coach, b'dummy', store, 'm2', run_size=2)
+    assert record['advice'] == result['advice']
+    assert store.load('m2')['streams'] == {'timeline': 'm2.timeline.jsonl', 'tracks': 'm2.tracks.jsonl'}
+
+    report = recoach_store(store, coach, force=True)
+    assert (report['recoached'], report['changed']) == (2, 0)
+    assert store.load('m1')['advice'] == store.load('m2')['advice'] == result['advice']
+
+
+def test_jsonl_event_index_pages_like_the_in_memory_index(tmp_path):
+    import random
+    from app.timeline import EventIndex, JsonlEventIndex
+
+    rng = random.Random(7)
+    events = sorted(({'time': round(rng.uniform(0, 100), 3), 'source': rng.choice(['vision', 'audio']),
+                      'type': rng.choice(['footstep', 'ability_cast', 'callout'])} for _ in range(500)),
+                    key=lambda e: e['time'])
+    store = MatchStore(str(tmp_path))
+    store.save_stream('m1', {'id': 'm1'}, iter(events))
+    on_disk, in_memory = JsonlEventIndex(store.stream_path('m1'), block_size=16), EventIndex(events)
+    assert len(on_disk.blocks) == 32 and on_disk.types() == in_memory.types()
+    for query in [{}, {'start': 10.0, 'end': 60.0}, {'types': ['footstep'], 'offset': 40, 'limit': 25},
+                  {'source': 'audio', 'start': 99.0}, {'start': 30.0, 'offset': 300, 'limit': 50},
+                  {'types': ['callout'], 'source': 'vision', 'end': 50.0, 'offset': 5, 'limit': 1000}]:
+        assert on_disk.query(**query) == in_memory.query(**query)
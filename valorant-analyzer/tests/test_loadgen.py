@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+import httpx
+
+from app.loadgen import SessionRecorder, load_recording, percentile, replay, synthesize
+from app.main import app
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 50) is None
+
+
+def test_recorder_writes_replayable_sessions(tmp_path):
+    recorder = SessionRecorder(str(tmp_path))
+    recorder.record('match/1', 'frame', 100)
+    recorder.record('match/1', 'audio', 20)
+    recorder.flush()
+    chunks = load_recording(str(tmp_path / 'match1.jsonl'))
+    assert [c['kind'] for c in chunks] == ['frame', 'audio']
+    assert chunks[0]['t'] == 0.0
+    recorder.close()
+
+
+def test_recorder_keeps_a_bounded_set_of_open_sessions(tmp_path):
+    recorder = SessionRecorder(str(tmp_path), max_sessions=2)
+    for session in ('a', 'b', 'c'):
+        recorder.record(session, 'frame', 1)
+    recorder.finish('c')
+    recorder.flush()
+    # 'a' was evicted by 'c', and 'c' finished: only 'b' keeps a handle and a start time.
+    assert list(recorder._files) == ['b'] and list(recorder._starts) == ['b']
+    assert all(len(load_recording(str(tmp_path / f'{s}.jsonl'))) == 1 for s in 'abc')
+    recorder.close()
+    assert recorder._files == {}
+
+
+def test_replay_reports_latency_and_drops():
+    chunks = synthesize(duration=0.5, fps=20, audio_interval=0.25)
+
+    async def run():
+        async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+            return await replay(chunks, client, sessions=3, speed=10.0, drop_after=5.0)
+
+    report = asyncio.run(run())
+    assert len(report['sessions']) == 3
+    session = report['sessions'][0]
+    assert session['frames'] == 10 and session['chunks'] == 12
+    assert session['errors'] == 0 and session['dropped_frames'] == 0
+    assert session['latency_ms']['p50'] <= session['latency_ms']['p99']
+    assert report['server']['cpu_seconds'] >= 0
+    json.dumps(report)
+
+
+def test_resources_endpoint_without_the_resource_module(monkeypatch):
+    import sys
+    from fastapi.testclient import TestClient
+
+    # As on Windows: `import resource` raises ImportError.
+    monkeypatch.setitem(sys.modules, 'resource', None)
+    with TestClient(app) as client:
+        body = client.get('/health/resources').json()
+    assert body['max_rss_kb'] is None and body['cpu_user'] >= 0 and body['threads'] >= 1
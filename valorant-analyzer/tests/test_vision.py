@@ -0,0 +1,226 @@
+import threading
+
+from app.agents.vision import VisionAgent
+from app.ocr import GlyphTable, OcrStage
+
+W, H = 24, 8
+
+
+def draw(columns):
+    """RGB24 frame with white pixels in the given (x, y) cells."""
+    buf = bytearray(W * H * 3)
+    for x, y in columns:
+        i = (y * W + x) * 3
+        buf[i:i + 3] = b'\xff\xff\xff'
+    return bytes(buf)
+
+
+ONE = [(0, y) for y in range(1, 7)]
+TWO = [(0, 1), (1, 1), (2, 1), (2, 3), (1, 4), (0, 5), (0, 6), (1, 6), (2, 6)]
+
+
+def shift(cells, dx):
+    return [(x + dx, y) for x, y in cells]
+
+
+def test_ocr_caches_by_pixel_hash_and_learns_glyphs():
+    calls = []
+
+    def recognizer(pixels, w, h):
+        calls.append((w, h))
+        return '12'
+
+    ocr = OcrStage(W, H, regions={'round_timer': (0.0, 0.0, 1.0, 1.0)}, recognizer=recognizer)
+    frame = draw(shift(ONE, 2) + shift(TWO, 5))
+    assert ocr.read(frame) == {'round_timer': '12'}
+    assert ocr.read(frame) == {'round_timer': '12'}
+    # Same text drawn elsewhere: new pixel hash, but every glyph is now known.
+    moved = draw(shift(ONE, 10) + shift(TWO, 13))
+    assert ocr.read_region(moved, 'round_timer') == '12'
+    assert len(calls) == 1
+    assert ocr.stats == {'cache_hits': 1, 'glyph_hits': 1, 'recognitions': 1}
+
+
+def test_ocr_stage_is_safe_to_share_between_threads():
+    ocr = OcrStage(W, H, regions={'round_timer': (0.0, 0.0, 1.0, 1.0)}, recognizer=lambda p, w, h: '1',
+                   cache_size=2)
+    frames = [draw(shift(ONE, dx)) for dx in range(0, 20, 2)]
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(50):
+                for frame in frames:
+                    assert ocr.read_region(frame, 'round_timer') == '1'
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert sum(ocr.stats.values()) == 8 * 50 * len(frames)
+    assert len(ocr._caches['round_timer']) <= 2
+
+
+def test_glyph_table_marks_spaces_and_unknowns():
+    table = GlyphTable({(1,): 'a'})
+    assert table.decode([(1,), None, (1,)]) == 'a a'
+    assert table.decode([(1,), (3,)]) is None
+
+
+def test_vision_agent_attaches_hud_text():
+    ocr = OcrStage(W, H, regions={'round_timer': (0.0, 0.0, 1.0, 1.0)}, glyphs=GlyphTable(), recognizer=lambda p, w, h: '1')
+    agent = VisionAgent(ocr=ocr)
+    events = agent.analyze_frames([draw(ONE), draw(ONE)])
+    assert [e['hud'] for e in events] == [{'round_timer': '1'}, {'round_timer': '1'}]
+    assert ocr.stats['cache_hits'] == 1
+
+
+def test_minimap_tracks_and_region_queries():
+    from app.agents.coach import CoachAgent
+    from app.positions import CalloutGrid, MinimapTracker, TrackStore
+
+    index = CalloutGrid.for_map('ascent')
+    assert index.callouts[index.region_at(0.15, 0.50)].name == 'B-main'
+    assert index.region_at(0.99, 0.99) == -1
+
+    store = TrackStore(index)
+    # player1 holds B-main, player2 stands on A-site (open) for the whole clip.
+    tracker = MinimapTracker(store, fps=2.0, detector=lambda frame: {'player1': (0.15, 0.50), 'player2': (0.70, 0.30)})
+    agent = VisionAgent()
+    events = agent.analyze_frames([b'f'] * 10, tracker=tracker)
+    assert events[3]['positions'] == [{'player': 'player1', 'x': 0.15, 'y': 0.50}, {'player': 'player2', 'x': 0.70, 'y': 0.30}]
+    assert len(store) == 20
+
+    coach = CoachAgent()
+    assert coach.players_in_region(store, 'B-main', 1.0, 2.0) == ['player1']
+    assert coach.players_in_region(store, 'B-main', 10.0, 20.0) == []
+    assert coach.open_area_time(store) == {'player1': 0.0, 'player2': 4.5}
+    advice = coach.generate_advice(events, [], tracks=store)
+    assert any(tip.startswith('player2 spends') for tip in advice['tips'])
+
+
+def test_pipeline_tracks_each_vod_in_its_own_store():
+    from app.agents.audio import AudioAgent
+    from app.agents.coach import CoachAgent
+    from app.pipeline import analyze_vod
+    from app.positions import CalloutGrid, MinimapTracker, TrackStore
+
+    grid = CalloutGrid.for_map('ascent')
+    trackers = []
+
+    def new_tracker():
+        trackers.append(MinimapTracker(TrackStore(grid), fps=2.0, detector=lambda frame: {'player2': (0.70, 0.30)}))
+        return trackers[-1]
+
+    vision = VisionAgent(tracker_factory=new_tracker)
+    first = analyze_vod(vision, AudioAgent(), CoachAgent(), b'vod')
+    analyze_vod(vision, AudioAgent(), CoachAgent(), b'vod')
+    # Both VODs restart at frame 0, so one shared store would break its time order.
+    assert [len(t.store) for t in trackers] == [5, 5]
+    assert list(trackers[1].store.t) == list(trackers[0].store.t)
+    assert first['vision'][0]['positions'] == [{'player': 'player2', 'x': 0.70, 'y': 0.30}]
+    assert any(tip.startswith('player2 spends') for tip in first['advice']['tips'])
+    assert first['advice']['players']['player2']['tips']
+
+
+def test_tracker_samples_use_the_media_clock():
+    from app.agents.audio import AudioAgent
+    from app.agents.coach import CoachAgent
+    from app.pipeline import analyze_vod
+    from app.positions import CalloutGrid, MinimapTracker, TrackStore
+    from app.timeline import MediaClock
+
+    pts = [10.0, 10.1, 10.5, 10.6, 11.2]
+    tracker = MinimapTracker(TrackStore(CalloutGrid.for_map('ascent')), detector=lambda frame: {'player2': (0.70, 0.30)})
+    result = analyze_vod(VisionAgent(tracker_factory=lambda: tracker), AudioAgent(), CoachAgent(), b'vod',
+                         clock=MediaClock(pts=pts, start_time=10.0))
+    # Variable frame rate: samples carry each frame's PTS, not index / fps.
+    assert [round(t, 6) for t in tracker.store.t] == [round(p - 10.0, 6) for p in pts]
+    assert [e['time'] for e in result['vision']] == list(tracker.store.t)
+
+
+FRAME_W, FRAME_H = 4, 2
+FRAME_SIZE = FRAME_W * FRAME_H * 3
+
+
+def fake_ffmpeg(n_frames):
+    """A python subprocess that writes n raw frames, each filled with its index."""
+    import sys
+    code = f'import sys\nfor i in range({n_frames}): sys.stdout.buffer.write(bytes([i]) * {FRAME_SIZE})'
+    return [sys.executable, '-c', code]
+
+
+def test_decoder_reuses_a_fixed_ring_of_buffers():
+    from app.decode import FfmpegDecoder
+
+    decoder = FfmpegDecoder('match.mp4', FRAME_W, FRAME_H, ring_slots=3, command=fake_ffmpeg(50))
+    storage = decoder.ring.storage
+    seen = [bytes(frame[:1])[0] for frame in decoder.frames(hold=2)]
+    assert seen == list(range(50))
+    assert decoder.ring.storage is storage and len(storage) == 3 * FRAME_SIZE
+
+
+def test_decoder_command_keeps_variable_frame_rate_frames():
+    from app.decode import FfmpegDecoder
+
+    command = FfmpegDecoder('match.mp4', FRAME_W, FRAME_H).command
+    assert command[command.index('-fps_mode') + 1] == 'passthrough' and '-r' not in command
+    assert command[command.index('-i') + 1] == 'match.mp4' and command[-1] == 'pipe:1'
+    assert command.index('-fps_mode') > command.index('-i')
+    legacy = FfmpegDecoder(b'vod', FRAME_W, FRAME_H, fps_mode_option='-vsync').command
+    assert legacy[legacy.index('-vsync') + 1] == 'passthrough' and legacy[legacy.index('-i') + 1] == 'pipe:0'
+    resampled = FfmpegDecoder('match.mp4', FRAME_W, FRAME_H, fps=30).command
+    assert resampled[resampled.index('-r') + 1] == '30' and 'passthrough' not in resampled
+
+
+def test_decoder_streams_bytes_through_stdin_and_stops_early():
+    import sys
+    from app.decode import FfmpegDecoder
+
+    echo = [sys.executable, '-c', 'import sys, shutil; shutil.copyfileobj(sys.stdin.buffer, sys.stdout.buffer)']
+    content = b''.join(bytes([i]) * FRAME_SIZE for i in range(10))
+    decoder = FfmpegDecoder(content, FRAME_W, FRAME_H, ring_slots=2, command=echo)
+    assert [bytes(f[:1])[0] for f in decoder.frames()] == list(range(10))
+    early = FfmpegDecoder('match.mp4', FRAME_W, FRAME_H, ring_slots=2, command=fake_ffmpeg(1000))
+    for i, _ in enumerate(early.frames()):
+        if i == 3:
+            break
+    assert early.frames_decoded < 1000
+
+
+def test_decoder_reports_a_failed_ffmpeg_exit():
+    import sys
+    import pytest
+    from app.decode import DecodeError, FfmpegDecoder
+
+    code = (f'import sys\nsys.stdout.buffer.write(bytes({FRAME_SIZE}) * 2)\n'
+            'sys.stderr.write("moov atom not found\\n")\nsys.exit(1)')
+    decoder = FfmpegDecoder('corrupt.mp4', FRAME_W, FRAME_H, ring_slots=3, command=[sys.executable, '-c', code])
+    frames = decoder.frames()
+    assert len([next(frames), next(frames)]) == 2
+    with pytest.raises(DecodeError, match='status 1 after 2 frames: moov atom not found'):
+        next(frames)
+
+
+def test_analyze_frames_consumes_ring_in_place():
+    from app.decode import FfmpegDecoder
+    from app.inference import FakeBackend, MicroBatcher
+
+    class FirstByteBackend(FakeBackend):
+        def infer_batch(self, frames):
+            return [[{'type': 'marker', 'value': bytes(f[:1])[0]}] for f in frames]
+
+    for batched in (False, True):
+        backend = FirstByteBackend()
+        backend.max_batch_size = 4
+        batcher = MicroBatcher(backend, max_wait=0.001) if batched else None
+        agent = VisionAgent(backend=backend, batcher=batcher)
+        decoder = FfmpegDecoder('match.mp4', FRAME_W, FRAME_H, ring_slots=5, command=fake_ffmpeg(40))
+        events = agent.analyze_frames(decoder.frames(hold=agent.frames_in_flight))
+        assert [e['events'][0]['value'] for e in events] == list(range(40))
+        if batcher:
+            batcher.close()